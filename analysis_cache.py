@@ -0,0 +1,222 @@
+"""
+Persistent cache of Gemini analysis results with request coalescing
+"""
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future
+
+from config import ANALYSIS_CLAIM_TIMEOUT_SECONDS, logger
+from database import (
+    get_cached_analysis, claim_analysis, refresh_analysis_claim, store_analysis, release_analysis_claim
+)
+from metrics import CACHE_REQUESTS
+
+CLAIM_POLL_INTERVAL = 0.5
+# Attempts to reach the cache table before computing without coordinating with other workers
+CLAIM_ATTEMPTS = 3
+
+# Analyses being computed by this process, keyed like the cache table
+inflight = {}
+inflight_lock = threading.Lock()
+
+
+def content_hash(transcript_text, utterances=None):
+    """Hash the transcript content an analysis is computed from"""
+    digest = hashlib.sha256((transcript_text or '').encode('utf-8'))
+    for u in utterances or []:
+        digest.update(b'\x00')
+        # Normalized the way stored utterances are, so upload-time and stored data hash alike
+        digest.update(json.dumps([str(u.get('speaker') or 'Unknown'), u.get('text') or '']).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def analysis_key(session_id, transcript_text, utterances, model, prompt_version):
+    return (session_id, content_hash(transcript_text, utterances), model, prompt_version)
+
+
+def _wait_for_other_worker(key):
+    """
+    Poll the cache while another worker holds the claim.
+    Returns: the result, or None if the claim was released or went stale
+    """
+    deadline = time.monotonic() + ANALYSIS_CLAIM_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(CLAIM_POLL_INTERVAL)
+        entry = get_cached_analysis(key)
+        if entry is None:
+            return None
+        if entry['status'] == 'ready':
+            return entry['result']
+    return None
+
+
+@contextmanager
+def _heartbeat(key):
+    """Refresh key's claim in the background so a long (e.g. chunked) analysis keeps it"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(ANALYSIS_CLAIM_TIMEOUT_SECONDS / 3):
+            refresh_analysis_claim(key)
+
+    thread = threading.Thread(target=beat, name='analysis-claim-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+def _claim(key):
+    """
+    Claim key, retrying briefly while the cache table cannot be reached.
+    Returns: True, False, or None if the cache stayed unreachable
+    """
+    for attempt in range(CLAIM_ATTEMPTS):
+        claimed = claim_analysis(key, ANALYSIS_CLAIM_TIMEOUT_SECONDS)
+        if claimed is not None:
+            return claimed
+        if attempt < CLAIM_ATTEMPTS - 1:
+            time.sleep(CLAIM_POLL_INTERVAL * 2 ** attempt)
+    return None
+
+
+def _compute(key, compute):
+    """Compute under a cross-worker claim, waiting for (or taking over from) another worker's claim"""
+    while True:
+        claimed = _claim(key)
+        if claimed is None:
+            logger.warning(f"Analysis cache unavailable, computing {key[0]} without storing it")
+            return compute(), False
+
+        if claimed:
+            try:
+                with _heartbeat(key):
+                    result = compute()
+            except Exception:
+                release_analysis_claim(key)
+                raise
+            store_analysis(key, result)
+            return result, False
+
+        result = _wait_for_other_worker(key)
+        if result is not None:
+            return result, True
+        logger.info(f"Analysis claim for {key[0]} was released or went stale, retrying")
+
+
+def _count_lookup(cached):
+    CACHE_REQUESTS.inc(cache='analysis', result='hit' if cached else 'miss')
+
+
+def get_or_compute(key, compute):
+    """
+    Return the cached analysis for key, or compute() it once.
+    Concurrent requests for the same key in this process share one computation,
+    and requests in other workers wait on its pending row instead of calling Gemini again.
+    Returns: (analysis, cached)
+    """
+    entry = get_cached_analysis(key)
+    if entry and entry['status'] == 'ready':
+        _count_lookup(True)
+        return entry['result'], True
+
+    with inflight_lock:
+        future = inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            inflight[key] = future
+
+    if not leader:
+        _count_lookup(True)
+        return future.result(), True
+
+    try:
+        result, cached = _compute(key, compute)
+        future.set_result(result)
+        _count_lookup(cached)
+        return result, cached
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            inflight.pop(key, None)
+
+
+def _drain(events):
+    """Consume a stream_analysis generator, returning only its final result"""
+    for event, payload in events:
+        if event == 'result':
+            return payload
+    raise ValueError("Empty response from Gemini")
+
+
+def stream_or_get(key, stream):
+    """
+    Streaming counterpart of get_or_compute.
+    Yields the events of stream() while this request computes the analysis, or only
+    the final result when it is cached or being computed elsewhere.
+    The last event is ('result', {'analysis': ..., 'cached': ...}).
+    """
+    entry = get_cached_analysis(key)
+    if entry and entry['status'] == 'ready':
+        _count_lookup(True)
+        yield 'result', {'analysis': entry['result'], 'cached': True}
+        return
+
+    with inflight_lock:
+        future = inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            inflight[key] = future
+
+    if not leader:
+        _count_lookup(True)
+        yield 'result', {'analysis': future.result(), 'cached': True}
+        return
+
+    try:
+        claimed = _claim(key)
+        if claimed is None:
+            logger.warning(f"Analysis cache unavailable, streaming {key[0]} without storing it")
+        if claimed is not False:
+            result = None
+            try:
+                with _heartbeat(key) if claimed else nullcontext():
+                    for event, payload in stream():
+                        if event == 'result':
+                            result = payload
+                        else:
+                            yield event, payload
+                if result is None:
+                    raise ValueError("Empty response from Gemini")
+            except BaseException:
+                # Includes GeneratorExit when the client disconnects mid-stream
+                if claimed:
+                    release_analysis_claim(key)
+                raise
+            if claimed:
+                store_analysis(key, result)
+            cached = False
+        else:
+            result, cached = _compute(key, lambda: _drain(stream()))
+        future.set_result(result)
+    except GeneratorExit:
+        # This request's client disconnected; followers get an ordinary error they can handle
+        future.set_exception(RuntimeError('analysis stream aborted'))
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            inflight.pop(key, None)
+
+    _count_lookup(cached)
+    yield 'result', {'analysis': result, 'cached': cached}
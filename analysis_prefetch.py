@@ -0,0 +1,83 @@
+"""
+Speculative background analysis of freshly saved transcripts
+"""
+import time
+import threading
+
+from config import (
+    ANALYSIS_PREFETCH, ANALYSIS_PREFETCH_MAX_CONCURRENT, ANALYSIS_PREFETCH_PER_USER_HOURLY,
+    ANALYSIS_PREFETCH_RESERVE, logger
+)
+from analysis_cache import analysis_key, get_or_compute
+from background_tasks import submit_background
+from gemini_service import analyze_transcript, ANALYSIS_MODEL, PROMPT_VERSION, GEMINI_API_KEY
+from provider_limits import has_headroom
+from shared_state import register_schema, state_transaction
+
+BUDGET_WINDOW_SECONDS = 3600
+
+register_schema("""
+    CREATE TABLE IF NOT EXISTS analysis_prefetches (
+        user_id INTEGER NOT NULL,
+        started_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_analysis_prefetches_user ON analysis_prefetches(user_id, started_at);
+""")
+
+# Prefetches running in this worker; interactive analyses never wait on this
+prefetch_slots = threading.BoundedSemaphore(ANALYSIS_PREFETCH_MAX_CONCURRENT)
+
+
+def take_user_budget(user_id):
+    """Count a prefetch against user_id's hourly budget, returning False if it is spent"""
+    now = time.time()
+    with state_transaction() as conn:
+        conn.execute("DELETE FROM analysis_prefetches WHERE started_at < ?", (now - BUDGET_WINDOW_SECONDS,))
+        used = conn.execute(
+            "SELECT COUNT(*) FROM analysis_prefetches WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        if used >= ANALYSIS_PREFETCH_PER_USER_HOURLY:
+            return False
+        conn.execute("INSERT INTO analysis_prefetches (user_id, started_at) VALUES (?, ?)", (user_id, now))
+        return True
+
+
+def prefetch_analysis(session_id, transcript_text, utterances):
+    """Compute and cache the analysis unless Gemini is too busy to spare the capacity"""
+    try:
+        if not has_headroom('gemini', ANALYSIS_PREFETCH_RESERVE):
+            logger.info(f"Skipping analysis prefetch for {session_id}: Gemini has no spare capacity")
+            return
+        key = analysis_key(session_id, transcript_text, utterances, ANALYSIS_MODEL, PROMPT_VERSION)
+        _, cached = get_or_compute(key, lambda: analyze_transcript(transcript_text, utterances))
+        if not cached:
+            logger.info(f"Prefetched analysis for {session_id}")
+    finally:
+        prefetch_slots.release()
+
+
+def schedule_analysis_prefetch(session_id, user_id, transcript_text, utterances):
+    """
+    Start analyzing a just-saved transcript in the background when enabled.
+    Prefetch is skipped, never queued, when this worker is already prefetching
+    or the user has used up their hourly budget.
+    """
+    if not ANALYSIS_PREFETCH or not GEMINI_API_KEY or not transcript_text:
+        return None
+    if not prefetch_slots.acquire(blocking=False):
+        return None
+    try:
+        if not take_user_budget(user_id):
+            prefetch_slots.release()
+            return None
+        return submit_background(
+            f"prefetch-analysis:{session_id}",
+            prefetch_analysis,
+            session_id,
+            transcript_text,
+            utterances
+        )
+    except Exception as e:
+        prefetch_slots.release()
+        logger.error(f"Could not schedule analysis prefetch: {e}")
+        return None
@@ -1,35 +1,96 @@
 """
 API route handlers for the app
 """
-import io
 import os
+import json
 import uuid
 import threading
 import razorpay
 from datetime import datetime, timedelta
-from flask import request, jsonify, send_file
-from pydub import AudioSegment
+from flask import request, jsonify, send_file, make_response, Response, stream_with_context
+from werkzeug.utils import secure_filename
 
-from config import ALLOWED_EXTENSIONS, logger
+from config import ALLOWED_EXTENSIONS, AUDIO_KEEP_ORIGINAL, UPLOAD_FOLDER, METRICS_TOKEN, logger
 from database import (
-    get_db_connection, return_db_connection, save_transcript_to_db,
+    get_db_connection, get_read_connection, return_db_connection, mark_user_write,
+    get_pool_stats, save_transcript_to_db,
     get_transcript_from_db, get_all_transcripts, delete_transcript_from_db,
-    get_audio_from_db
+    get_transcript_json_from_db, get_audio_info_from_db, iter_audio_from_db,
+    search_transcripts, get_transcript_version_from_db, get_transcript_timeline_from_db,
+    get_transcripts_list_version, iter_transcript_ndjson
 )
-from audio_processor import AudioProcessor, allowed_file
-from gemini_service import analyze_transcript
-from auth_service import hash_password, verify_password, generate_token, token_required
+from audio_processor import AudioProcessor, allowed_file, extract_segment_from_chunks
+from audio_storage import schedule_audio_compaction
+from analysis_prefetch import schedule_analysis_prefetch
+from time_index import get_time_index, index_cache
+from gemini_service import analyze_transcript, stream_analysis, AnalysisFormatError, ANALYSIS_MODEL, PROMPT_VERSION
+from analysis_cache import analysis_key, get_or_compute, stream_or_get
+from provider_limits import ProviderBusyError, get_limiter_stats
+from auth_service import (
+    hash_password, verify_password, password_needs_rehash, generate_token, token_required,
+    PasswordServiceBusy, token_cache
+)
+from rate_limit import rate_limited
+from compression import get_compression_stats
+from audio_archive import rehydrate_cache
+from metrics import (
+    Gauge, CACHE_REQUESTS, UPLOAD_STAGE_SECONDS, register_collector, directory_bytes, render_metrics
+)
+from conditional import make_etag, check_not_modified, validator_headers, not_modified_headers
+from profile_cache import get_profile_version, get_cached_profile, cache_profile, profile_cache
 from user_db import (
-    create_user, get_user_by_email, get_user_by_id,
+    create_user, get_user_by_email, get_user_by_id, update_password_hash,
     upgrade_to_premium, get_user_transcript_count, can_create_transcript
 )
 
 AUDIO_SESSIONS = {}
 SESSION_LOCK = threading.Lock()
+# Gemini answered, but not with an analysis matching the schema; distinct from a server bug
+INVALID_ANALYSIS_ERROR = {
+    'error': 'AI service returned an invalid analysis, please try again',
+    'code': 'invalid_model_output'
+}
+
+AUDIO_SESSIONS_GAUGE = Gauge('audio_sessions', 'Uploaded audio held in memory for segment playback')
+TEMP_DIR_BYTES = Gauge('temp_dir_bytes', 'Bytes of uploads in the temporary upload folder')
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 
+@register_collector
+def collect_app_metrics():
+    with SESSION_LOCK:
+        AUDIO_SESSIONS_GAUGE.set(len(AUDIO_SESSIONS))
+    TEMP_DIR_BYTES.set(directory_bytes(UPLOAD_FOLDER))
+    for name, cache in (('token', token_cache), ('profile', profile_cache),
+                        ('time_index', index_cache), ('audio_rehydrate', rehydrate_cache)):
+        stats = cache.stats()
+        CACHE_REQUESTS.set_total(stats['hits'], cache=name, result='hit')
+        CACHE_REQUESTS.set_total(stats['misses'], cache=name, result='miss')
+
+def format_sse(event, payload):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def not_modified(etag, last_modified=None, date_validates=True):
+    """A 304 response if the client's copy matches etag (or last_modified), otherwise None"""
+    tag = check_not_modified(request.headers, etag, last_modified if date_validates else None)
+    if tag is None:
+        return None
+    return Response(status=304, headers=not_modified_headers(tag, last_modified))
+
+def wants_ndjson():
+    """True if the client asked for newline-delimited JSON (?format=ndjson or the Accept header)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag, Last-Modified and Cache-Control to a response"""
+    response = make_response(response)
+    response.headers.update(validator_headers(etag, last_modified))
+    return response
+
 def cleanup_expired_sessions():
     """Clean up sessions older than 1 hour"""
     with SESSION_LOCK:
@@ -66,8 +127,14 @@ def register_routes(app):
                     'upload': 'POST /upload',
                     'list': 'GET /api/transcripts',
                     'get': 'GET /api/transcript/<id>',
+                    'get_stream': 'GET /api/transcript/<id>?format=ndjson',
                     'delete': 'DELETE /api/transcript/<id>',
-                    'analyze': 'POST /api/analyze/<id>'
+                    'analyze': 'POST /api/analyze/<id>',
+                    'analyze_stream': 'POST /api/analyze/<id>/stream',
+                    'search': 'GET /api/search?q=<query>',
+                    'at_time': 'GET /api/transcript/<id>/at/<ms>',
+                    'time_range': 'GET /api/transcript/<id>/range/<start_ms>/<end_ms>',
+                    'audio': 'GET /api/audio/<id>'
                 }
             }
         })
@@ -85,6 +152,10 @@ def register_routes(app):
             return jsonify({
                 'status': 'healthy',
                 'database': 'connected',
+                'pools': get_pool_stats(),
+                'provider_limits': get_limiter_stats(),
+                'auth_cache': {'tokens': token_cache.stats(), 'profiles': profile_cache.stats()},
+                'compression': get_compression_stats(),
                 'timestamp': datetime.now().isoformat()
             }), 200
         except Exception as e:
@@ -95,6 +166,13 @@ def register_routes(app):
                 'timestamp': datetime.now().isoformat()
             }), 503
 
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics summed across all workers"""
+        if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return jsonify({'error': 'Unauthorized'}), 401
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+    
     @app.route('/api/auth/signup', methods=['POST'])
     def signup():
         """Register a new user"""
@@ -140,6 +218,9 @@ def register_routes(app):
             finally:
                 return_db_connection(conn)
                 
+        except PasswordServiceBusy as e:
+            logger.warning(f"Signup refused: {e}")
+            return jsonify({'error': 'Server is busy, please try again shortly'}), 503, {'Retry-After': '1'}
         except Exception as e:
             logger.error(f"Signup error: {e}")
             return jsonify({'error': 'Registration failed'}), 500
@@ -163,6 +244,13 @@ def register_routes(app):
                 if not user or not verify_password(password, user['password_hash']):
                     return jsonify({'error': 'Invalid email or password'}), 401
                 
+                if password_needs_rehash(user['password_hash']):
+                    try:
+                        update_password_hash(conn, user['id'], hash_password(password))
+                    except PasswordServiceBusy:
+                        # The old hash still works; rehash on a later login
+                        pass
+                
                 token = generate_token(user['id'], user['email'], user.get('is_premium', False))
                 
                 return jsonify({
@@ -179,6 +267,9 @@ def register_routes(app):
             finally:
                 return_db_connection(conn)
                 
+        except PasswordServiceBusy as e:
+            logger.warning(f"Login refused: {e}")
+            return jsonify({'error': 'Server is busy, please try again shortly'}), 503, {'Retry-After': '1'}
         except Exception as e:
             logger.error(f"Login error: {e}")
             return jsonify({'error': 'Login failed'}), 500
@@ -190,7 +281,12 @@ def register_routes(app):
     def get_current_user():
         """Get current user info"""
         try:
-            conn = get_db_connection()
+            version = get_profile_version(request.user_id)
+            profile = get_cached_profile(request.user_id, version)
+            if profile is not None:
+                return jsonify({'status': 'success', 'user': profile})
+            
+            conn = get_read_connection(request.user_id)
             try:
                 user = get_user_by_id(conn, request.user_id)
                 
@@ -199,17 +295,16 @@ def register_routes(app):
                 
                 transcript_count = get_user_transcript_count(conn, request.user_id)
                 
-                return jsonify({
-                    'status': 'success',
-                    'user': {
-                        'id': user['id'],
-                        'email': user['email'],
-                        'full_name': user.get('full_name'),
-                        'is_premium': user.get('is_premium', False),
-                        'transcript_count': transcript_count,
-                        'transcript_limit': None if user.get('is_premium') else 3
-                    }
-                })
+                profile = {
+                    'id': user['id'],
+                    'email': user['email'],
+                    'full_name': user.get('full_name'),
+                    'is_premium': user.get('is_premium', False),
+                    'transcript_count': transcript_count,
+                    'transcript_limit': None if user.get('is_premium') else 3
+                }
+                cache_profile(request.user_id, version, profile)
+                return jsonify({'status': 'success', 'user': profile})
                 
             finally:
                 return_db_connection(conn)
@@ -229,6 +324,7 @@ def register_routes(app):
                 
                 if not success:
                     return jsonify({'error': 'Upgrade failed'}), 500
+                mark_user_write(request.user_id)
                 
                 user = get_user_by_id(conn, request.user_id)
                 token = generate_token(user['id'], user['email'], True)
@@ -302,6 +398,7 @@ def register_routes(app):
                 if not success:
                     logger.error(f"Failed to upgrade user {request.user_id} after payment")
                     return jsonify({'error': 'Payment verified but upgrade failed'}), 500
+                mark_user_write(request.user_id)
                 
                 user = get_user_by_id(conn, request.user_id)
                 if not user:
@@ -332,38 +429,174 @@ def register_routes(app):
             return jsonify({'error': 'Failed to verify payment'}), 500
     @app.route('/api/transcripts', methods=['GET'])
     @token_required
+    @rate_limited()
     def get_all_transcripts_api():
         """Get all transcripts for the current user"""
         try:
+            version = get_transcripts_list_version(request.user_id)
+            etag = last_modified = None
+            if version:
+                count, last_modified, max_id = version
+                etag = make_etag('transcripts', request.user_id, count, last_modified, max_id)
+                # Deleting a transcript does not move the latest updated_at, so only the tag validates
+                cached = not_modified(etag, last_modified, date_validates=False)
+                if cached:
+                    return cached
+            
             transcripts = get_all_transcripts(user_id=request.user_id)
-            return jsonify({
+            response = jsonify({
                 'status': 'success',
                 'transcripts': transcripts
             })
+            return with_validators(response, etag, last_modified) if etag else response
         except Exception as e:
             logger.error(f"Error fetching transcripts: {e}")
             return jsonify({'error': 'Failed to fetch transcripts'}), 500
     
     @app.route('/api/transcript/<session_id>', methods=['GET'])
     @token_required
+    @rate_limited()
     def get_transcript_api(session_id):
-        """Get a specific transcript with utterances"""
+        """
+        Get a specific transcript with utterances.
+        With ?format=ndjson (or Accept: application/x-ndjson) the transcript is
+        streamed as it is read: a transcript line, one line per utterance, then an end line.
+        """
         try:
-            data = get_transcript_from_db(session_id, include_audio=False, user_id=request.user_id)
-            if data:
-                return jsonify({
-                    'status': 'success',
-                    'transcript': data['transcript'],
-                    'utterances': data['utterances']
-                })
-            else:
+            version = get_transcript_version_from_db(session_id, user_id=request.user_id)
+            if version is None:
                 return jsonify({'error': 'Transcript not found'}), 404
+            ndjson = wants_ndjson()
+            etag = make_etag('transcript-ndjson' if ndjson else 'transcript', session_id, version)
+            cached = not_modified(etag, version)
+            if cached:
+                cached.vary.add('Accept')
+                return cached
+            
+            if ndjson:
+                response = Response(
+                    iter_transcript_ndjson(session_id, user_id=request.user_id),
+                    mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'}
+                )
+            else:
+                payload = get_transcript_json_from_db(session_id, user_id=request.user_id)
+                if not payload:
+                    return jsonify({'error': 'Transcript not found'}), 404
+                response = app.response_class(payload, mimetype='application/json')
+            response = with_validators(response, etag, version)
+            response.vary.add('Accept')
+            return response
         except Exception as e:
             logger.error(f"Error fetching transcript: {e}")
             return jsonify({'error': 'Failed to fetch transcript'}), 500
     
+    @app.route('/api/search', methods=['GET'])
+    @token_required
+    @rate_limited()
+    def search_transcripts_api():
+        """Full-text search across the current user's transcripts"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        scope = request.args.get('scope', 'utterances')
+        if scope not in ('utterances', 'transcripts'):
+            return jsonify({'error': 'Scope must be utterances or transcripts'}), 400
+        
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        
+        try:
+            results = search_transcripts(
+                request.user_id,
+                query,
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                scope=scope
+            )
+            return jsonify({
+                'status': 'success',
+                'query': query,
+                'scope': scope,
+                'hits': results['hits'],
+                'next_cursor': results['next_cursor']
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error searching transcripts: {e}")
+            return jsonify({'error': 'Search failed'}), 500
+    
+    def load_time_index(session_id, version):
+        """Get the current user's time index for a transcript at version"""
+        return get_time_index(
+            session_id,
+            version,
+            lambda: get_transcript_timeline_from_db(session_id, user_id=request.user_id)
+        )
+    
+    @app.route('/api/transcript/<session_id>/at/<int:t_ms>', methods=['GET'])
+    @token_required
+    @rate_limited('playback')
+    def transcript_at_time(session_id, t_ms):
+        """Get the utterance and word being spoken at a playback position"""
+        try:
+            version = get_transcript_version_from_db(session_id, user_id=request.user_id)
+            if version is None:
+                return jsonify({'error': 'Transcript not found'}), 404
+            etag = make_etag('timeline', session_id, version)
+            cached = not_modified(etag, version)
+            if cached:
+                return cached
+            
+            index = load_time_index(session_id, version)
+            if index is None:
+                return jsonify({'error': 'Transcript not found'}), 404
+            
+            return with_validators(jsonify({
+                'status': 'success',
+                'word_timings': index.has_words,
+                **index.at(t_ms)
+            }), etag, version)
+        except Exception as e:
+            logger.error(f"Time lookup error: {e}")
+            return jsonify({'error': 'Time lookup failed'}), 500
+    
+    @app.route('/api/transcript/<session_id>/range/<int:start_ms>/<int:end_ms>', methods=['GET'])
+    @token_required
+    @rate_limited()
+    def transcript_time_range(session_id, start_ms, end_ms):
+        """Get the utterances and words in a time range, snapped to word boundaries"""
+        if start_ms >= end_ms:
+            return jsonify({'error': 'Invalid timestamp range'}), 400
+        try:
+            version = get_transcript_version_from_db(session_id, user_id=request.user_id)
+            if version is None:
+                return jsonify({'error': 'Transcript not found'}), 404
+            etag = make_etag('timeline', session_id, version)
+            cached = not_modified(etag, version)
+            if cached:
+                return cached
+            
+            index = load_time_index(session_id, version)
+            if index is None:
+                return jsonify({'error': 'Transcript not found'}), 404
+            
+            return with_validators(jsonify({
+                'status': 'success',
+                'word_timings': index.has_words,
+                **index.range(start_ms, end_ms)
+            }), etag, version)
+        except Exception as e:
+            logger.error(f"Time range lookup error: {e}")
+            return jsonify({'error': 'Time range lookup failed'}), 500
+    
     @app.route('/api/transcript/<session_id>', methods=['DELETE'])
     @token_required
+    @rate_limited()
     def delete_transcript(session_id):
         """Delete a specific transcript"""
         try:
@@ -378,10 +611,11 @@ def register_routes(app):
     
     @app.route('/api/analyze/<session_id>', methods=['POST'])
     @token_required
+    @rate_limited('analyze')
     def analyze_transcript_api(session_id):
         """Analyze transcript with Gemini AI"""
         try:
-            data = get_transcript_from_db(session_id, include_audio=False)
+            data = get_transcript_from_db(session_id, include_audio=False, user_id=request.user_id)
             if not data:
                 return jsonify({'error': 'Transcript not found'}), 404
             
@@ -391,22 +625,84 @@ def register_routes(app):
             if not transcript_text:
                 return jsonify({'error': 'No transcript text available'}), 400
             
-            analysis = analyze_transcript(transcript_text, utterances)
+            key = analysis_key(session_id, transcript_text, utterances, ANALYSIS_MODEL, PROMPT_VERSION)
+            analysis, cached = get_or_compute(key, lambda: analyze_transcript(transcript_text, utterances))
             
             return jsonify({
                 'status': 'success',
-                'analysis': analysis
+                'analysis': analysis,
+                'cached': cached
             })
+        except ProviderBusyError as e:
+            logger.warning(f"Analysis queued too long: {e}")
+            return jsonify({'error': 'AI service is busy, please try again shortly'}), 503, {
+                'Retry-After': str(e.retry_after)
+            }
+        except AnalysisFormatError as e:
+            logger.error(f"Invalid analysis from Gemini: {e}")
+            return jsonify(INVALID_ANALYSIS_ERROR), 502
         except ValueError as e:
             logger.error(f"Configuration error: {e}")
             return jsonify({'error': 'AI service not configured'}), 503
         except Exception as e:
             logger.error(f"Error analyzing transcript: {e}")
             return jsonify({'error': 'Failed to analyze transcript'}), 500
+    
+    @app.route('/api/analyze/<session_id>/stream', methods=['POST'])
+    @token_required
+    @rate_limited('analyze')
+    def analyze_transcript_stream_api(session_id):
+        """Analyze transcript with Gemini AI, streaming partial output as Server-Sent Events"""
+        try:
+            data = get_transcript_from_db(session_id, include_audio=False, user_id=request.user_id)
+            if not data:
+                return jsonify({'error': 'Transcript not found'}), 404
+            
+            transcript_text = data['transcript'].get('text', '')
+            utterances = data['utterances']
+            
+            if not transcript_text:
+                return jsonify({'error': 'No transcript text available'}), 400
+        except Exception as e:
+            logger.error(f"Error loading transcript for analysis: {e}")
+            return jsonify({'error': 'Failed to analyze transcript'}), 500
+        
+        key = analysis_key(session_id, transcript_text, utterances, ANALYSIS_MODEL, PROMPT_VERSION)
+        
+        def generate():
+            try:
+                for event, payload in stream_or_get(key, lambda: stream_analysis(transcript_text, utterances)):
+                    if event == 'result':
+                        payload = dict(payload, status='success')
+                    yield format_sse(event, payload)
+            except ProviderBusyError as e:
+                logger.warning(f"Analysis queued too long: {e}")
+                yield format_sse('error', {
+                    'error': 'AI service is busy, please try again shortly',
+                    'retry_after': e.retry_after
+                })
+            except AnalysisFormatError as e:
+                logger.error(f"Invalid analysis from Gemini: {e}")
+                yield format_sse('error', INVALID_ANALYSIS_ERROR)
+            except ValueError as e:
+                logger.error(f"Configuration error: {e}")
+                yield format_sse('error', {'error': 'AI service not configured'})
+            except Exception as e:
+                logger.error(f"Error streaming transcript analysis: {e}")
+                yield format_sse('error', {'error': 'Failed to analyze transcript'})
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
     @app.route('/upload', methods=['POST'])
     @token_required
+    @rate_limited('upload')
     def upload_file():
         """Upload and process audio file"""
+        processor = None
         try:
             conn = get_db_connection()
             try:
@@ -432,20 +728,25 @@ def register_routes(app):
             cleanup_expired_sessions()
             
             processor = AudioProcessor()
-            if not processor.save_audio_file(file):
+            with UPLOAD_STAGE_SECONDS.time(stage='save_audio'):
+                saved = processor.save_audio_file(file)
+            if not saved:
                 return jsonify({'error': 'File save failed'}), 500
             
-            audio_url = processor.upload_to_assemblyai()
+            with UPLOAD_STAGE_SECONDS.time(stage='assemblyai_upload'):
+                audio_url = processor.upload_to_assemblyai()
             if not audio_url:
                 processor.cleanup()
                 return jsonify({'error': 'Upload failed'}), 500
             
-            transcript_id = processor.request_transcription(audio_url)
+            with UPLOAD_STAGE_SECONDS.time(stage='transcription_request'):
+                transcript_id = processor.request_transcription(audio_url)
             if not transcript_id:
                 processor.cleanup()
                 return jsonify({'error': 'Transcription request failed'}), 500
             
-            result = processor.poll_transcription(transcript_id)
+            with UPLOAD_STAGE_SECONDS.time(stage='transcription_poll'):
+                result = processor.poll_transcription(transcript_id)
             if not result:
                 processor.cleanup()
                 return jsonify({'error': 'Transcription timed out or failed'}), 500
@@ -461,18 +762,29 @@ def register_routes(app):
             }
             
             audio_data, audio_mimetype = processor.get_audio_data()
-            save_success = save_transcript_to_db(
-                session_id,
-                transcript_data,
-                file.filename,
-                audio_data=audio_data,
-                audio_mimetype=audio_mimetype,
-                user_id=request.user_id
-            )
+            with UPLOAD_STAGE_SECONDS.time(stage='db_save'):
+                save_success = save_transcript_to_db(
+                    session_id,
+                    transcript_data,
+                    file.filename,
+                    audio_data=audio_data,
+                    audio_mimetype=audio_mimetype,
+                    user_id=request.user_id
+                )
             
             if not save_success:
                 logger.warning(f"Failed to save transcript to database for session: {session_id}")
-            
+            else:
+                if audio_data is not None:
+                    keep_original = request.form.get('keep_original')
+                    schedule_audio_compaction(
+                        session_id,
+                        processor.audio_segment,
+                        len(audio_data),
+                        keep_original=AUDIO_KEEP_ORIGINAL if keep_original is None else keep_original.lower() == 'true'
+                    )
+                schedule_analysis_prefetch(session_id, request.user_id, transcript_data['text'], transcript_data['utterances'])
+
             with SESSION_LOCK:
                 AUDIO_SESSIONS[session_id] = {
                     'processor': processor,
@@ -487,6 +799,13 @@ def register_routes(app):
                 'audio_stored': save_success and audio_data is not None
             })
             
+        except ProviderBusyError as e:
+            logger.warning(f"Transcription queued too long: {e}")
+            if processor:
+                processor.cleanup()
+            return jsonify({'error': 'Transcription service is busy, please try again shortly'}), 503, {
+                'Retry-After': str(e.retry_after)
+            }
         except Exception as e:
             logger.error(f"Upload route error: {e}")
             return jsonify({'error': 'Internal server error'}), 500
@@ -502,43 +821,87 @@ def register_routes(app):
                 if start_ms >= end_ms:
                     return jsonify({'error': 'Invalid timestamp range'}), 400
                 
+                # The uploaded audio held in memory never changes during the session
+                etag = make_etag('segment-live', session_id, start_ms, end_ms)
+                cached = not_modified(etag)
+                if cached:
+                    return cached
+                
                 buffer = processor.extract_audio_segment(start_ms, end_ms)
                 if not buffer:
                     return jsonify({'error': 'Segment extraction failed'}), 500
                 
-                return send_file(
+                return with_validators(send_file(
                     buffer,
                     mimetype='audio/mp3',
                     as_attachment=True,
                     download_name=f'segment_{start_ms}_{end_ms}.mp3'
-                )
+                ), etag)
             else:
-                audio_data = get_audio_from_db(session_id)
-                if not audio_data or not audio_data['audio_data']:
-                    return jsonify({'error': 'Session not found and no stored audio'}), 404
-                
-                audio_buffer = io.BytesIO(audio_data['audio_data'])
-                audio_segment = AudioSegment.from_file(audio_buffer)
-                
                 if start_ms >= end_ms:
                     return jsonify({'error': 'Invalid timestamp range'}), 400
                 
-                segment = audio_segment[start_ms:end_ms]
-                buffer = io.BytesIO()
-                segment.export(buffer, format="mp3")
-                buffer.seek(0)
+                version = get_transcript_version_from_db(session_id)
+                if version is None:
+                    return jsonify({'error': 'Session not found and no stored audio'}), 404
+                etag = make_etag('segment', session_id, version, start_ms, end_ms)
+                cached = not_modified(etag, version)
+                if cached:
+                    return cached
                 
-                return send_file(
+                audio_info = get_audio_info_from_db(session_id)
+                if not audio_info or not audio_info['audio_length']:
+                    return jsonify({'error': 'Session not found and no stored audio'}), 404
+                
+                buffer = extract_segment_from_chunks(iter_audio_from_db(session_id), start_ms, end_ms)
+                if not buffer:
+                    return jsonify({'error': 'Segment extraction failed'}), 500
+                
+                return with_validators(send_file(
                     buffer,
                     mimetype='audio/mp3',
                     as_attachment=True,
                     download_name=f'segment_{start_ms}_{end_ms}.mp3'
-                )
+                ), etag, version)
                 
         except Exception as e:
             logger.error(f"Audio segment error: {e}")
             return jsonify({'error': 'Internal server error'}), 500
     
+    @app.route('/api/audio/<session_id>', methods=['GET'])
+    @token_required
+    @rate_limited()
+    def download_audio(session_id):
+        """Stream the full stored audio for a transcript (?original=true for the kept original)"""
+        try:
+            audio_info = get_audio_info_from_db(session_id, user_id=request.user_id)
+            if not audio_info or not audio_info['audio_length']:
+                return jsonify({'error': 'No stored audio for this transcript'}), 404
+            
+            if request.args.get('original', 'false').lower() == 'true':
+                if not audio_info['original_length']:
+                    return jsonify({'error': 'Original audio was not kept for this transcript'}), 404
+                column = 'audio_original'
+                length = audio_info['original_length']
+                mimetype = audio_info['audio_original_mimetype']
+            else:
+                column = 'audio_data'
+                length = audio_info['audio_length']
+                mimetype = audio_info['audio_mimetype']
+            
+            return Response(
+                iter_audio_from_db(session_id, user_id=request.user_id, column=column),
+                mimetype=mimetype or 'application/octet-stream',
+                headers={
+                    'Content-Length': str(length),
+                    'Content-Disposition': f'attachment; filename="{secure_filename(audio_info["filename"]) or "audio"}"'
+                },
+                direct_passthrough=True
+            )
+        except Exception as e:
+            logger.error(f"Audio download error: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+    
     @app.route('/cleanup/<session_id>', methods=['POST'])
     def cleanup_session(session_id):
         """Clean up a specific session"""
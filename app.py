@@ -1,35 +1,56 @@
 """
-Main Flask application entry point
+Main Flask application entry point.
+Serve with `gunicorn 'app:create_app()'` or run this file directly.
+
+Nothing is imported or created at module level: the password process pool
+re-imports this file (as __mp_main__) in each worker when it is run directly,
+and those workers must stay free of the app.
 """
 import atexit
-from flask import Flask
-from flask_cors import CORS
-
-from config import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, PORT, DEBUG, logger
-from database import init_database, close_database
-from api_routes import register_routes, AUDIO_SESSIONS, SESSION_LOCK
 
 
 def create_app():
     """Create and configure the Flask application"""
-    
+    from flask import Flask
+    from flask_cors import CORS
+
+    from config import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, logger
+    from database import init_database
+    from api_routes import register_routes
+    from compression import init_compression
+    from metrics import init_request_metrics
+    from tracing import init_tracing
+
     # Initialize Flask app
     app = Flask(__name__)
     CORS(app)
-    
+
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
-    
+
     # Initializing database
     init_database()
+    init_tracing(app)
     register_routes(app)
-    
+    init_request_metrics(app)
+    init_compression(app)
+    atexit.register(cleanup_all_sessions)
+
     logger.info("Flask application created successfully")
     return app
 
 
 def cleanup_all_sessions():
     """Clean up all sessions and close database on shutdown"""
+    from config import logger
+    from database import close_database
+    from api_routes import AUDIO_SESSIONS, SESSION_LOCK
+    from background_tasks import shutdown_background
+    from auth_service import shutdown_password_executor
+
+    shutdown_background(wait=True)
+    shutdown_password_executor()
+
     with SESSION_LOCK:
         for s_id, data in AUDIO_SESSIONS.items():
             try:
@@ -38,16 +59,14 @@ def cleanup_all_sessions():
             except Exception as e:
                 logger.error(f"Error cleaning up session {s_id}: {e}")
         AUDIO_SESSIONS.clear()
-    
+
     close_database()
     logger.info("Application shutdown complete")
 
-atexit.register(cleanup_all_sessions)
-
-app = create_app()
-
 
 if __name__ == '__main__':
+    from config import PORT, DEBUG, logger
+
+    app = create_app()
     logger.info(f"Starting server on port {PORT} (debug={DEBUG})")
     app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
-
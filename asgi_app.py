@@ -0,0 +1,424 @@
+"""
+Optional ASGI entry point: asyncio handlers for the I/O-bound routes,
+with every other route served by the existing Flask app.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 --timeout 120 asgi_app:app
+"""
+import time
+import uuid
+import shutil
+from datetime import datetime
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, Mount
+from werkzeug.utils import secure_filename
+
+from config import ALLOWED_EXTENSIONS, AUDIO_KEEP_ORIGINAL, MAX_CONTENT_LENGTH, logger
+from app import create_app
+from api_routes import AUDIO_SESSIONS, SESSION_LOCK, INVALID_ANALYSIS_ERROR, cleanup_expired_sessions
+from audio_processor import AudioProcessor, allowed_file
+from audio_storage import schedule_audio_compaction
+from analysis_prefetch import schedule_analysis_prefetch
+from auth_service import decode_token
+from gemini_service import analyze_transcript, AnalysisFormatError, ANALYSIS_MODEL, PROMPT_VERSION
+from analysis_cache import analysis_key, get_or_compute
+from provider_limits import ProviderBusyError
+from compression import compress_body
+from metrics import REQUEST_SECONDS, UPLOAD_STAGE_SECONDS
+from tracing import REQUEST_ID_HEADER, start_trace, finish_trace
+from conditional import make_etag, check_not_modified, validator_headers, not_modified_headers
+from rate_limit import check_request, rejection_body, retry_after_header
+from async_assemblyai import AsyncAssemblyAI
+from async_database import (
+    init_async_database, close_async_database, can_create_transcript_async,
+    get_all_transcripts_async, get_transcript_json_async, save_transcript_async,
+    get_transcript_for_analysis_async, get_transcripts_list_version_async, get_transcript_version_async,
+    iter_transcript_ndjson_async
+)
+
+assemblyai = None
+
+
+def authenticate(request):
+    """Decode the bearer token, returning (payload, error response)"""
+    auth_header = request.headers.get('Authorization')
+    token = None
+    if auth_header:
+        parts = auth_header.split(' ')
+        if len(parts) < 2:
+            return None, JSONResponse({'error': 'Invalid authorization header format'}, status_code=401)
+        token = parts[1]
+    if not token:
+        return None, JSONResponse({'error': 'Authentication token is missing'}, status_code=401)
+
+    payload = decode_token(token)
+    if not payload:
+        return None, JSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+    return payload, None
+
+
+async def admit(user, scope):
+    """Apply rate limits and admission control, returning (admission, 429 response)"""
+    admission = await run_in_threadpool(check_request, user['user_id'], user.get('is_premium', False), scope)
+    if admission.allowed:
+        return admission, None
+    return None, JSONResponse(
+        rejection_body(admission),
+        status_code=429,
+        headers={'Retry-After': str(retry_after_header(admission))}
+    )
+
+
+def json_text_response(request, payload, status_code=200, etag=None, last_modified=None):
+    """Send JSON that was already serialized (by Postgres) without re-encoding it, compressed if accepted"""
+    body, encoding = compress_body(payload.encode('utf-8'), request.headers.get('accept-encoding'), 'application/json')
+    headers = {'Vary': 'Accept-Encoding'}
+    if etag:
+        headers.update(validator_headers(f"{etag}-{encoding}" if encoding else etag, last_modified))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, status_code=status_code, media_type='application/json', headers=headers)
+
+
+def not_modified(request, etag, last_modified=None, date_validates=True):
+    """A 304 response if the client's copy matches etag (or last_modified), otherwise None"""
+    tag = check_not_modified(request.headers, etag, last_modified if date_validates else None)
+    if tag is None:
+        return None
+    return Response(status_code=304, headers=not_modified_headers(tag, last_modified))
+
+
+async def get_all_transcripts_api(request):
+    """Get all transcripts for the current user"""
+    user, error = authenticate(request)
+    if error:
+        return error
+    _, error = await admit(user, 'api')
+    if error:
+        return error
+
+    version = await get_transcripts_list_version_async(user['user_id'])
+    etag = last_modified = None
+    if version:
+        count, last_modified, max_id = version
+        etag = make_etag('transcripts', user['user_id'], count, last_modified, max_id)
+        cached = not_modified(request, etag, last_modified, date_validates=False)
+        if cached:
+            return cached
+
+    transcripts = await get_all_transcripts_async(user['user_id'])
+    if transcripts is None:
+        return JSONResponse({'error': 'Failed to fetch transcripts'}, status_code=500)
+    return json_text_response(
+        request, f'{{"status": "success", "transcripts": {transcripts}}}', etag=etag, last_modified=last_modified
+    )
+
+
+async def get_transcript_api(request):
+    """Get a specific transcript with utterances"""
+    user, error = authenticate(request)
+    if error:
+        return error
+    _, error = await admit(user, 'api')
+    if error:
+        return error
+
+    session_id = request.path_params['session_id']
+    version = await get_transcript_version_async(session_id, user['user_id'])
+    if version is None:
+        return JSONResponse({'error': 'Transcript not found'}, status_code=404)
+    ndjson = (
+        request.query_params.get('format') == 'ndjson'
+        or 'application/x-ndjson' in request.headers.get('accept', '')
+    )
+    etag = make_etag('transcript-ndjson' if ndjson else 'transcript', session_id, version)
+    cached = not_modified(request, etag, version)
+    if cached:
+        cached.headers['Vary'] = 'Accept, Accept-Encoding'
+        return cached
+
+    if ndjson:
+        headers = validator_headers(etag, version)
+        headers['X-Accel-Buffering'] = 'no'
+        headers['Vary'] = 'Accept'
+        return StreamingResponse(
+            iter_transcript_ndjson_async(session_id, user['user_id']),
+            media_type='application/x-ndjson',
+            headers=headers
+        )
+
+    payload = await get_transcript_json_async(session_id, user['user_id'])
+    if not payload:
+        return JSONResponse({'error': 'Transcript not found'}, status_code=404)
+    response = json_text_response(request, payload, etag=etag, last_modified=version)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+
+async def analyze_transcript_api(request):
+    """Analyze transcript with Gemini AI"""
+    user, error = authenticate(request)
+    if error:
+        return error
+    admission, error = await admit(user, 'analyze')
+    if error:
+        return error
+
+    try:
+        session_id = request.path_params['session_id']
+        data = await get_transcript_for_analysis_async(session_id, user['user_id'])
+        if not data:
+            return JSONResponse({'error': 'Transcript not found'}, status_code=404)
+        if not data['text']:
+            return JSONResponse({'error': 'No transcript text available'}, status_code=400)
+
+        key = analysis_key(session_id, data['text'], data['utterances'], ANALYSIS_MODEL, PROMPT_VERSION)
+        analysis, cached = await run_in_threadpool(
+            get_or_compute, key, lambda: analyze_transcript(data['text'], data['utterances'])
+        )
+        return JSONResponse({'status': 'success', 'analysis': analysis, 'cached': cached})
+    except ProviderBusyError as e:
+        logger.warning(f"Analysis queued too long: {e}")
+        return JSONResponse(
+            {'error': 'AI service is busy, please try again shortly'},
+            status_code=503, headers={'Retry-After': str(e.retry_after)}
+        )
+    except AnalysisFormatError as e:
+        logger.error(f"Invalid analysis from Gemini: {e}")
+        return JSONResponse(INVALID_ANALYSIS_ERROR, status_code=502)
+    except ValueError as e:
+        logger.error(f"Configuration error: {e}")
+        return JSONResponse({'error': 'AI service not configured'}, status_code=503)
+    except Exception as e:
+        logger.error(f"Error analyzing transcript: {e}")
+        return JSONResponse({'error': 'Failed to analyze transcript'}, status_code=500)
+    finally:
+        await run_in_threadpool(admission.done)
+
+
+class RequestTooLarge(Exception):
+    """The request body exceeded MAX_CONTENT_LENGTH"""
+
+
+def limit_body(request, max_bytes):
+    """The request with a body that raises RequestTooLarge once more than max_bytes arrive"""
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_bytes:
+                raise RequestTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+def too_large():
+    return JSONResponse({'error': 'File too large. Max is 16MB'}, status_code=413)
+
+
+def save_upload(upload, processor):
+    """Write an uploaded file to the temp folder and decode it (runs in a worker thread)"""
+    filename = secure_filename(upload.filename)
+    if not filename:
+        raise ValueError("Invalid filename")
+    path = processor.temp_path_for(filename)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(upload.file, f)
+    processor.load_audio_file(path, upload.filename)
+
+
+async def upload_file(request):
+    """Upload and process audio file; waiting on AssemblyAI does not hold a thread"""
+    user, error = authenticate(request)
+    if error:
+        return error
+    # The same cap Flask applies through MAX_CONTENT_LENGTH, checked before any of the body is read
+    try:
+        if int(request.headers.get('content-length', 0)) > MAX_CONTENT_LENGTH:
+            return too_large()
+    except ValueError:
+        return JSONResponse({'error': 'Invalid Content-Length'}, status_code=400)
+    admission, error = await admit(user, 'upload')
+    if error:
+        return error
+
+    processor = None
+    try:
+        allowed, transcript_count = await can_create_transcript_async(user['user_id'])
+        if not allowed:
+            return JSONResponse({
+                'error': 'Transcript limit reached',
+                'message': f'Free users can only store 3 transcripts. You have {transcript_count}/3. Upgrade to premium for unlimited transcripts.',
+                'limit_reached': True,
+                'current_count': transcript_count,
+                'limit': 3
+            }, status_code=403)
+
+        try:
+            form = await limit_body(request, MAX_CONTENT_LENGTH).form()
+        except RequestTooLarge:
+            return too_large()
+        upload = form.get('file')
+        if upload is None or not getattr(upload, 'filename', None):
+            return JSONResponse({'error': 'No file selected'}, status_code=400)
+        if not allowed_file(upload.filename):
+            return JSONResponse({'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}, status_code=400)
+
+        await run_in_threadpool(cleanup_expired_sessions)
+
+        processor = AudioProcessor()
+        try:
+            with UPLOAD_STAGE_SECONDS.time(stage='save_audio'):
+                await run_in_threadpool(save_upload, upload, processor)
+        except Exception as e:
+            logger.error(f"Error saving audio: {e}")
+            processor.cleanup()
+            return JSONResponse({'error': 'File save failed'}, status_code=500)
+
+        with UPLOAD_STAGE_SECONDS.time(stage='assemblyai_upload'):
+            audio_url = await assemblyai.upload(processor.audio_path)
+        if not audio_url:
+            processor.cleanup()
+            return JSONResponse({'error': 'Upload failed'}, status_code=500)
+
+        with UPLOAD_STAGE_SECONDS.time(stage='transcription_request'):
+            transcript_id = await assemblyai.request_transcription(audio_url)
+        if not transcript_id:
+            processor.cleanup()
+            return JSONResponse({'error': 'Transcription request failed'}, status_code=500)
+
+        with UPLOAD_STAGE_SECONDS.time(stage='transcription_poll'):
+            result = await assemblyai.poll_transcription(transcript_id)
+        if not result:
+            processor.cleanup()
+            return JSONResponse({'error': 'Transcription timed out or failed'}, status_code=500)
+
+        session_id = str(uuid.uuid4())
+        transcript_data = {
+            'transcript_id': transcript_id,
+            'text': result.get('text', ''),
+            'utterances': result.get('utterances', []),
+            'confidence': result.get('confidence', 0),
+            'audio_duration': result.get('audio_duration', 0)
+        }
+
+        audio_data, audio_mimetype = await run_in_threadpool(processor.get_audio_data)
+        with UPLOAD_STAGE_SECONDS.time(stage='db_save'):
+            save_success = await save_transcript_async(
+                session_id,
+                transcript_data,
+                upload.filename,
+                audio_data=audio_data,
+                audio_mimetype=audio_mimetype,
+                user_id=user['user_id']
+            )
+
+        if not save_success:
+            logger.warning(f"Failed to save transcript to database for session: {session_id}")
+        else:
+            if audio_data is not None:
+                keep_original = form.get('keep_original')
+                await run_in_threadpool(
+                    schedule_audio_compaction,
+                    session_id,
+                    processor.audio_segment,
+                    len(audio_data),
+                    keep_original=AUDIO_KEEP_ORIGINAL if keep_original is None else keep_original.lower() == 'true'
+                )
+            # Takes the user's prefetch budget from the shared SQLite state
+            await run_in_threadpool(
+                schedule_analysis_prefetch,
+                session_id, user['user_id'], transcript_data['text'], transcript_data['utterances']
+            )
+
+        with SESSION_LOCK:
+            AUDIO_SESSIONS[session_id] = {
+                'processor': processor,
+                'created_at': datetime.now()
+            }
+
+        return JSONResponse({
+            'status': 'success',
+            'session_id': session_id,
+            'result': transcript_data,
+            'saved_to_db': save_success,
+            'audio_stored': save_success and audio_data is not None
+        })
+
+    except ProviderBusyError as e:
+        logger.warning(f"Transcription queued too long: {e}")
+        if processor:
+            processor.cleanup()
+        return JSONResponse(
+            {'error': 'Transcription service is busy, please try again shortly'},
+            status_code=503, headers={'Retry-After': str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Upload route error: {e}")
+        return JSONResponse({'error': 'Internal server error'}, status_code=500)
+    finally:
+        await run_in_threadpool(admission.done)
+
+
+def timed(route, handler):
+    """Record and trace a native route the way Flask routes are recorded and traced"""
+    async def endpoint(request):
+        started = time.perf_counter()
+        status = 500
+        trace, token = start_trace(f"{request.method} {route}", request.headers.get(REQUEST_ID_HEADER))
+        error = None
+        try:
+            response = await handler(request)
+            status = response.status_code
+            response.headers[REQUEST_ID_HEADER] = trace.request_id
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            trace.attrs['status'] = status
+            finish_trace(trace, token, error)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=request.method, route=route, status=status
+            )
+    return endpoint
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global assemblyai
+    await init_async_database()
+    assemblyai = AsyncAssemblyAI()
+    logger.info("ASGI application started")
+    try:
+        yield
+    finally:
+        await assemblyai.close()
+        await close_async_database()
+
+
+app = Starlette(
+    routes=[
+        Route('/upload', timed('/upload', upload_file), methods=['POST']),
+        Route('/api/transcripts', timed('/api/transcripts', get_all_transcripts_api), methods=['GET']),
+        Route('/api/transcript/{session_id}', timed('/api/transcript/<session_id>', get_transcript_api), methods=['GET']),
+        Route('/api/analyze/{session_id}', timed('/api/analyze/<session_id>', analyze_transcript_api), methods=['POST']),
+        Mount('/', app=WSGIMiddleware(create_app())),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,95 @@
+"""
+Async AssemblyAI client for the ASGI serving mode (httpx)
+"""
+import asyncio
+import httpx
+
+from config import ASSEMBLYAI_HEADERS, logger
+from audio_processor import check_throttled
+from provider_limits import provider_slot_async, ProviderBusyError
+from metrics import POLL_ITERATIONS
+
+ASSEMBLYAI_BASE_URL = 'https://api.assemblyai.com/v2'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class AsyncAssemblyAI:
+    """Async counterpart of the AssemblyAI calls in AudioProcessor, sharing one connection pool"""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            base_url=ASSEMBLYAI_BASE_URL,
+            headers=ASSEMBLYAI_HEADERS,
+            timeout=httpx.Timeout(30, read=300),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def upload(self, audio_path):
+        """Stream an audio file to AssemblyAI"""
+        async def chunks():
+            with open(audio_path, 'rb') as f:
+                while True:
+                    chunk = await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        try:
+            async with provider_slot_async('assemblyai'):
+                response = await self.client.post('/upload', content=chunks())
+            await asyncio.to_thread(check_throttled, response)
+            response.raise_for_status()
+            return response.json()['upload_url']
+        except ProviderBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Upload error: {e}")
+            return None
+
+    async def request_transcription(self, audio_url):
+        """Request transcription from AssemblyAI"""
+        try:
+            async with provider_slot_async('assemblyai'):
+                response = await self.client.post('/transcript', json={
+                    'audio_url': audio_url,
+                    'speaker_labels': True,
+                    'language_code': 'en_us',
+                    'punctuate': True,
+                    'format_text': True
+                })
+            await asyncio.to_thread(check_throttled, response)
+            response.raise_for_status()
+            return response.json()['id']
+        except ProviderBusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Transcription request error: {e}")
+            return None
+
+    async def poll_transcription(self, transcript_id, attempts=120, interval=5):
+        """Poll AssemblyAI for transcription completion without blocking the event loop"""
+        for _ in range(attempts):
+            POLL_ITERATIONS.inc()
+            try:
+                async with provider_slot_async('assemblyai'):
+                    response = await self.client.get(f'/transcript/{transcript_id}')
+                await asyncio.to_thread(check_throttled, response)
+                response.raise_for_status()
+                result = response.json()
+
+                if result['status'] == 'completed':
+                    return result
+                elif result['status'] == 'error':
+                    logger.error(f"Transcription error: {result.get('error', 'Unknown')}")
+                    return None
+            except ProviderBusyError:
+                raise
+            except Exception as e:
+                logger.error(f"Polling error: {e}")
+            await asyncio.sleep(interval)
+
+        logger.error("Polling timeout")
+        return None
@@ -0,0 +1,243 @@
+"""
+Async database operations for the ASGI serving mode (asyncpg)
+"""
+import json
+import asyncio
+import asyncpg
+
+from config import DATABASE_URL, UTTERANCE_STORAGE, logger
+from database import (
+    TRANSCRIPT_JSON_FIELDS, UTTERANCES_JSON_AGG, TRANSCRIPT_JSON_SELECT, TRANSCRIPT_VERSION, POOL_MAX_CONNECTIONS,
+    UTTERANCE_BATCH_SIZE, mark_user_write, splice_transcript_json
+)
+from utterance_codec import encode_utterances, decode_utterances, iter_utterances, normalize_utterance
+from profile_cache import invalidate_user_profile
+
+async_pool = None
+
+
+async def init_async_database():
+    """Initialize the asyncpg connection pool"""
+    global async_pool
+    async_pool = await asyncpg.create_pool(
+        dsn=DATABASE_URL,
+        ssl='require',
+        min_size=1,
+        max_size=POOL_MAX_CONNECTIONS,
+        timeout=10,
+        command_timeout=60
+    )
+    logger.info("Async database connection pool initialized successfully")
+
+
+async def close_async_database():
+    """Close all async database connections"""
+    global async_pool
+    if async_pool:
+        await async_pool.close()
+        async_pool = None
+        logger.info("Async database connection pool closed")
+
+
+async def can_create_transcript_async(user_id):
+    """Check if user can create a new transcript (based on limits)"""
+    try:
+        row = await async_pool.fetchrow("""
+            SELECT u.is_premium,
+                   (SELECT COUNT(*) FROM transcripts WHERE user_id = u.id) AS transcript_count
+            FROM users u
+            WHERE u.id = $1
+        """, user_id)
+        if not row:
+            return False, 0
+        return row['is_premium'] or row['transcript_count'] < 3, row['transcript_count']
+    except Exception as e:
+        logger.error(f"Error checking transcript limit: {e}")
+        return False, 0
+
+
+async def get_all_transcripts_async(user_id):
+    """Get all transcripts for a user as a ready-to-send JSON array"""
+    try:
+        payload = await async_pool.fetchval("""
+            SELECT COALESCE(json_agg(json_build_object(
+                'session_id', t.session_id,
+                'filename', t.filename,
+                'text', t.text,
+                'confidence', t.confidence,
+                'audio_duration', t.audio_duration,
+                'audio_size', t.audio_size,
+                'audio_mimetype', t.audio_mimetype,
+                'created_at', to_char(t.created_at, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"')
+            ) ORDER BY t.created_at DESC), '[]'::json)::text
+            FROM transcripts t
+            WHERE t.user_id = $1
+        """, user_id)
+        return payload
+    except Exception as e:
+        logger.error(f"Error retrieving transcripts: {e}")
+        return None
+
+
+async def get_transcripts_list_version_async(user_id):
+    """Async variant of database.get_transcripts_list_version"""
+    try:
+        row = await async_pool.fetchrow(
+            f"SELECT COUNT(*), MAX({TRANSCRIPT_VERSION}), MAX(t.id) FROM transcripts t WHERE t.user_id = $1", user_id
+        )
+        return tuple(row)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript list version: {e}")
+        return None
+
+
+async def get_transcript_version_async(session_id, user_id=None):
+    """Async variant of database.get_transcript_version_from_db"""
+    try:
+        if user_id is not None:
+            return await async_pool.fetchval(
+                f"SELECT {TRANSCRIPT_VERSION} FROM transcripts t WHERE t.session_id = $1 AND t.user_id = $2",
+                session_id, user_id
+            )
+        return await async_pool.fetchval(
+            f"SELECT {TRANSCRIPT_VERSION} FROM transcripts t WHERE t.session_id = $1", session_id
+        )
+    except Exception as e:
+        logger.error(f"Error retrieving transcript version: {e}")
+        return None
+
+
+async def get_transcript_json_async(session_id, user_id=None):
+    """Async variant of database.get_transcript_json_from_db"""
+    if user_id is not None:
+        where_clause, params = "WHERE t.session_id = $1 AND t.user_id = $2", (session_id, user_id)
+    else:
+        where_clause, params = "WHERE t.session_id = $1", (session_id,)
+
+    try:
+        row = await async_pool.fetchrow(f"{TRANSCRIPT_JSON_SELECT} {where_clause}", *params)
+        if not row:
+            return None
+        return splice_transcript_json(*row)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript JSON: {e}")
+        return None
+
+
+async def iter_transcript_ndjson_async(session_id, user_id=None, batch_size=UTTERANCE_BATCH_SIZE):
+    """Async variant of database.iter_transcript_ndjson, reading utterances through a cursor"""
+    if user_id is not None:
+        where_clause, params = "WHERE t.session_id = $1 AND t.user_id = $2", (session_id, user_id)
+    else:
+        where_clause, params = "WHERE t.session_id = $1", (session_id,)
+
+    async with async_pool.acquire() as conn:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            row = await conn.fetchrow(f"""
+                SELECT json_build_object('type', 'transcript', {TRANSCRIPT_JSON_FIELDS})::text AS header,
+                       t.utterance_pack
+                FROM transcripts t {where_clause}
+            """, *params)
+            if not row:
+                yield json.dumps({'type': 'error', 'error': 'Transcript not found'}) + '\n'
+                return
+            yield row['header'] + '\n'
+
+            count = 0
+            if row['utterance_pack'] is not None:
+                batch = []
+                for utterance in iter_utterances(row['utterance_pack']):
+                    batch.append(json.dumps({'type': 'utterance', **utterance}))
+                    if len(batch) >= batch_size:
+                        count += len(batch)
+                        yield '\n'.join(batch) + '\n'
+                        batch = []
+                if batch:
+                    count += len(batch)
+                    yield '\n'.join(batch) + '\n'
+            else:
+                cursor = await conn.cursor("""
+                    SELECT json_build_object(
+                        'type', 'utterance',
+                        'speaker', u.speaker,
+                        'text', u.text,
+                        'confidence', u.confidence,
+                        'start_time', u.start_time,
+                        'end_time', u.end_time
+                    )::text
+                    FROM utterances u
+                    WHERE u.transcript_session_id = $1
+                    ORDER BY u.start_time
+                """, session_id)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    yield '\n'.join(r[0] for r in rows) + '\n'
+
+            yield json.dumps({'type': 'end', 'utterance_count': count}) + '\n'
+
+
+async def save_transcript_async(session_id, transcript_data, filename, audio_data=None, audio_mimetype=None, user_id=None):
+    """Async variant of database.save_transcript_to_db for new uploads"""
+    utterances = transcript_data.get('utterances', [])
+    utterance_pack = encode_utterances(utterances) if UTTERANCE_STORAGE in ('packed', 'both') else None
+
+    try:
+        async with async_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("""
+                    INSERT INTO transcripts (
+                        session_id, transcript_id, filename, text, confidence,
+                        audio_duration, speaker_labels, language_code,
+                        audio_data, audio_mimetype, audio_size, user_id, utterance_pack
+                    ) VALUES ($1, $2, $3, $4, $5, $6, TRUE, 'en_us', $7, $8, $9, $10, $11)
+                """,
+                    session_id,
+                    transcript_data.get('transcript_id', ''),
+                    filename,
+                    transcript_data.get('text', ''),
+                    transcript_data.get('confidence', 0),
+                    transcript_data.get('audio_duration', 0),
+                    audio_data,
+                    audio_mimetype,
+                    len(audio_data) if audio_data else None,
+                    user_id,
+                    utterance_pack
+                )
+                if utterances and UTTERANCE_STORAGE in ('rows', 'both'):
+                    await conn.executemany("""
+                        INSERT INTO utterances (
+                            transcript_session_id, speaker, text, confidence, start_time, end_time
+                        ) VALUES ($1, $2, $3, $4, $5, $6)
+                    """, [(session_id, *normalize_utterance(u)) for u in utterances])
+        # Both write the shared SQLite state, so they stay off the event loop
+        await asyncio.to_thread(mark_user_write, user_id)
+        await asyncio.to_thread(invalidate_user_profile, user_id)
+        logger.info(f"Transcript saved successfully: {session_id}")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving transcript: {e}")
+        return False
+
+
+async def get_transcript_for_analysis_async(session_id, user_id):
+    """Fetch the text and utterances of user_id's transcript, used for analysis"""
+    try:
+        row = await async_pool.fetchrow(f"""
+            SELECT t.text, t.utterance_pack,
+                   CASE WHEN t.utterance_pack IS NULL THEN {UTTERANCES_JSON_AGG}::text END AS utterances
+            FROM transcripts t
+            WHERE t.session_id = $1 AND t.user_id = $2
+        """, session_id, user_id)
+        if not row:
+            return None
+        if row['utterance_pack'] is not None:
+            utterances = decode_utterances(row['utterance_pack'])
+        else:
+            utterances = json.loads(row['utterances'])
+        return {'text': row['text'], 'utterances': utterances}
+    except Exception as e:
+        logger.error(f"Error retrieving transcript: {e}")
+        return None
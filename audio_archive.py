@@ -0,0 +1,120 @@
+"""
+Cold-tier audio store and on-demand rehydration
+"""
+import os
+import re
+import tempfile
+
+from config import AUDIO_ARCHIVE_DIR, AUDIO_REHYDRATE_CACHE_MB, logger
+from cache_utils import LRUCache
+
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+
+
+class LocalArchiveStore:
+    """
+    Archive store backed by a local directory, standing in for an object store.
+    Objects are addressed by string keys and written atomically.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+(/[A-Za-z0-9_.-]+)*', key) or '..' in key:
+            raise ValueError(f"Invalid archive key: {key}")
+        return os.path.join(self.root, key)
+
+    def put(self, key, chunks):
+        """Write an object from an iterable of byte blocks; returns bytes written"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def iter(self, key, chunk_size=ARCHIVE_CHUNK_SIZE):
+        """Yield an object in fixed-size blocks"""
+        with open(self._path(key), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size(self, key):
+        """Return an object's size in bytes, or None if it does not exist"""
+        try:
+            return os.path.getsize(self._path(key))
+        except OSError:
+            return None
+
+    def delete_prefix(self, prefix):
+        """Remove every object under a key prefix"""
+        directory = self._path(prefix)
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+archive_store = LocalArchiveStore(AUDIO_ARCHIVE_DIR)
+
+# Rehydrated audio, keyed by archive object key and bounded by total bytes
+rehydrate_cache = LRUCache(max_weight=AUDIO_REHYDRATE_CACHE_MB * 1024 * 1024)
+
+
+def archive_object_key(archive_prefix, column):
+    """Key of one stored audio column (audio_data or audio_original) under a transcript's prefix"""
+    return f"{archive_prefix}/{column}"
+
+
+def read_archived_audio(archive_prefix, column='audio_data'):
+    """Rehydrate a whole archived audio object, serving repeats from the cache"""
+    key = archive_object_key(archive_prefix, column)
+    data = rehydrate_cache.get(key)
+    if data is None:
+        if archive_store.size(key) is None:
+            return None
+        data = b''.join(archive_store.iter(key))
+        rehydrate_cache.set(key, data)
+        logger.info(f"Rehydrated archived audio {key} ({len(data)} bytes)")
+    return data
+
+
+def iter_archived_audio(archive_prefix, column='audio_data', chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Yield archived audio in fixed-size blocks.
+    Objects that fit in the rehydration cache are read once and cached;
+    larger ones are streamed straight from the store.
+    """
+    key = archive_object_key(archive_prefix, column)
+    data = rehydrate_cache.get(key)
+    if data is None:
+        size = archive_store.size(key)
+        if size is None:
+            return
+        if size > rehydrate_cache.max_weight:
+            yield from archive_store.iter(key, chunk_size)
+            return
+        data = read_archived_audio(archive_prefix, column)
+        if data is None:
+            return
+    
+    view = memoryview(data)
+    for offset in range(0, len(data), chunk_size):
+        yield bytes(view[offset:offset + chunk_size])
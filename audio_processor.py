@@ -5,11 +5,21 @@ import os
 import io
 import uuid
 import time
+import tempfile
 import requests
 from datetime import datetime
 from pydub import AudioSegment
 from werkzeug.utils import secure_filename
 from config import ASSEMBLYAI_HEADERS, ALLOWED_EXTENSIONS, UPLOAD_FOLDER, logger
+from provider_limits import provider_slot, report_throttled, ProviderBusyError
+from metrics import POLL_ITERATIONS
+from tracing import traced
+
+
+def check_throttled(response):
+    """Make every worker back off when AssemblyAI answers 429"""
+    if response.status_code == 429:
+        report_throttled('assemblyai', response.headers.get('Retry-After'))
 
 
 def allowed_file(filename):
@@ -30,6 +40,34 @@ def get_mimetype_from_extension(filename):
     return mimetype_map.get(ext, 'audio/mpeg')
 
 
+def extract_segment_from_chunks(chunks, start_ms, end_ms):
+    """
+    Extract an mp3 segment from audio delivered as an iterable of byte blocks.
+    The blocks are spooled to a temp file rather than joined in memory, and only
+    the requested time range is decoded.
+    """
+    try:
+        with tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix='.audio') as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            spool.flush()
+            
+            segment = AudioSegment.from_file(
+                spool.name,
+                start_second=start_ms / 1000,
+                duration=(end_ms - start_ms) / 1000
+            )
+        
+        buffer = io.BytesIO()
+        segment.export(buffer, format="mp3")
+        buffer.seek(0)
+        return buffer
+        
+    except Exception as e:
+        logger.error(f"Stream extraction error: {e}")
+        return None
+
+
 class AudioProcessor:
     """Handles audio file processing and transcription"""
     
@@ -41,6 +79,7 @@ class AudioProcessor:
         self.audio_mimetype = None
         self.created_at = datetime.now()
 
+    @traced('audio.save_audio_file')
     def save_audio_file(self, file):
         """Save uploaded audio file to temporary location"""
         try:
@@ -51,18 +90,10 @@ class AudioProcessor:
             if not filename:
                 raise ValueError("Invalid filename")
             
-            unique_id = str(uuid.uuid4())
-            path = os.path.join(UPLOAD_FOLDER, f"{unique_id}_{filename}")
+            path = self.temp_path_for(filename)
             file.save(path)
             
-            self.audio_path = path
-            self.audio_segment = AudioSegment.from_file(path)
-            self.audio_mimetype = get_mimetype_from_extension(file.filename)
-            
-            # Read audio data into memory for database storage
-            with open(path, 'rb') as audio_file:
-                self.audio_data = audio_file.read()
-            
+            self.load_audio_file(path, file.filename)
             return True
             
         except Exception as e:
@@ -71,52 +102,81 @@ class AudioProcessor:
                 os.remove(self.audio_path)
             return False
 
+    @staticmethod
+    def temp_path_for(filename):
+        """Return a unique temp path for an already-secured upload filename"""
+        unique_id = str(uuid.uuid4())
+        return os.path.join(UPLOAD_FOLDER, f"{unique_id}_{filename}")
+
+    @traced('audio.load_audio_file')
+    def load_audio_file(self, path, original_filename):
+        """Decode a saved upload and read it into memory for database storage"""
+        self.audio_path = path
+        self.audio_segment = AudioSegment.from_file(path)
+        self.audio_mimetype = get_mimetype_from_extension(original_filename)
+        
+        with open(path, 'rb') as audio_file:
+            self.audio_data = audio_file.read()
+
+    @traced('audio.upload_to_assemblyai')
     def upload_to_assemblyai(self):
         """Upload audio file to AssemblyAI"""
         try:
-            with open(self.audio_path, 'rb') as f:
+            with open(self.audio_path, 'rb') as f, provider_slot('assemblyai'):
                 response = requests.post(
                     'https://api.assemblyai.com/v2/upload',
                     headers=self.headers,
                     data=f,
                     timeout=300
                 )
-                response.raise_for_status()
-                return response.json()['upload_url']
+            check_throttled(response)
+            response.raise_for_status()
+            return response.json()['upload_url']
                 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             logger.error(f"Upload error: {e}")
             return None
 
+    @traced('audio.request_transcription')
     def request_transcription(self, audio_url):
         """Request transcription from AssemblyAI"""
         try:
-            response = requests.post(
-                'https://api.assemblyai.com/v2/transcript',
-                headers=self.headers,
-                json={
-                    'audio_url': audio_url,
-                    'speaker_labels': True,
-                    'language_code': 'en_us',
-                    'punctuate': True,
-                    'format_text': True
-                },
-                timeout=30
-            )
+            with provider_slot('assemblyai'):
+                response = requests.post(
+                    'https://api.assemblyai.com/v2/transcript',
+                    headers=self.headers,
+                    json={
+                        'audio_url': audio_url,
+                        'speaker_labels': True,
+                        'language_code': 'en_us',
+                        'punctuate': True,
+                        'format_text': True
+                    },
+                    timeout=30
+                )
+            check_throttled(response)
             response.raise_for_status()
             return response.json()['id']
             
+        except ProviderBusyError:
+            raise
         except Exception as e:
             logger.error(f"Transcription request error: {e}")
             return None
 
+    @traced('audio.poll_transcription')
     def poll_transcription(self, transcript_id):
         """Poll AssemblyAI for transcription completion"""
         url = f"https://api.assemblyai.com/v2/transcript/{transcript_id}"
         
         for _ in range(120): 
+            POLL_ITERATIONS.inc()
             try:
-                response = requests.get(url, headers=self.headers, timeout=30)
+                with provider_slot('assemblyai'):
+                    response = requests.get(url, headers=self.headers, timeout=30)
+                check_throttled(response)
                 response.raise_for_status()
                 result = response.json()
                 
@@ -128,6 +188,8 @@ class AudioProcessor:
                     
                 time.sleep(5)
                 
+            except ProviderBusyError:
+                raise
             except Exception as e:
                 logger.error(f"Polling error: {e}")
                 time.sleep(5)
@@ -135,6 +197,7 @@ class AudioProcessor:
         logger.error("Polling timeout")
         return None
 
+    @traced('audio.extract_audio_segment')
     def extract_audio_segment(self, start_ms, end_ms):
         """Extract a segment of audio between start and end times"""
         try:
@@ -0,0 +1,92 @@
+"""
+Retention job: moves cold audio out of the database into the archive tier
+"""
+from config import AUDIO_RETENTION_DAYS, logger
+from database import get_db_connection, return_db_connection, AUDIO_CHUNK_SIZE, STORAGE_MAINTENANCE
+from audio_archive import archive_store, archive_object_key
+
+
+def iter_locked_audio(cursor, row_id, column, chunk_size=AUDIO_CHUNK_SIZE):
+    """Yield a locked row's audio in blocks, read through the transaction holding its lock"""
+    offset = 1
+    while True:
+        cursor.execute(
+            f"SELECT substring({column} FROM %s FOR %s) FROM transcripts WHERE id = %s",
+            (offset, chunk_size, row_id)
+        )
+        row = cursor.fetchone()
+        if not row or not row[0]:
+            break
+        chunk = bytes(row[0])
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
+        offset += chunk_size
+
+
+def archive_cold_audio(retention_days=AUDIO_RETENTION_DAYS, batch_size=20, max_batches=None):
+    """
+    Move audio of transcripts older than retention_days to the archive store.
+    Each batch locks its rows with SKIP LOCKED, copies their audio to the
+    archive (reading it on the primary, in the same transaction), then swaps the
+    BYTEA columns for an archive pointer and commits,
+    so the job is safe to run against a live database, can run concurrently
+    with itself, and resumes where it stopped. Archive keys are deterministic,
+    so a crash between the copy and the commit is repaired by the next run.
+    Returns: number of transcripts archived
+    """
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        conn = None
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(STORAGE_MAINTENANCE)
+            cursor.execute("""
+                SELECT id, session_id, audio_original IS NOT NULL
+                FROM transcripts
+                WHERE audio_data IS NOT NULL
+                  AND audio_archive_key IS NULL
+                  AND created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (retention_days, batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                conn.commit()
+                break
+
+            for row_id, session_id, has_original in batch:
+                prefix = session_id
+                columns = ['audio_data', 'audio_original'] if has_original else ['audio_data']
+                for column in columns:
+                    archive_store.put(
+                        archive_object_key(prefix, column),
+                        iter_locked_audio(cursor, row_id, column)
+                    )
+                cursor.execute("""
+                    UPDATE transcripts SET
+                        audio_archive_key = %s,
+                        audio_archived_at = CURRENT_TIMESTAMP,
+                        audio_data = NULL,
+                        audio_original = NULL
+                    WHERE id = %s
+                """, (prefix, row_id))
+
+            conn.commit()
+            archived += len(batch)
+            batches += 1
+            logger.info(f"Archived audio for {len(batch)} transcripts ({archived} total)")
+
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"Audio archive batch failed: {e}")
+            raise
+        finally:
+            if conn:
+                return_db_connection(conn)
+
+    return archived
@@ -0,0 +1,117 @@
+"""
+Compact at-rest audio storage: re-encodes stored uploads to a speech codec
+"""
+import io
+import tempfile
+from pydub import AudioSegment
+
+from config import (
+    AUDIO_STORAGE_CODEC, AUDIO_STORAGE_BITRATE, AUDIO_KEEP_ORIGINAL, UPLOAD_FOLDER, logger
+)
+from database import (
+    iter_audio_from_db, store_compact_audio, mark_audio_codec, get_uncompacted_session_ids
+)
+from background_tasks import submit_background
+
+# Export settings per storage codec
+STORAGE_CODECS = {
+    'opus': {'format': 'ogg', 'codec': 'libopus', 'mimetype': 'audio/ogg'},
+    'mp3': {'format': 'mp3', 'codec': None, 'mimetype': 'audio/mpeg'},
+}
+
+
+def compaction_enabled():
+    """Check whether stored audio should be re-encoded"""
+    return AUDIO_STORAGE_CODEC in STORAGE_CODECS
+
+
+def encode_compact_audio(audio_segment, codec=AUDIO_STORAGE_CODEC, bitrate=AUDIO_STORAGE_BITRATE):
+    """
+    Encode an AudioSegment as mono speech audio with the storage codec
+    Returns: (audio bytes, mimetype, codec label)
+    """
+    settings = STORAGE_CODECS[codec]
+    buffer = io.BytesIO()
+    audio_segment.set_channels(1).export(
+        buffer,
+        format=settings['format'],
+        codec=settings['codec'],
+        bitrate=bitrate
+    )
+    return buffer.getvalue(), settings['mimetype'], f"{codec}@{bitrate}"
+
+
+def load_stored_audio(session_id):
+    """Decode a transcript's stored audio from the database"""
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix='.audio') as spool:
+        for chunk in iter_audio_from_db(session_id):
+            spool.write(chunk)
+        spool.flush()
+        if spool.tell() == 0:
+            return None
+        return AudioSegment.from_file(spool.name)
+
+
+def compact_transcript_audio(session_id, audio_segment=None, original_size=None, keep_original=AUDIO_KEEP_ORIGINAL):
+    """
+    Replace a transcript's stored audio with a compact encoding.
+    Uses the already-decoded upload when given, otherwise decodes the stored copy.
+    The stored audio is left alone when the compact copy would not be smaller.
+    Returns: True if the stored audio was replaced
+    """
+    if not compaction_enabled():
+        return False
+
+    if audio_segment is None:
+        audio_segment = load_stored_audio(session_id)
+        if audio_segment is None:
+            return False
+
+    compact_data, mimetype, codec = encode_compact_audio(audio_segment)
+    if original_size is not None and len(compact_data) >= original_size:
+        logger.info(f"Stored audio for {session_id} is already compact ({original_size} bytes)")
+        mark_audio_codec(session_id, 'original')
+        return False
+
+    replaced = store_compact_audio(session_id, compact_data, mimetype, codec, keep_original)
+    if replaced:
+        logger.info(
+            f"Compacted audio for {session_id} to {codec}: "
+            f"{original_size if original_size is not None else '?'} -> {len(compact_data)} bytes"
+        )
+    return replaced
+
+
+def schedule_audio_compaction(session_id, audio_segment, original_size, keep_original=AUDIO_KEEP_ORIGINAL):
+    """Compact a freshly saved upload on the background executor"""
+    if not compaction_enabled():
+        return None
+    return submit_background(
+        f"compact-audio:{session_id}",
+        compact_transcript_audio,
+        session_id,
+        audio_segment=audio_segment,
+        original_size=original_size,
+        keep_original=keep_original
+    )
+
+
+def compact_stored_audio_backlog(batch_size=20, keep_original=AUDIO_KEEP_ORIGINAL):
+    """
+    Compact audio stored before compaction was enabled, one batch at a time.
+    Progress is tracked in the rows themselves, so the job can be stopped and rerun.
+    Returns: number of transcripts compacted
+    """
+    compacted = 0
+    after_id = 0
+    while True:
+        batch = get_uncompacted_session_ids(batch_size, after_id)
+        if not batch:
+            return compacted
+        for row_id, session_id, audio_size in batch:
+            after_id = row_id
+            try:
+                if compact_transcript_audio(session_id, original_size=audio_size, keep_original=keep_original):
+                    compacted += 1
+            except Exception as e:
+                logger.error(f"Could not compact audio for {session_id}: {e}")
@@ -2,28 +2,113 @@
 Authentication service for JWT-based user authentication
 """
 import jwt
-import bcrypt
 import os
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 from dotenv import load_dotenv
 
+from cache_utils import LRUCache
+from password_worker import hash_password_in_worker, verify_password_in_worker
+
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Configure JWT From env
 JWT_SECRET = os.getenv('JWT_SECRET')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24 * 7 
 
+# Verified token claims are cached per worker so repeat requests skip signature checks.
+# Entries never outlive the token's own expiry.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv('TOKEN_CACHE_TTL_SECONDS', 300))
+token_cache = LRUCache(max_entries=TOKEN_CACHE_SIZE)
+
+# bcrypt runs in a small process pool so password work never holds a request worker's CPU
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', 2))
+# Password operations allowed to wait or run at once per app worker before new ones are refused
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', 16))
+PASSWORD_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_TIMEOUT_SECONDS', 5))
+
+password_executor = None
+password_executor_pid = None
+password_executor_lock = threading.Lock()
+password_slots = threading.BoundedSemaphore(PASSWORD_QUEUE_LIMIT)
+
+class PasswordServiceBusy(Exception):
+    """Too many password operations are queued, or one took longer than its timeout"""
+
+def get_password_executor():
+    """Return this process's password pool, creating it on first use (and after a fork)"""
+    global password_executor, password_executor_pid
+    with password_executor_lock:
+        if password_executor is None or password_executor_pid != os.getpid():
+            password_executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            password_executor_pid = os.getpid()
+        return password_executor
+
+def reset_password_executor(broken):
+    global password_executor
+    with password_executor_lock:
+        if password_executor is broken:
+            password_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def run_password_task(fn, *args):
+    """Run a bcrypt task in the password pool, bounded by queue depth and timeout"""
+    if not password_slots.acquire(blocking=False):
+        raise PasswordServiceBusy("Too many password operations in progress")
+    try:
+        executor = get_password_executor()
+        future = executor.submit(fn, *args)
+    except BaseException:
+        password_slots.release()
+        raise
+    # The slot is held until the task really finishes: a bcrypt call that is already
+    # running keeps its worker busy even after this caller has given up on it
+    future.add_done_callback(lambda _: password_slots.release())
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        raise PasswordServiceBusy(f"Password operation timed out after {PASSWORD_TIMEOUT_SECONDS}s")
+    except BrokenProcessPool:
+        reset_password_executor(executor)
+        raise
+
+def shutdown_password_executor():
+    global password_executor
+    with password_executor_lock:
+        if password_executor is not None and password_executor_pid == os.getpid():
+            password_executor.shutdown(wait=False, cancel_futures=True)
+        password_executor = None
+
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Hash a password using bcrypt at BCRYPT_ROUNDS"""
+    return run_password_task(hash_password_in_worker, password, BCRYPT_ROUNDS)
 
 def verify_password(password, hashed_password):
     """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return run_password_task(verify_password_in_worker, password, hashed_password)
+
+def password_needs_rehash(hashed_password):
+    """True if a bcrypt hash ($2b$<cost>$...) was made at a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
 
 def generate_token(user_id, email, is_premium=False):
     """Generate a JWT token for a user"""
@@ -37,14 +122,21 @@ def generate_token(user_id, email, is_premium=False):
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 def decode_token(token):
-    """Decode and verify a JWT token"""
+    """Decode and verify a JWT token, reusing claims verified recently"""
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    ttl = min(TOKEN_CACHE_TTL_SECONDS, payload.get('exp', 0) - time.time())
+    if ttl > 0:
+        token_cache.set(key, payload, ttl=ttl)
+    return payload
 
 def token_required(f):
     """Decorator to require JWT authentication for routes"""
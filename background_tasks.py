@@ -0,0 +1,34 @@
+"""
+Bounded background executor for work that should not block a request
+"""
+from concurrent.futures import ThreadPoolExecutor
+from config import BACKGROUND_WORKERS, logger
+from tracing import current_request_id, trace_context
+
+executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+
+
+def submit_background(name, fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the background executor, logging any failure.
+    The task is traced on its own, under the request id of the request that submitted it.
+    """
+    request_id = current_request_id()
+
+    def run():
+        with trace_context(f"background:{name}", request_id):
+            return fn(*args, **kwargs)
+
+    def log_failure(future):
+        error = future.exception()
+        if error:
+            logger.error(f"Background task {name} failed: {error}")
+
+    future = executor.submit(run)
+    future.add_done_callback(log_failure)
+    return future
+
+
+def shutdown_background(wait=True):
+    """Stop accepting background work and optionally wait for running tasks"""
+    executor.shutdown(wait=wait)
@@ -0,0 +1,98 @@
+"""
+Login throughput benchmark: concurrent logins plus a probe of a cheap route,
+showing both login capacity and how much password hashing delays other requests
+
+Usage:
+    python benchmarks/bench_login.py --url http://localhost:8000 \
+        --email bench@example.com --password secret123 --concurrency 16 --requests 200
+"""
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(label, latencies, statuses, elapsed=None):
+    ms = sorted(latency * 1000 for latency in latencies)
+    print(label)
+    line = f"  requests: {len(ms)}  statuses: {dict(statuses)}"
+    if elapsed:
+        line += f"  throughput: {len(ms) / elapsed:.1f} req/s"
+    print(line)
+    print(f"  p50: {percentile(ms, 0.50):.1f} ms  p95: {percentile(ms, 0.95):.1f} ms  p99: {percentile(ms, 0.99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login throughput')
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the API')
+    parser.add_argument('--email', required=True, help='Existing account to log in as')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--probe-path', default='/health', help='Cheap route timed while logins run')
+    parser.add_argument('--probe-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    base = args.url.rstrip('/')
+    local = threading.local()
+    done = threading.Event()
+
+    def login(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            status = local.session.post(
+                f"{base}/api/auth/login",
+                json={'email': args.email, 'password': args.password},
+                timeout=60
+            ).status_code
+        except requests.RequestException:
+            status = 'error'
+        return time.perf_counter() - started, status
+
+    probe_latencies = []
+    probe_statuses = Counter()
+
+    def probe():
+        session = requests.Session()
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                probe_statuses[session.get(f"{base}{args.probe_path}", timeout=60).status_code] += 1
+            except requests.RequestException:
+                probe_statuses['error'] += 1
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(args.probe_interval)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    summarize(
+        f"POST /api/auth/login (concurrency {args.concurrency})",
+        [latency for latency, _ in results],
+        Counter(status for _, status in results),
+        elapsed
+    )
+    summarize(f"GET {args.probe_path} during logins", probe_latencies, probe_statuses)
+
+
+if __name__ == '__main__':
+    main()
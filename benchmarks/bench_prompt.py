@@ -0,0 +1,107 @@
+"""
+Measure prompt compaction: tokens before and after, compaction time, and
+optionally Gemini latency and billed prompt tokens for raw vs compact prompts
+
+Usage:
+    python benchmarks/bench_prompt.py --input transcript.json
+    python benchmarks/bench_prompt.py --synthetic 2000 --live
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_builder import compact_transcript  # noqa: E402
+
+SYNTHETIC_LINES = [
+    "Um, so I I think we should, uh, look at the release schedule for next week.",
+    "Yeah.",
+    "Okay, right.",
+    "The migration has to finish before we, you know, turn on the new billing flow.",
+    "Uh, who is handling the customer emails?",
+    "I mean, I can take the customer emails, um, if nobody else wants them.",
+    "Mm-hmm.",
+    "Let's make sure QA signs off on the billing flow by Thursday.",
+    "So, like, the the dashboard numbers looked off yesterday.",
+    "Right, right.",
+]
+
+
+def load_transcript(args):
+    if args.input:
+        with open(args.input) as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            utterances = data
+            text = ' '.join(u.get('text', '') for u in utterances)
+        else:
+            utterances = data.get('utterances') or []
+            text = data.get('text') or ' '.join(u.get('text', '') for u in utterances)
+        return text, utterances
+
+    rng = random.Random(42)
+    utterances = []
+    for i in range(args.synthetic):
+        utterances.append({'speaker': rng.choice('ABC') if i % 3 else 'A', 'text': rng.choice(SYNTHETIC_LINES)})
+    return ' '.join(u['text'] for u in utterances), utterances
+
+
+def bench_compaction(text, utterances, budget, max_drop, repeat):
+    timings = []
+    compact = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compact = compact_transcript(text, utterances, budget, max_drop)
+        timings.append((time.perf_counter() - started) * 1000)
+    return compact, sorted(timings)[len(timings) // 2]
+
+
+def bench_live(text, utterances, compact):
+    import google.generativeai as genai
+    from gemini_service import build_analysis_prompt, ANALYSIS_MODEL, GEMINI_API_KEY
+
+    if not GEMINI_API_KEY:
+        sys.exit("GEMINI_API_KEY is required for --live")
+
+    raw = SimpleNamespace(text=text, speaker_count=len({u.get('speaker') for u in utterances}))
+    model = genai.GenerativeModel(ANALYSIS_MODEL)
+    for label, transcript in (('raw', raw), ('compact', compact)):
+        started = time.perf_counter()
+        response = model.generate_content(build_analysis_prompt(transcript))
+        elapsed = time.perf_counter() - started
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', 'n/a')
+        print(f"  {label:8s} latency {elapsed * 1000:8.0f} ms   prompt tokens {prompt_tokens}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Gemini prompt compaction')
+    parser.add_argument('--input', help='AssemblyAI transcript JSON or a list of utterances')
+    parser.add_argument('--synthetic', type=int, default=1000, help='Synthetic utterances when no --input is given')
+    parser.add_argument('--budget', type=int, default=6000, help='Token budget passed to the compactor')
+    parser.add_argument('--max-drop', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--live', action='store_true', help='Also time real Gemini calls (uses API quota)')
+    args = parser.parse_args()
+
+    text, utterances = load_transcript(args)
+    compact, median_ms = bench_compaction(text, utterances, args.budget, args.max_drop, args.repeat)
+    stats = compact.stats()
+
+    print(f"utterances:         {len(utterances)} -> {len(compact.turns)} turns")
+    print(f"estimated tokens:   {stats['original_tokens']} -> {stats['tokens']} (ratio {stats['ratio']})")
+    print(f"sentences dropped:  {stats['dropped_sentences']}")
+    print(f"compaction time:    {median_ms:.1f} ms (median of {args.repeat})")
+
+    if args.live:
+        print("Gemini:")
+        bench_live(text, utterances, compact)
+
+
+if __name__ == '__main__':
+    main()
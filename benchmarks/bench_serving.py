@@ -0,0 +1,79 @@
+"""
+Compare throughput and latency of the Flask and ASGI serving modes
+
+Usage:
+    python benchmarks/bench_serving.py --flask-url http://localhost:5000 \
+        --asgi-url http://localhost:8000 --path /api/transcripts --token <jwt>
+"""
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(base_url, path, token, concurrency, total, method):
+    """Send `total` requests from `concurrency` threads, returning (latencies, errors, elapsed)"""
+    local = threading.local()
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    url = base_url.rstrip('/') + path
+
+    def one(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = local.session.request(method, url, headers=headers, timeout=120)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return latencies, errors, elapsed
+
+
+def report(label, latencies, errors, elapsed):
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{label}")
+    print(f"  requests:   {len(ms)} ({errors} errors)")
+    print(f"  throughput: {len(ms) / elapsed:.1f} req/s")
+    print(f"  p50: {percentile(ms, 0.50):.1f} ms  p95: {percentile(ms, 0.95):.1f} ms  p99: {percentile(ms, 0.99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Flask and ASGI servers')
+    parser.add_argument('--flask-url', help='Base URL of the Flask (sync worker) server')
+    parser.add_argument('--asgi-url', help='Base URL of the ASGI (uvicorn worker) server')
+    parser.add_argument('--path', default='/api/transcripts', help='Route to request')
+    parser.add_argument('--method', default='GET', help='HTTP method')
+    parser.add_argument('--token', help='JWT for authenticated routes')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    targets = [(label, url) for label, url in (('flask', args.flask_url), ('asgi', args.asgi_url)) if url]
+    if not targets:
+        parser.error('pass --flask-url and/or --asgi-url')
+
+    for label, url in targets:
+        latencies, errors, elapsed = run(url, args.path, args.token, args.concurrency, args.requests, args.method)
+        report(f"{label} {args.method} {args.path} (concurrency {args.concurrency})", latencies, errors, elapsed)
+
+
+if __name__ == '__main__':
+    main()
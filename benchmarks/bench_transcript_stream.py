@@ -0,0 +1,69 @@
+"""
+Compare fetching one transcript as a single JSON document and as streamed NDJSON:
+time to first byte, total time, bytes received, and the server's peak RSS growth
+when a pid is given (Linux only)
+
+Usage:
+    python benchmarks/bench_transcript_stream.py --url http://localhost:8000 \
+        --session-id <id> --token <jwt> --server-pid <gunicorn worker pid>
+"""
+import time
+import argparse
+
+import requests
+
+
+def peak_rss_kb(pid):
+    """VmHWM (peak resident set size) of a process, or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def fetch(url, headers, params):
+    """Download url, returning (seconds to first byte, total seconds, bytes, lines)"""
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    lines = 0
+    with requests.get(url, headers=headers, params=params, stream=True, timeout=300) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=None):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+            lines += chunk.count(b'\n')
+    return first_byte or 0.0, time.perf_counter() - started, size, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON vs NDJSON transcript responses')
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the API')
+    parser.add_argument('--session-id', required=True)
+    parser.add_argument('--token', required=True, help='JWT of the transcript owner')
+    parser.add_argument('--server-pid', type=int, help='Worker pid to read peak memory from')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    url = f"{args.url.rstrip('/')}/api/transcript/{args.session_id}"
+    headers = {'Authorization': f'Bearer {args.token}', 'Cache-Control': 'no-cache'}
+
+    for label, params in (('json', {}), ('ndjson', {'format': 'ndjson'})):
+        rss_before = peak_rss_kb(args.server_pid) if args.server_pid else None
+        results = [fetch(url, headers, params) for _ in range(args.repeat)]
+        rss_after = peak_rss_kb(args.server_pid) if args.server_pid else None
+
+        first_byte, total, size, lines = sorted(results, key=lambda r: r[1])[len(results) // 2]
+        print(f"{label:7s} first byte {first_byte * 1000:8.1f} ms   total {total * 1000:8.1f} ms   "
+              f"{size / 1024:9.1f} KiB   {lines} lines")
+        if rss_before is not None and rss_after is not None:
+            print(f"        server peak RSS grew by {rss_after - rss_before} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Small thread-safe in-process caches
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and/or total weight,
+    with an optional per-entry time to live.
+    """
+
+    def __init__(self, max_entries=None, max_weight=None, ttl=None, weigh=len):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.ttl = ttl
+        self.weigh = weigh
+        self.entries = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if absent or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, weight, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._remove(key)
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache value under key; values heavier than max_weight are not cached"""
+        weight = self.weigh(value) if self.max_weight is not None else 0
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (value, weight, expires_at)
+            self.weight += weight
+            while self.entries and (
+                (self.max_entries is not None and len(self.entries) > self.max_entries)
+                or (self.max_weight is not None and self.weight > self.max_weight)
+            ):
+                self._remove(next(iter(self.entries)))
+
+    def delete(self, key):
+        """Drop key from the cache if present"""
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self.lock:
+            self.entries.clear()
+            self.weight = 0
+
+    def stats(self):
+        """Return entry count, weight and hit/miss counters"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'weight': self.weight,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remove(self, key):
+        _, weight, _ = self.entries.pop(key)
+        self.weight -= weight
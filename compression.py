@@ -0,0 +1,185 @@
+"""
+Negotiated gzip/brotli compression of text responses
+"""
+import zlib
+import threading
+from flask import request
+
+from config import (
+    COMPRESSION_ENABLED, COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, logger
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text formats are compressed; audio and other binary payloads are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml'
+}
+# Event streams are left alone so each event reaches the client as soon as it is sent
+SKIPPED_MIMETYPES = {'text/event-stream'}
+# Input between forced flushes of a streamed response
+STREAM_FLUSH_BYTES = 64 * 1024
+
+COMPRESSION_STATS = {'responses': 0, 'streams': 0, 'bytes_in': 0, 'bytes_out': 0}
+COMPRESSION_STATS_LOCK = threading.Lock()
+
+
+def _record(bytes_in, bytes_out, streamed=False):
+    with COMPRESSION_STATS_LOCK:
+        COMPRESSION_STATS['streams' if streamed else 'responses'] += 1
+        COMPRESSION_STATS['bytes_in'] += bytes_in
+        COMPRESSION_STATS['bytes_out'] += bytes_out
+
+
+def get_compression_stats():
+    """Bytes before and after compression in this process"""
+    with COMPRESSION_STATS_LOCK:
+        stats = dict(COMPRESSION_STATS)
+    stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+    stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else 1.0
+    stats['brotli_available'] = brotli is not None
+    return stats
+
+
+def choose_encoding(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None"""
+    qualities = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+
+    def accepted(encoding):
+        return qualities.get(encoding, qualities.get('*', 0.0)) > 0
+
+    if brotli is not None and accepted('br'):
+        return 'br'
+    if accepted('gzip'):
+        return 'gzip'
+    return None
+
+
+def is_compressible(mimetype):
+    if not mimetype or mimetype in SKIPPED_MIMETYPES:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return zlib.compress(data, COMPRESSION_GZIP_LEVEL, wbits=31)
+
+
+def compress_body(data, accept_encoding, mimetype):
+    """
+    Compress a complete body if the client accepts it and it is worth it.
+    Returns: (body, encoding or None)
+    """
+    if not COMPRESSION_ENABLED or len(data) < COMPRESSION_MIN_BYTES or not is_compressible(mimetype):
+        return data, None
+    encoding = choose_encoding(accept_encoding)
+    if not encoding:
+        return data, None
+    compressed = compress_bytes(data, encoding)
+    if len(compressed) >= len(data):
+        return data, None
+    _record(len(data), len(compressed))
+    return compressed, encoding
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compress an iterable of body chunks incrementally. The first chunk, and then
+    every STREAM_FLUSH_BYTES of input, is flushed so the client is never left
+    waiting on data buffered in the compressor.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    bytes_in = bytes_out = 0
+    unflushed = 0
+    first = True
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            bytes_in += len(chunk)
+            unflushed += len(chunk)
+            out = compress(chunk)
+            if first or unflushed >= STREAM_FLUSH_BYTES:
+                out += flush()
+                unflushed = 0
+                first = False
+            if out:
+                bytes_out += len(out)
+                yield out
+        out = finish()
+        bytes_out += len(out)
+        yield out
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+        _record(bytes_in, bytes_out, streamed=True)
+
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The encoded body is a different representation, so a strong validator must differ too
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+
+
+def compress_response(response):
+    """after_request hook compressing eligible responses"""
+    if not COMPRESSION_ENABLED:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if not encoding:
+        return response
+
+    try:
+        if response.is_streamed:
+            if response.direct_passthrough:
+                return response
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            _mark_encoded(response, encoding)
+            return response
+
+        data = response.get_data()
+        body, used = compress_body(data, request.headers.get('Accept-Encoding'), response.mimetype)
+        if used:
+            response.set_data(body)
+            _mark_encoded(response, used)
+    except Exception as e:
+        logger.error(f"Response compression failed, sending uncompressed: {e}")
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
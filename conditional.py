@@ -0,0 +1,92 @@
+"""
+ETag / Last-Modified validators and conditional GET handling
+"""
+import hashlib
+from datetime import timezone
+from werkzeug.http import parse_date, http_date
+
+# Bump when a response format changes so clients drop representations cached under old tags
+REPRESENTATION_VERSION = 1
+
+# Clients may reuse a stored response only after revalidating it
+CACHE_CONTROL = 'private, no-cache'
+
+# Suffixes compression.py appends to the tags of encoded responses
+ENCODING_SUFFIXES = ('-br', '-gzip')
+
+
+def make_etag(*parts):
+    """Strong entity tag (unquoted) for a representation identified by parts"""
+    digest = hashlib.sha256(
+        '|'.join(str(part) for part in (REPRESENTATION_VERSION, *parts)).encode('utf-8')
+    ).hexdigest()
+    return digest[:32]
+
+
+def to_utc(timestamp):
+    """Treat database timestamps without a zone as UTC and drop sub-second precision"""
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.replace(microsecond=0)
+
+
+def _parse_tags(header):
+    tags = []
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tags.append(tag.strip('"'))
+    return tags
+
+
+def matching_etag(if_none_match, etag):
+    """
+    The client's tag that matches etag, allowing for an encoding suffix, or None.
+    If-None-Match uses weak comparison, so W/ prefixes are ignored.
+    """
+    for tag in _parse_tags(if_none_match):
+        if tag == '*':
+            return etag
+        base = tag
+        for suffix in ENCODING_SUFFIXES:
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+                break
+        if base == etag:
+            return tag
+    return None
+
+
+def check_not_modified(headers, etag, last_modified=None):
+    """
+    Evaluate If-None-Match, or If-Modified-Since when no tags were sent.
+    Pass last_modified=None where the date alone cannot detect every change.
+    Returns: the tag to send with a 304, or None if the full response is needed
+    """
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        return matching_etag(if_none_match, etag)
+
+    if_modified_since = parse_date(headers.get('If-Modified-Since'))
+    if last_modified is not None and if_modified_since is not None:
+        if to_utc(last_modified) <= if_modified_since:
+            return etag
+    return None
+
+
+def validator_headers(etag, last_modified=None):
+    """Headers carrying the validators of a response"""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': CACHE_CONTROL}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(to_utc(last_modified))
+    return headers
+
+
+def not_modified_headers(tag, last_modified=None):
+    """Headers for a 304, echoing the tag the client holds (it may carry an encoding suffix)"""
+    headers = validator_headers(tag, last_modified)
+    headers['Vary'] = 'Accept-Encoding'
+    return headers
@@ -24,6 +24,121 @@ if not DATABASE_URL:
     logger.error("DATABASE_URL not found. Please set DATABASE_URL environment variable.")
     raise ValueError("DATABASE_URL is required")
 
+# Apply pending migrations at worker startup instead of only checking the version (local development)
+DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', 'false').lower() == 'true'
+
+# Optional read replica for GET traffic; reads stick to the primary for this long after a user's write
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', 10))
+
+# Where utterances are stored: 'rows' (utterances table), 'packed' (one columnar blob per
+# transcript, with word timings) or 'both'. Full-text search over utterances needs rows.
+UTTERANCE_STORAGE = os.getenv('UTTERANCE_STORAGE', 'both').lower()
+if UTTERANCE_STORAGE not in ('rows', 'packed', 'both'):
+    raise ValueError("UTTERANCE_STORAGE must be rows, packed or both")
+
+# Opt-in: stored audio is re-encoded in the background to this codec ('opus', 'mp3' or 'none').
+# This rewrites users' stored audio, so enable it deliberately.
+AUDIO_STORAGE_CODEC = os.getenv('AUDIO_STORAGE_CODEC', 'none').lower()
+AUDIO_STORAGE_BITRATE = os.getenv('AUDIO_STORAGE_BITRATE', '32k')
+AUDIO_KEEP_ORIGINAL = os.getenv('AUDIO_KEEP_ORIGINAL', 'false').lower() == 'true'
+# Audio older than the retention threshold is moved to a cold archive and rehydrated on demand
+AUDIO_RETENTION_DAYS = int(os.getenv('AUDIO_RETENTION_DAYS', 7))
+AUDIO_ARCHIVE_DIR = os.getenv('AUDIO_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_archive'))
+AUDIO_REHYDRATE_CACHE_MB = int(os.getenv('AUDIO_REHYDRATE_CACHE_MB', 128))
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# A worker computing a Gemini analysis refreshes its claim every third of this; a claim left
+# unrefreshed this long (its worker died) may be taken over by another worker
+ANALYSIS_CLAIM_TIMEOUT_SECONDS = int(os.getenv('ANALYSIS_CLAIM_TIMEOUT_SECONDS', 120))
+
+# SQLite file holding limiter state shared by the worker processes on this host
+SHARED_STATE_PATH = os.getenv('SHARED_STATE_PATH', os.path.join(tempfile.gettempdir(), 'speaker_recogn_state.sqlite3'))
+# Per-provider token bucket (requests per second, burst size) and concurrent call cap
+PROVIDER_LIMITS = {
+    'assemblyai': {
+        'rate': float(os.getenv('ASSEMBLYAI_RATE_PER_SECOND', 5)),
+        'burst': float(os.getenv('ASSEMBLYAI_BURST', 10)),
+        'max_in_flight': int(os.getenv('ASSEMBLYAI_MAX_IN_FLIGHT', 10)),
+    },
+    'gemini': {
+        'rate': float(os.getenv('GEMINI_RATE_PER_SECOND', 1)),
+        'burst': float(os.getenv('GEMINI_BURST', 5)),
+        'max_in_flight': int(os.getenv('GEMINI_MAX_IN_FLIGHT', 4)),
+    },
+}
+# How long a call may queue for its provider before giving up
+PROVIDER_QUEUE_TIMEOUT_SECONDS = float(os.getenv('PROVIDER_QUEUE_TIMEOUT_SECONDS', 30))
+
+# Opt-in: analyze new transcripts in the background so results are ready when users ask.
+# Prefetch runs only while Gemini has spare slots and tokens beyond the reserve, at most
+# ANALYSIS_PREFETCH_MAX_CONCURRENT at a time per worker and ANALYSIS_PREFETCH_PER_USER_HOURLY per user.
+ANALYSIS_PREFETCH = os.getenv('ANALYSIS_PREFETCH', 'false').lower() == 'true'
+ANALYSIS_PREFETCH_MAX_CONCURRENT = int(os.getenv('ANALYSIS_PREFETCH_MAX_CONCURRENT', 1))
+ANALYSIS_PREFETCH_PER_USER_HOURLY = int(os.getenv('ANALYSIS_PREFETCH_PER_USER_HOURLY', 10))
+ANALYSIS_PREFETCH_RESERVE = int(os.getenv('ANALYSIS_PREFETCH_RESERVE', 2))
+
+# /api/auth/me profiles cached per worker; edits in any worker invalidate them everywhere
+AUTH_PROFILE_CACHE_SIZE = int(os.getenv('AUTH_PROFILE_CACHE_SIZE', 10000))
+AUTH_PROFILE_CACHE_TTL_SECONDS = float(os.getenv('AUTH_PROFILE_CACHE_TTL_SECONDS', 60))
+
+# Per-user sliding windows: requests allowed per window_seconds for free and premium users.
+# Rate-limited routes count toward 'api'; upload and analyze also have their own windows.
+# Playback-position lookups are polled while audio plays, so they have only their own window.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMITS = {
+    'api': {
+        'window_seconds': 60,
+        'free': int(os.getenv('RATE_LIMIT_API_FREE', 120)),
+        'premium': int(os.getenv('RATE_LIMIT_API_PREMIUM', 600)),
+    },
+    'upload': {
+        'window_seconds': 3600,
+        'free': int(os.getenv('RATE_LIMIT_UPLOAD_FREE', 10)),
+        'premium': int(os.getenv('RATE_LIMIT_UPLOAD_PREMIUM', 100)),
+    },
+    'analyze': {
+        'window_seconds': 3600,
+        'free': int(os.getenv('RATE_LIMIT_ANALYZE_FREE', 30)),
+        'premium': int(os.getenv('RATE_LIMIT_ANALYZE_PREMIUM', 300)),
+    },
+    'playback': {
+        'window_seconds': 60,
+        'free': int(os.getenv('RATE_LIMIT_PLAYBACK_FREE', 600)),
+        'premium': int(os.getenv('RATE_LIMIT_PLAYBACK_PREMIUM', 1200)),
+        'counts_toward_api': False,
+    },
+}
+# Admission control: heavy requests are refused with 429 when the work already in flight
+# means they could not finish within REQUEST_DEADLINE_SECONDS (gunicorn's --timeout).
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', 120))
+ADMISSION_WORKER_SLOTS = int(os.getenv('ADMISSION_WORKER_SLOTS', os.getenv('WEB_CONCURRENCY', 2)))
+# Starting estimate of each heavy route's duration; refined from observed durations
+ADMISSION_EXPECTED_SECONDS = {
+    'upload': float(os.getenv('ADMISSION_UPLOAD_SECONDS', 60)),
+    'analyze': float(os.getenv('ADMISSION_ANALYZE_SECONDS', 15)),
+}
+
+# Negotiated gzip/brotli compression of text responses at least COMPRESSION_MIN_BYTES long.
+# Brotli is used when the optional `brotli` package is installed and the client accepts it.
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+# Prometheus metrics: each worker writes a snapshot to METRICS_DIR at most every
+# METRICS_FLUSH_SECONDS and /metrics sums them. Exited workers' counters are folded into
+# retained.json there; clear the directory on deploy.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'speaker_recogn_metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 1))
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request tracing: requests (and background tasks) slower than TRACE_SLOW_MS have their
+# span tree logged as JSON. When TRACE_FILE is set every trace is appended to it as a JSON line.
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() == 'true'
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', 2000))
+TRACE_FILE = os.getenv('TRACE_FILE')
+
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'flac', 'ogg'}
 
 PORT = int(os.getenv('PORT', 8000))
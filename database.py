@@ -1,78 +1,215 @@
 """
 Database operations and connection management
 """
+import os
+import time
+import uuid
+import json
+import html
+import base64
+import tempfile
+import threading
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import psycopg2.pool
 from urllib.parse import urlparse
-from config import DATABASE_URL, logger
+from config import (
+    DATABASE_URL, DATABASE_REPLICA_URL, REPLICA_READ_YOUR_WRITES_SECONDS, DB_AUTO_MIGRATE,
+    UTTERANCE_STORAGE, logger
+)
+from migrations import SCHEMA_VERSION, get_schema_version, run_migrations
+from audio_archive import archive_store, read_archived_audio, iter_archived_audio
+from utterance_codec import encode_utterances, decode_utterances, iter_utterances, normalize_utterance
+from profile_cache import invalidate_user_profile
+from metrics import Counter, Gauge, register_collector
+from tracing import traced
 
 db_pool = None
+replica_pool = None
+
+AUDIO_CHUNK_SIZE = 256 * 1024
+# Utterances fetched per round trip when streaming a transcript
+UTTERANCE_BATCH_SIZE = 500
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 20
+
+# Per-pool counters, reported by get_pool_stats()
+POOL_STATS = {
+    name: {'checkouts': 0, 'in_use': 0, 'retries': 0, 'errors': 0, 'fallbacks': 0, 'wait_ms_total': 0.0}
+    for name in ('primary', 'replica')
+}
+POOL_STATS_LOCK = threading.Lock()
+# Which pool each checked-out connection came from, keyed by id(conn)
+CONNECTION_POOLS = {}
+
+# Run first in a transaction whose updates only move or re-encode stored audio, so the
+# updated_at trigger leaves the row's version (and every ETag and cache keyed by it) alone
+STORAGE_MAINTENANCE = "SET LOCAL app.storage_maintenance = 'on'"
+# Version of transcript t's API representation: updated_at, or when compaction last
+# changed the audio fields it serves. Used for ETags, Last-Modified and the time index cache.
+TRANSCRIPT_VERSION = "GREATEST(t.updated_at, t.audio_updated_at)"
+
+# Marker files whose mtime records each user's last write. They live on the
+# host filesystem so every gunicorn worker sees writes made by the others.
+WRITE_MARKER_DIR = os.path.join(tempfile.gettempdir(), 'speaker_recogn_writes')
+
+def _create_pool(database_url):
+    """Create a threaded connection pool for a database URL"""
+    parsed = urlparse(database_url)
+    
+    sslmode = 'require'
+    
+    return psycopg2.pool.ThreadedConnectionPool(
+        POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS,
+        host=parsed.hostname,
+        port=parsed.port or 5432,
+        database=parsed.path[1:],
+        user=parsed.username,
+        password=parsed.password,
+        sslmode=sslmode,
+        connect_timeout=10,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=5
+    )
 
 def init_database():
-    """Initialize database connection pool"""
-    global db_pool
+    """Initialize database connection pools"""
+    global db_pool, replica_pool
     try:
-        parsed = urlparse(DATABASE_URL)
+        db_pool = _create_pool(DATABASE_URL)
+        logger.info("Database connection pool initialized successfully")
         
-        sslmode = 'require'
-            
-        db_pool = psycopg2.pool.ThreadedConnectionPool(
-            1, 20,
-            host=parsed.hostname,
-            port=parsed.port or 5432,
-            database=parsed.path[1:],
-            user=parsed.username,
-            password=parsed.password,
-            sslmode=sslmode,
-            connect_timeout=10,
-            keepalives=1,
-            keepalives_idle=30,
-            keepalives_interval=10,
-            keepalives_count=5
-        )
+        if DATABASE_REPLICA_URL:
+            try:
+                replica_pool = _create_pool(DATABASE_REPLICA_URL)
+                logger.info("Read replica connection pool initialized successfully")
+            except Exception as e:
+                replica_pool = None
+                logger.warning(f"Read replica unavailable, serving reads from primary: {e}")
         
-        logger.info("Database connection pool initialized successfully")
-        create_tables()
+        verify_schema()
         
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
 
-def get_db_connection():
-    """Get a database connection from the pool with retry logic for NeonDB"""
-    global db_pool
-    if not db_pool:
+def _record_pool_stat(pool_name, **deltas):
+    """Add deltas to the counters of a pool"""
+    with POOL_STATS_LOCK:
+        stats = POOL_STATS[pool_name]
+        for key, value in deltas.items():
+            stats[key] += value
+
+@traced('db.checkout')
+def _checkout(pool, pool_name):
+    """Get a validated connection from a pool with retry logic for NeonDB"""
+    if not pool:
         raise Exception("Database pool not initialized")
     
+    started = time.monotonic()
     max_retries = 3
     for attempt in range(max_retries):
+        conn = None
         try:
-            conn = db_pool.getconn()
+            conn = pool.getconn()
             cursor = conn.cursor()
             cursor.execute('SELECT 1')
             cursor.close()
             conn.commit()
+            
+            with POOL_STATS_LOCK:
+                CONNECTION_POOLS[id(conn)] = pool_name
+            _record_pool_stat(
+                pool_name,
+                checkouts=1,
+                in_use=1,
+                wait_ms_total=(time.monotonic() - started) * 1000
+            )
             return conn
         except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
+            logger.warning(f"Connection attempt {attempt + 1} to {pool_name} failed: {e}")
             if conn:
                 try:
-                    db_pool.putconn(conn, close=True)
+                    pool.putconn(conn, close=True)
                 except:
                     pass
             if attempt == max_retries - 1:
+                _record_pool_stat(pool_name, errors=1)
                 raise
-    return db_pool.getconn()
+            _record_pool_stat(pool_name, retries=1)
+
+def get_db_connection():
+    """Get a connection to the primary database"""
+    return _checkout(db_pool, 'primary')
+
+def _marker_path(user_id):
+    return os.path.join(WRITE_MARKER_DIR, str(user_id))
+
+def mark_user_write(user_id):
+    """Record that user_id just wrote, so their reads stick to the primary for a while"""
+    if not replica_pool or user_id is None:
+        return
+    try:
+        os.makedirs(WRITE_MARKER_DIR, exist_ok=True)
+        path = _marker_path(user_id)
+        with open(path, 'a'):
+            pass
+        os.utime(path)
+    except OSError as e:
+        logger.warning(f"Could not record write marker for user {user_id}: {e}")
+
+def user_wrote_recently(user_id):
+    """Check whether user_id wrote within the read-your-writes window"""
+    if user_id is None:
+        return False
+    try:
+        last_write = os.stat(_marker_path(user_id)).st_mtime
+    except OSError:
+        return False
+    return time.time() - last_write < REPLICA_READ_YOUR_WRITES_SECONDS
+
+def get_read_connection(user_id=None):
+    """
+    Get a connection for a read-only query.
+    Reads go to the replica when one is configured, except for users who wrote
+    within the read-your-writes window, who are pinned to the primary so they
+    always see their own changes. If the replica cannot be reached the primary
+    is used instead.
+    """
+    if not replica_pool:
+        return get_db_connection()
+    
+    if user_wrote_recently(user_id):
+        _record_pool_stat('replica', fallbacks=1)
+        return get_db_connection()
+    
+    try:
+        return _checkout(replica_pool, 'replica')
+    except Exception as e:
+        logger.warning(f"Replica checkout failed, reading from primary: {e}")
+        _record_pool_stat('replica', fallbacks=1)
+        return get_db_connection()
+
+def is_replica_connection(conn):
+    """Check whether a checked-out connection belongs to the replica pool"""
+    with POOL_STATS_LOCK:
+        return CONNECTION_POOLS.get(id(conn)) == 'replica'
 
 def return_db_connection(conn):
-    """Return a database connection to the pool"""
-    global db_pool
-    if db_pool and conn:
+    """Return a database connection to the pool it came from"""
+    if not conn:
+        return
+    with POOL_STATS_LOCK:
+        pool_name = CONNECTION_POOLS.pop(id(conn), 'primary')
+    pool = replica_pool if pool_name == 'replica' else db_pool
+    if pool:
+        _record_pool_stat(pool_name, in_use=-1)
         try:
             if not conn.closed:
                 conn.rollback()
-            db_pool.putconn(conn)
+            pool.putconn(conn)
         except Exception as e:
             logger.warning(f"Error returning connection to pool: {e}")
             try:
@@ -80,77 +217,61 @@ def return_db_connection(conn):
             except:
                 pass
 
-def create_tables():
-    """Create necessary database tables"""
+def get_pool_stats():
+    """Return a snapshot of per-pool connection metrics"""
+    with POOL_STATS_LOCK:
+        snapshot = {name: dict(stats) for name, stats in POOL_STATS.items()}
+    for name, pool in (('primary', db_pool), ('replica', replica_pool)):
+        snapshot[name]['enabled'] = pool is not None
+        snapshot[name]['max_connections'] = POOL_MAX_CONNECTIONS if pool else 0
+        checkouts = snapshot[name]['checkouts']
+        snapshot[name]['avg_wait_ms'] = round(snapshot[name]['wait_ms_total'] / checkouts, 3) if checkouts else 0.0
+    return snapshot
+
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections checked out of each pool', ('pool',))
+DB_POOL_MAX = Gauge('db_pool_max_connections', 'Size limit of each pool', ('pool',))
+DB_CHECKOUTS = Counter('db_connection_checkouts_total', 'Connections handed out by each pool', ('pool',))
+DB_RETRIES = Counter('db_connection_retries_total', 'Connection attempts retried after a failure', ('pool',))
+DB_ERRORS = Counter('db_connection_errors_total', 'Connection checkouts that failed after all retries', ('pool',))
+
+@register_collector
+def collect_pool_metrics():
+    for name, stats in get_pool_stats().items():
+        DB_POOL_IN_USE.set(stats['in_use'], pool=name)
+        DB_POOL_MAX.set(stats['max_connections'], pool=name)
+        DB_CHECKOUTS.set_total(stats['checkouts'], pool=name)
+        DB_RETRIES.set_total(stats['retries'], pool=name)
+        DB_ERRORS.set_total(stats['errors'], pool=name)
+
+def verify_schema():
+    """
+    Check the schema version once at startup.
+    Migrations are applied per deploy with `python db_setup.py --migrate`;
+    workers only compare versions unless DB_AUTO_MIGRATE is set.
+    """
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
+        version = get_schema_version(conn)
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                full_name VARCHAR(255),
-                is_premium BOOLEAN DEFAULT FALSE,
-                premium_expiry TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        if version >= SCHEMA_VERSION:
+            logger.info(f"Database schema is at version {version}")
+            return
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id SERIAL PRIMARY KEY,
-                session_id VARCHAR(255) UNIQUE NOT NULL,
-                transcript_id VARCHAR(255) NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                text TEXT,
-                confidence FLOAT,
-                audio_duration INTEGER,
-                speaker_labels BOOLEAN DEFAULT TRUE,
-                language_code VARCHAR(10) DEFAULT 'en_us',
-                audio_data BYTEA,
-                audio_mimetype VARCHAR(100),
-                audio_size INTEGER,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS utterances (
-                id SERIAL PRIMARY KEY,
-                transcript_session_id VARCHAR(255) REFERENCES transcripts(session_id) ON DELETE CASCADE,
-                speaker VARCHAR(50),
-                text TEXT,
-                confidence FLOAT,
-                start_time INTEGER,
-                end_time INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        if DB_AUTO_MIGRATE:
+            applied = run_migrations(conn)
+            logger.info(f"Database schema migrated to version {SCHEMA_VERSION} (applied {applied})")
+        else:
+            logger.error(
+                f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+                "Run `python db_setup.py --migrate`."
             )
-        """)
-        
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_session_id ON transcripts(session_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_user_id ON transcripts(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_created_at ON transcripts(created_at)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_utterances_session_id ON utterances(transcript_session_id)")
         
-        conn.commit()
-        logger.info("Database tables created successfully")
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        logger.error(f"Error creating tables: {e}")
-        raise
     finally:
         if conn:
             return_db_connection(conn)
 
+@traced('db.save_transcript_to_db')
 def save_transcript_to_db(session_id, transcript_data, filename, audio_data=None, audio_mimetype=None, user_id=None):
     """Save transcript, utterances, and audio to database"""
     conn = None
@@ -158,21 +279,37 @@ def save_transcript_to_db(session_id, transcript_data, filename, audio_data=None
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        # A re-save replaces archived audio; its archive objects are removed after commit
+        cursor.execute(
+            "SELECT audio_archive_key FROM transcripts WHERE session_id = %s FOR UPDATE", (session_id,)
+        )
+        previous = cursor.fetchone()
+        old_archive_key = previous[0] if previous else None
+        
         audio_size = len(audio_data) if audio_data else None
+        utterances = transcript_data.get('utterances', [])
+        utterance_pack = encode_utterances(utterances) if UTTERANCE_STORAGE in ('packed', 'both') else None
         
         cursor.execute("""
             INSERT INTO transcripts (
                 session_id, transcript_id, filename, text, confidence, 
                 audio_duration, speaker_labels, language_code,
-                audio_data, audio_mimetype, audio_size, user_id
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                audio_data, audio_mimetype, audio_size, user_id, utterance_pack
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ON CONFLICT (session_id) DO UPDATE SET
                 text = EXCLUDED.text,
+                utterance_pack = EXCLUDED.utterance_pack,
                 confidence = EXCLUDED.confidence,
                 audio_duration = EXCLUDED.audio_duration,
                 audio_data = EXCLUDED.audio_data,
                 audio_mimetype = EXCLUDED.audio_mimetype,
                 audio_size = EXCLUDED.audio_size,
+                audio_codec = NULL,
+                audio_original = NULL,
+                audio_original_mimetype = NULL,
+                audio_original_size = NULL,
+                audio_archive_key = NULL,
+                audio_archived_at = NULL,
                 user_id = EXCLUDED.user_id,
                 updated_at = CURRENT_TIMESTAMP
         """, (
@@ -187,28 +324,34 @@ def save_transcript_to_db(session_id, transcript_data, filename, audio_data=None
             audio_data,
             audio_mimetype,
             audio_size,
-            user_id
+            user_id,
+            utterance_pack
         ))
         
+        # Cached analyses describe the previous content of a re-saved transcript
+        cursor.execute("DELETE FROM analysis_cache WHERE transcript_session_id = %s", (session_id,))
+        
         # Insert utterances
-        utterances = transcript_data.get('utterances', [])
         if utterances:
             cursor.execute("DELETE FROM utterances WHERE transcript_session_id = %s", (session_id,))
+        if utterances and UTTERANCE_STORAGE in ('rows', 'both'):
             for utterance in utterances:
                 cursor.execute("""
                     INSERT INTO utterances (
                         transcript_session_id, speaker, text, confidence, start_time, end_time
                     ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    session_id,
-                    utterance.get('speaker', 'Unknown'),
-                    utterance.get('text', ''),
-                    utterance.get('confidence', 0),
-                    utterance.get('start', 0),
-                    utterance.get('end', 0)
-                ))
+                """, (session_id, *normalize_utterance(utterance)))
         
         conn.commit()
+        mark_user_write(user_id)
+        invalidate_user_profile(user_id)
+        
+        if old_archive_key:
+            try:
+                archive_store.delete_prefix(old_archive_key)
+            except OSError as e:
+                logger.warning(f"Could not remove archived audio {old_archive_key}: {e}")
+        
         logger.info(f"Transcript saved successfully: {session_id}")
         return True
         
@@ -221,58 +364,308 @@ def save_transcript_to_db(session_id, transcript_data, filename, audio_data=None
         if conn:
             return_db_connection(conn)
 
-def get_transcript_from_db(session_id, include_audio=False, user_id=None):
-    """Retrieve transcript from database, optionally filtering by user_id"""
-    conn = None
+# Columns of a transcript row that the API exposes, rendered the way jsonify renders them
+TRANSCRIPT_JSON_FIELDS = """
+    'id', t.id,
+    'session_id', t.session_id,
+    'transcript_id', t.transcript_id,
+    'filename', t.filename,
+    'text', t.text,
+    'confidence', t.confidence,
+    'audio_duration', t.audio_duration,
+    'speaker_labels', t.speaker_labels,
+    'language_code', t.language_code,
+    'audio_mimetype', t.audio_mimetype,
+    'audio_size', t.audio_size,
+    'created_at', to_char(t.created_at, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"'),
+    'updated_at', to_char(t.updated_at, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"')
+"""
+
+# Utterances of transcript t aggregated into a JSON array, in playback order
+UTTERANCES_JSON_AGG = """
+    COALESCE((
+        SELECT json_agg(json_build_object(
+            'speaker', u.speaker,
+            'text', u.text,
+            'confidence', u.confidence,
+            'start_time', u.start_time,
+            'end_time', u.end_time
+        ) ORDER BY u.start_time)
+        FROM utterances u
+        WHERE u.transcript_session_id = t.session_id
+    ), '[]'::json)
+"""
+
+# Utterances are served from rows whenever a transcript has them ('rows' and 'both'),
+# so only transcripts stored purely packed are decoded in Python
+UTTERANCE_ROWS_EXIST = "EXISTS (SELECT 1 FROM utterances u WHERE u.transcript_session_id = t.session_id)"
+
+# A transcript response without its utterances, the utterances rendered by Postgres
+# when rows exist, and otherwise the packed blob
+TRANSCRIPT_JSON_SELECT = f"""
+    SELECT json_build_object(
+               'status', 'success',
+               'transcript', json_build_object({TRANSCRIPT_JSON_FIELDS})
+           )::text,
+           CASE WHEN t.utterance_pack IS NULL OR {UTTERANCE_ROWS_EXIST} THEN {UTTERANCES_JSON_AGG}::text END,
+           CASE WHEN t.utterance_pack IS NOT NULL AND NOT {UTTERANCE_ROWS_EXIST} THEN t.utterance_pack END
+    FROM transcripts t
+"""
+
+def splice_transcript_json(header, utterances_json, utterance_pack):
+    """Append the utterances array to the response object Postgres rendered, without parsing either"""
+    if utterances_json is None:
+        utterances_json = json.dumps(decode_utterances(utterance_pack))
+    return f'{header[:-1]}, "utterances" : {utterances_json}}}'
+
+def _transcript_where_clause(session_id, user_id=None):
+    """Build the WHERE clause and params selecting one transcript, optionally owned by user_id"""
+    if user_id is not None:
+        return "WHERE t.session_id = %s AND t.user_id = %s", (session_id, user_id)
+    return "WHERE t.session_id = %s", (session_id,)
+
+def _read_with_fallback(query, user_id=None):
+    """
+    Run query(conn) on a read connection.
+    A None result from the replica may just be replication lag, so it is
+    retried once on the primary before being reported as not found.
+    """
+    conn = get_read_connection(user_id)
     try:
-        conn = get_db_connection()
+        result = query(conn)
+        if result is not None or not is_replica_connection(conn):
+            return result
+    finally:
+        return_db_connection(conn)
+    
+    conn = get_db_connection()
+    try:
+        return query(conn)
+    finally:
+        return_db_connection(conn)
+
+@traced('db.get_transcript_from_db')
+def get_transcript_from_db(session_id, include_audio=False, user_id=None, include_words=False):
+    """
+    Retrieve transcript and its utterances in one query, optionally filtering by user_id.
+    Utterances come from the packed column when present, otherwise from the utterances table;
+    word timings are only available (include_words) for packed transcripts.
+    """
+    def query(conn):
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        if user_id is not None:
-            where_clause = "WHERE session_id = %s AND user_id = %s"
-            params = (session_id, user_id)
-        else:
-            where_clause = "WHERE session_id = %s"
-            params = (session_id,)
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        audio_column = ", t.audio_data" if include_audio else ""
         
-        if include_audio:
-            cursor.execute(f"SELECT * FROM transcripts {where_clause}", params)
-        else:
-            cursor.execute(f"""
-                SELECT id, session_id, transcript_id, filename, text, confidence, 
-                       audio_duration, speaker_labels, language_code, audio_mimetype, 
-                       audio_size, created_at, updated_at
-                FROM transcripts {where_clause}
-            """, params)
+        cursor.execute(f"""
+            SELECT t.id, t.session_id, t.transcript_id, t.filename, t.text, t.confidence,
+                   t.audio_duration, t.speaker_labels, t.language_code, t.audio_mimetype,
+                   t.audio_size, t.created_at, t.updated_at{audio_column},
+                   t.utterance_pack,
+                   CASE WHEN t.utterance_pack IS NULL THEN {UTTERANCES_JSON_AGG} END AS utterances
+            FROM transcripts t {where_clause}
+        """, params)
         
         transcript = cursor.fetchone()
         if not transcript:
             return None
-            
-        cursor.execute("""
-            SELECT * FROM utterances 
-            WHERE transcript_session_id = %s 
-            ORDER BY start_time
-        """, (session_id,))
-        utterances = cursor.fetchall()
+        
+        transcript = dict(transcript)
+        utterance_pack = transcript.pop('utterance_pack')
+        utterances = transcript.pop('utterances')
+        if utterance_pack is not None:
+            utterances = decode_utterances(utterance_pack, include_words=include_words)
         
         return {
-            'transcript': dict(transcript),
-            'utterances': [dict(u) for u in utterances]
+            'transcript': transcript,
+            'utterances': utterances
         }
-        
+    
+    try:
+        return _read_with_fallback(query, user_id)
     except Exception as e:
         logger.error(f"Error retrieving transcript: {e}")
         return None
+
+@traced('db.get_transcript_json_from_db')
+def get_transcript_json_from_db(session_id, user_id=None):
+    """
+    Retrieve a transcript as a ready-to-send JSON response body.
+    The transcript and its utterances are serialized by Postgres in a single
+    round trip, so the route can return the text without building Python dicts.
+    Transcripts stored only packed are read in the same round trip, decoded here
+    and spliced into the text.
+    Returns: JSON string, or None if the transcript does not exist
+    """
+    def query(conn):
+        cursor = conn.cursor()
+        
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        
+        cursor.execute(f"{TRANSCRIPT_JSON_SELECT} {where_clause}", params)
+        
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return splice_transcript_json(*row)
+    
+    try:
+        return _read_with_fallback(query, user_id)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript JSON: {e}")
+        return None
+
+def iter_transcript_ndjson(session_id, user_id=None, batch_size=UTTERANCE_BATCH_SIZE):
+    """
+    Yield a transcript as newline-delimited JSON: a "transcript" line with its
+    fields, one "utterance" line per utterance in playback order, then an "end"
+    line with the utterance count (or a single "error" line if it is missing).
+    Utterance rows come through a named server-side cursor batch_size at a
+    time, and each batch is sent as one chunk, so memory use does not grow with
+    meeting length. Packed transcripts are decoded one utterance at a time.
+    Everything is read from one REPEATABLE READ snapshot; the connection is
+    held until the generator is exhausted or closed.
+    """
+    conn = None
+    try:
+        conn = get_read_connection(user_id)
+        for attempt in range(2):
+            cursor = conn.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            where_clause, params = _transcript_where_clause(session_id, user_id)
+            cursor.execute(f"""
+                SELECT json_build_object('type', 'transcript', {TRANSCRIPT_JSON_FIELDS})::text, t.utterance_pack
+                FROM transcripts t {where_clause}
+            """, params)
+            row = cursor.fetchone()
+            cursor.close()
+            if row or attempt or not is_replica_connection(conn):
+                break
+            # Not on the replica yet; read from the primary instead
+            return_db_connection(conn)
+            conn = None
+            conn = get_db_connection()
+        
+        if not row:
+            yield json.dumps({'type': 'error', 'error': 'Transcript not found'}) + '\n'
+            return
+        
+        header, utterance_pack = row
+        yield header + '\n'
+        
+        count = 0
+        if utterance_pack is not None:
+            batch = []
+            for utterance in iter_utterances(utterance_pack):
+                batch.append(json.dumps({'type': 'utterance', **utterance}))
+                if len(batch) >= batch_size:
+                    count += len(batch)
+                    yield '\n'.join(batch) + '\n'
+                    batch = []
+            if batch:
+                count += len(batch)
+                yield '\n'.join(batch) + '\n'
+        else:
+            cursor = conn.cursor(name=f"utterances_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+            cursor.execute("""
+                SELECT json_build_object(
+                    'type', 'utterance',
+                    'speaker', u.speaker,
+                    'text', u.text,
+                    'confidence', u.confidence,
+                    'start_time', u.start_time,
+                    'end_time', u.end_time
+                )::text
+                FROM utterances u
+                WHERE u.transcript_session_id = %s
+                ORDER BY u.start_time
+            """, (session_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                yield '\n'.join(line for (line,) in rows) + '\n'
+            cursor.close()
+        
+        yield json.dumps({'type': 'end', 'utterance_count': count}) + '\n'
+    except Exception as e:
+        logger.error(f"Error streaming transcript {session_id}: {e}")
+        raise
     finally:
         if conn:
             return_db_connection(conn)
 
+@traced('db.get_transcript_version_from_db')
+def get_transcript_version_from_db(session_id, user_id=None):
+    """Return a transcript's TRANSCRIPT_VERSION without reading its content, or None if it does not exist"""
+    def query(conn):
+        cursor = conn.cursor()
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        cursor.execute(f"SELECT {TRANSCRIPT_VERSION} FROM transcripts t {where_clause}", params)
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    try:
+        return _read_with_fallback(query, user_id)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript version: {e}")
+        return None
+
+@traced('db.get_transcripts_list_version')
+def get_transcripts_list_version(user_id):
+    """
+    Return (count, latest version, highest id) of user_id's transcripts without
+    reading them; together these change whenever the list does. None on error.
+    """
+    def query(conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*), MAX({TRANSCRIPT_VERSION}), MAX(t.id) FROM transcripts t WHERE t.user_id = %s",
+            (user_id,)
+        )
+        return cursor.fetchone()
+    
+    try:
+        conn = get_read_connection(user_id)
+        try:
+            return query(conn)
+        finally:
+            return_db_connection(conn)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript list version: {e}")
+        return None
+
+@traced('db.get_transcript_timeline_from_db')
+def get_transcript_timeline_from_db(session_id, user_id=None):
+    """
+    Retrieve what a time index needs: the packed utterances (with word timings)
+    or, for unpacked transcripts, the utterance timings from the utterances table
+    """
+    def query(conn):
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        cursor.execute(f"""
+            SELECT {TRANSCRIPT_VERSION} AS version, t.utterance_pack,
+                   CASE WHEN t.utterance_pack IS NULL THEN {UTTERANCES_JSON_AGG} END AS utterances
+            FROM transcripts t {where_clause}
+        """, params)
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    
+    try:
+        return _read_with_fallback(query, user_id)
+    except Exception as e:
+        logger.error(f"Error retrieving transcript timeline: {e}")
+        return None
+
+@traced('db.get_all_transcripts')
 def get_all_transcripts(user_id=None):
     """Get all transcripts, optionally filtered by user_id"""
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection(user_id)
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if user_id is not None:
@@ -301,6 +694,120 @@ def get_all_transcripts(user_id=None):
         if conn:
             return_db_connection(conn)
 
+# ts_headline marks matches with private-use sentinels; the snippet is HTML-escaped in Python
+# and only then are the sentinels turned into <mark> tags, so transcript text can't inject markup
+SNIPPET_START, SNIPPET_STOP = '\ue000', '\ue001'
+SEARCH_HEADLINE_OPTIONS = f'StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, MaxFragments=2, MaxWords=20, MinWords=5'
+
+def render_snippet(snippet):
+    """HTML-escape a ts_headline snippet and wrap its matches in <mark> tags"""
+    return html.escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(SNIPPET_STOP, '</mark>')
+
+def encode_search_cursor(rank, row_id):
+    """Encode the (rank, id) of the last hit on a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(f"{rank!r}:{row_id}".encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(cursor):
+    """Decode a cursor produced by encode_search_cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        rank, row_id = raw.split(':', 1)
+        return float(rank), int(row_id)
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
+@traced('db.search_transcripts')
+def search_transcripts(user_id, query, limit=20, cursor=None, scope='utterances'):
+    """
+    Full-text search over a user's transcripts.
+    scope='utterances' returns utterance hits with timestamps, scope='transcripts'
+    returns whole-transcript hits. Results are ordered by rank and paginated with a
+    keyset cursor on (rank, id), so deep pages cost the same as the first one.
+    Returns: dict with hits and next_cursor (None on the last page)
+    """
+    if scope not in ('utterances', 'transcripts'):
+        raise ValueError(f"Unknown search scope: {scope}")
+    after = decode_search_cursor(cursor) if cursor else None
+    
+    conn = None
+    try:
+        conn = get_read_connection(user_id)
+        cursor_obj = conn.cursor(cursor_factory=RealDictCursor)
+        
+        params = {
+            'query': query, 'user_id': user_id, 'limit': limit + 1,
+            'sentinels': SNIPPET_START + SNIPPET_STOP, 'headline_options': SEARCH_HEADLINE_OPTIONS
+        }
+        keyset_clause = ""
+        if after:
+            keyset_clause = "AND (rank, id) < (%(after_rank)s::float8, %(after_id)s)"
+            params['after_rank'], params['after_id'] = after
+        
+        if scope == 'utterances':
+            cursor_obj.execute(f"""
+                WITH q AS (SELECT websearch_to_tsquery('english', %(query)s) AS query),
+                hits AS (
+                    SELECT u.id, u.transcript_session_id AS session_id, u.speaker, u.text,
+                           u.start_time, u.end_time, t.filename, t.created_at,
+                           ts_rank_cd(u.text_search, q.query)::float8 AS rank
+                    FROM utterances u
+                    JOIN transcripts t ON t.session_id = u.transcript_session_id
+                    CROSS JOIN q
+                    WHERE t.user_id = %(user_id)s AND u.text_search @@ q.query
+                )
+                SELECT page.id, page.session_id, page.speaker, page.start_time, page.end_time,
+                       page.filename, page.created_at, page.rank,
+                       ts_headline('english', translate(page.text, %(sentinels)s, ''), q.query, %(headline_options)s) AS snippet
+                FROM (
+                    SELECT * FROM hits
+                    WHERE TRUE {keyset_clause}
+                    ORDER BY rank DESC, id DESC
+                    LIMIT %(limit)s
+                ) page
+                CROSS JOIN q
+                ORDER BY page.rank DESC, page.id DESC
+            """, params)
+        else:
+            cursor_obj.execute(f"""
+                WITH q AS (SELECT websearch_to_tsquery('english', %(query)s) AS query),
+                hits AS (
+                    SELECT t.id, t.session_id, t.filename, t.text, t.audio_duration, t.created_at,
+                           ts_rank_cd(t.text_search, q.query)::float8 AS rank
+                    FROM transcripts t
+                    CROSS JOIN q
+                    WHERE t.user_id = %(user_id)s AND t.text_search @@ q.query
+                )
+                SELECT page.id, page.session_id, page.filename, page.audio_duration,
+                       page.created_at, page.rank,
+                       ts_headline('english', translate(page.text, %(sentinels)s, ''), q.query, %(headline_options)s) AS snippet
+                FROM (
+                    SELECT * FROM hits
+                    WHERE TRUE {keyset_clause}
+                    ORDER BY rank DESC, id DESC
+                    LIMIT %(limit)s
+                ) page
+                CROSS JOIN q
+                ORDER BY page.rank DESC, page.id DESC
+            """, params)
+        
+        rows = [dict(r) for r in cursor_obj.fetchall()]
+        for row in rows:
+            row['snippet'] = render_snippet(row['snippet'])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_search_cursor(rows[-1]['rank'], rows[-1]['id'])
+        
+        return {'hits': rows, 'next_cursor': next_cursor}
+        
+    except Exception as e:
+        logger.error(f"Error searching transcripts: {e}")
+        raise
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.delete_transcript_from_db')
 def delete_transcript_from_db(session_id, user_id=None):
     """Delete transcript and its utterances from database"""
     conn = None
@@ -309,13 +816,24 @@ def delete_transcript_from_db(session_id, user_id=None):
         cursor = conn.cursor()
         
         if user_id is not None:
-            cursor.execute("DELETE FROM transcripts WHERE session_id = %s AND user_id = %s", 
+            cursor.execute("DELETE FROM transcripts WHERE session_id = %s AND user_id = %s RETURNING audio_archive_key, user_id", 
                           (session_id, user_id))
         else:
-            cursor.execute("DELETE FROM transcripts WHERE session_id = %s", (session_id,))
+            cursor.execute("DELETE FROM transcripts WHERE session_id = %s RETURNING audio_archive_key, user_id", (session_id,))
         
-        deleted_count = cursor.rowcount
+        deleted = cursor.fetchall()
+        deleted_count = len(deleted)
         conn.commit()
+        mark_user_write(user_id)
+        for owner_id in {owner_id for _, owner_id in deleted}:
+            invalidate_user_profile(owner_id)
+        
+        for archive_key, _ in deleted:
+            if archive_key:
+                try:
+                    archive_store.delete_prefix(archive_key)
+                except OSError as e:
+                    logger.warning(f"Could not remove archived audio {archive_key}: {e}")
         
         if deleted_count > 0:
             logger.info(f"Transcript deleted: {session_id}")
@@ -333,32 +851,335 @@ def delete_transcript_from_db(session_id, user_id=None):
         if conn:
             return_db_connection(conn)
 
-def get_audio_from_db(session_id):
-    """Retrieve only audio data from database"""
-    conn = None
+@traced('db.get_audio_from_db')
+def get_audio_from_db(session_id, user_id=None):
+    """Retrieve only audio data from database, rehydrating archived audio"""
+    def query(conn):
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        cursor.execute(f"""
+            SELECT t.audio_data, t.audio_mimetype, t.filename, t.audio_archive_key
+            FROM transcripts t {where_clause}
+        """, params)
+        
+        result = cursor.fetchone()
+        return dict(result) if result else None
+    
     try:
-        conn = get_db_connection()
+        result = _read_with_fallback(query, user_id)
+        if result and result['audio_data'] is None and result['audio_archive_key']:
+            result['audio_data'] = read_archived_audio(result['audio_archive_key'])
+        return result
+    except Exception as e:
+        logger.error(f"Error retrieving audio: {e}")
+        return None
+
+@traced('db.get_audio_info_from_db')
+def get_audio_info_from_db(session_id, user_id=None):
+    """Retrieve audio metadata (lengths in bytes, mimetypes, codec, filename) without reading the audio"""
+    def query(conn):
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.execute("""
-            SELECT audio_data, audio_mimetype, filename 
-            FROM transcripts 
-            WHERE session_id = %s
-        """, (session_id,))
+        where_clause, params = _transcript_where_clause(session_id, user_id)
+        cursor.execute(f"""
+            SELECT COALESCE(octet_length(t.audio_data),
+                            CASE WHEN t.audio_archive_key IS NOT NULL THEN t.audio_size END) AS audio_length,
+                   COALESCE(octet_length(t.audio_original),
+                            CASE WHEN t.audio_archive_key IS NOT NULL THEN t.audio_original_size END) AS original_length,
+                   t.audio_mimetype, t.audio_original_mimetype, t.audio_codec, t.filename,
+                   t.audio_archive_key
+            FROM transcripts t {where_clause}
+        """, params)
         
         result = cursor.fetchone()
         return dict(result) if result else None
+    
+    try:
+        return _read_with_fallback(query, user_id)
+    except Exception as e:
+        logger.error(f"Error retrieving audio info: {e}")
+        return None
+
+AUDIO_COLUMNS = ('audio_data', 'audio_original')
+
+def iter_audio_from_db(session_id, chunk_size=AUDIO_CHUNK_SIZE, user_id=None, column='audio_data'):
+    """
+    Yield stored audio in fixed-size blocks using substring() paging.
+    Only one block is held in memory at a time. All blocks are read from the
+    same REPEATABLE READ snapshot, so a concurrent rewrite of the row cannot
+    produce a torn file. The connection is held until the generator is
+    exhausted or closed. If the replica has no audio yet, the primary is used.
+    Audio moved to the cold tier is rehydrated from the archive instead.
+    column selects the stored copy: audio_data, or the kept audio_original.
+    """
+    if column not in AUDIO_COLUMNS:
+        raise ValueError(f"Unknown audio column: {column}")
+    
+    conn = None
+    try:
+        conn = get_read_connection(user_id)
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
         
+        offset = 1
+        while True:
+            cursor.execute(f"""
+                SELECT substring({column} FROM %s FOR %s), audio_archive_key
+                FROM transcripts
+                WHERE session_id = %s
+            """, (offset, chunk_size, session_id))
+            row = cursor.fetchone()
+            if not row or not row[0]:
+                if offset == 1 and row and row[1]:
+                    return_db_connection(conn)
+                    conn = None
+                    yield from iter_archived_audio(row[1], column, chunk_size)
+                    break
+                if offset == 1 and is_replica_connection(conn):
+                    return_db_connection(conn)
+                    conn = None
+                    conn = get_db_connection()
+                    cursor = conn.cursor()
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    continue
+                break
+            
+            chunk = bytes(row[0])
+            yield chunk
+            if len(chunk) < chunk_size:
+                break
+            offset += chunk_size
+            
     except Exception as e:
-        logger.error(f"Error retrieving audio: {e}")
+        logger.error(f"Error streaming audio: {e}")
+        raise
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.store_compact_audio')
+def store_compact_audio(session_id, audio_data, audio_mimetype, audio_codec, keep_original=False):
+    """
+    Swap a transcript's stored audio for its compact encoding.
+    The original moves to audio_original when keep_original is set and is
+    dropped otherwise. Rows that were already compacted are left untouched.
+    Returns: True if the row was updated
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(STORAGE_MAINTENANCE)
+        
+        cursor.execute("""
+            UPDATE transcripts SET
+                audio_original = CASE WHEN %s THEN audio_data ELSE NULL END,
+                audio_original_mimetype = CASE WHEN %s THEN audio_mimetype ELSE NULL END,
+                audio_original_size = CASE WHEN %s THEN audio_size ELSE NULL END,
+                audio_data = %s,
+                audio_mimetype = %s,
+                audio_size = %s,
+                audio_codec = %s,
+                audio_updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = %s AND audio_codec IS NULL AND audio_data IS NOT NULL
+        """, (
+            keep_original, keep_original, keep_original,
+            audio_data, audio_mimetype, len(audio_data), audio_codec,
+            session_id
+        ))
+        
+        updated = cursor.rowcount > 0
+        conn.commit()
+        return updated
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error storing compact audio: {e}")
+        return False
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.mark_audio_codec')
+def mark_audio_codec(session_id, audio_codec):
+    """Record the codec of stored audio without changing the audio itself"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(STORAGE_MAINTENANCE)
+        cursor.execute(
+            "UPDATE transcripts SET audio_codec = %s WHERE session_id = %s AND audio_codec IS NULL",
+            (audio_codec, session_id)
+        )
+        conn.commit()
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error marking audio codec: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.get_uncompacted_session_ids')
+def get_uncompacted_session_ids(limit, after_id=0):
+    """List (id, session_id, audio_size) of transcripts whose audio has not been compacted, by id"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, session_id, audio_size
+            FROM transcripts
+            WHERE audio_codec IS NULL AND audio_data IS NOT NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+        """, (after_id, limit))
+        return cursor.fetchall()
+        
+    except Exception as e:
+        logger.error(f"Error listing uncompacted audio: {e}")
+        return []
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.get_cached_analysis')
+def get_cached_analysis(key):
+    """
+    Look up a cached analysis by (session_id, content_hash, model, prompt_version).
+    Returns: dict with status and result, or None if there is no entry
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("""
+            SELECT status, result
+            FROM analysis_cache
+            WHERE transcript_session_id = %s AND content_hash = %s AND model = %s AND prompt_version = %s
+        """, key)
+        return cursor.fetchone()
+        
+    except Exception as e:
+        logger.error(f"Error reading analysis cache: {e}")
         return None
     finally:
         if conn:
             return_db_connection(conn)
 
+@traced('db.claim_analysis')
+def claim_analysis(key, stale_seconds):
+    """
+    Claim the right to compute an analysis by inserting a pending entry.
+    A pending claim not refreshed for stale_seconds (its worker died) is taken over.
+    Returns: True if the caller should compute the analysis, False if another worker
+    holds the claim, or None if the cache could not be reached
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO analysis_cache (transcript_session_id, content_hash, model, prompt_version)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (transcript_session_id, content_hash, model, prompt_version) DO UPDATE
+                SET claimed_at = CURRENT_TIMESTAMP
+                WHERE analysis_cache.status = 'pending'
+                  AND analysis_cache.claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING id
+        """, (*key, stale_seconds))
+        claimed = cursor.fetchone() is not None
+        conn.commit()
+        return claimed
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error claiming analysis: {e}")
+        return None
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+def refresh_analysis_claim(key):
+    """Keep a pending claim from going stale while its analysis is still being computed"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE analysis_cache SET claimed_at = CURRENT_TIMESTAMP
+            WHERE transcript_session_id = %s AND content_hash = %s AND model = %s AND prompt_version = %s
+              AND status = 'pending'
+        """, key)
+        conn.commit()
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.warning(f"Error refreshing analysis claim: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.store_analysis')
+def store_analysis(key, result):
+    """Store a computed analysis and mark its cache entry ready"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO analysis_cache (
+                transcript_session_id, content_hash, model, prompt_version, status, result, completed_at
+            ) VALUES (%s, %s, %s, %s, 'ready', %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (transcript_session_id, content_hash, model, prompt_version) DO UPDATE SET
+                status = 'ready',
+                result = EXCLUDED.result,
+                completed_at = CURRENT_TIMESTAMP
+        """, (*key, json.dumps(result)))
+        conn.commit()
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error storing analysis: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+@traced('db.release_analysis_claim')
+def release_analysis_claim(key):
+    """Drop a pending claim after a failed computation so another request can retry"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM analysis_cache
+            WHERE transcript_session_id = %s AND content_hash = %s AND model = %s AND prompt_version = %s
+              AND status = 'pending'
+        """, key)
+        conn.commit()
+        
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Error releasing analysis claim: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+
 def close_database():
     """Close all database connections"""
-    global db_pool
+    global db_pool, replica_pool
+    if replica_pool:
+        replica_pool.closeall()
+        logger.info("Replica connection pool closed")
     if db_pool:
         db_pool.closeall()
         logger.info("Database connection pool closed")
@@ -4,6 +4,7 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from migrations import SCHEMA_VERSION, get_schema_version, run_migrations
 
 def create_database_if_not_exists():
     load_dotenv()
@@ -44,186 +45,41 @@ def create_database_if_not_exists():
         print(f"Error: {e}")
         sys.exit(1)
 
-def create_tables():
+def get_connection():
     load_dotenv()
     
-    try:
-        database_url = os.getenv('DATABASE_URL')
-        
-        if database_url:
-            parsed = urlparse(database_url)
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                port=parsed.port or 5432,
-                database=parsed.path[1:],
-                user=parsed.username,
-                password=parsed.password,
-                sslmode='prefer'
-            )
-        else:
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'transcripts_db'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'password')
-            )
-        
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                full_name VARCHAR(255),
-                is_premium BOOLEAN DEFAULT FALSE,
-                premium_expiry TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id SERIAL PRIMARY KEY,
-                session_id VARCHAR(255) UNIQUE NOT NULL,
-                transcript_id VARCHAR(255) NOT NULL,
-                filename VARCHAR(255) NOT NULL,
-                text TEXT,
-                confidence FLOAT,
-                audio_duration INTEGER,
-                speaker_labels BOOLEAN DEFAULT TRUE,
-                language_code VARCHAR(10) DEFAULT 'en_us',
-                audio_data BYTEA,
-                audio_mimetype VARCHAR(100),
-                audio_size INTEGER,
-                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS utterances (
-                id SERIAL PRIMARY KEY,
-                transcript_session_id VARCHAR(255) REFERENCES transcripts(session_id) ON DELETE CASCADE,
-                speaker VARCHAR(50),
-                text TEXT,
-                confidence FLOAT,
-                start_time INTEGER,
-                end_time INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Migrate user_id if needed
-        cursor.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns 
-                    WHERE table_name='transcripts' AND column_name='user_id'
-                ) THEN
-                    ALTER TABLE transcripts ADD COLUMN user_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
-                END IF;
-            END $$;
-        """)
-        
-        # Indexes
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_session_id ON transcripts(session_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_user_id ON transcripts(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_created_at ON transcripts(created_at)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_utterances_session_id ON utterances(transcript_session_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_filename ON transcripts(filename)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_audio_size ON transcripts(audio_size)")
-        
-        # Updated timestamp trigger
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-        """)
-        
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS update_transcripts_updated_at ON transcripts;
-            CREATE TRIGGER update_transcripts_updated_at
-                BEFORE UPDATE ON transcripts
-                FOR EACH ROW
-                EXECUTE PROCEDURE update_updated_at_column();
-        """)
-        
-        conn.commit()
-        print("Tables created")
-        
-        cursor.close()
-        conn.close()
-        
-    except Exception as e:
-        print(f"Error: {e}")
-        sys.exit(1)
-
-def migrate_existing_tables():
-    load_dotenv()
+    database_url = os.getenv('DATABASE_URL')
     
+    if database_url:
+        parsed = urlparse(database_url)
+        return psycopg2.connect(
+            host=parsed.hostname,
+            port=parsed.port or 5432,
+            database=parsed.path[1:],
+            user=parsed.username,
+            password=parsed.password,
+            sslmode='prefer'
+        )
+    
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'transcripts_db'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'password')
+    )
+
+def migrate():
     try:
-        database_url = os.getenv('DATABASE_URL')
+        conn = get_connection()
         
-        if database_url:
-            parsed = urlparse(database_url)
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                port=parsed.port or 5432,
-                database=parsed.path[1:],
-                user=parsed.username,
-                password=parsed.password,
-                sslmode='prefer'
-            )
+        applied = run_migrations(conn)
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
         else:
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'transcripts_db'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'password')
-            )
-        
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'transcripts' AND column_name IN ('audio_data', 'audio_mimetype', 'audio_size')
-        """)
-        existing = [row[0] for row in cursor.fetchall()]
-        
-        if len(existing) == 3:
             print("Already migrated")
-            cursor.close()
-            conn.close()
-            return
-        
-        if 'audio_data' not in existing:
-            cursor.execute("ALTER TABLE transcripts ADD COLUMN audio_data BYTEA")
-        
-        if 'audio_mimetype' not in existing:
-            cursor.execute("ALTER TABLE transcripts ADD COLUMN audio_mimetype VARCHAR(100)")
+        print(f"Schema version: {get_schema_version(conn)} (expected {SCHEMA_VERSION})")
         
-        if 'audio_size' not in existing:
-            cursor.execute("ALTER TABLE transcripts ADD COLUMN audio_size INTEGER")
-        
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_filename ON transcripts(filename)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_audio_size ON transcripts(audio_size)")
-        
-        conn.commit()
-        print("Migration done")
-        
-        cursor.close()
         conn.close()
         
     except Exception as e:
@@ -234,43 +90,29 @@ def show_stats():
     load_dotenv()
     
     try:
-        database_url = os.getenv('DATABASE_URL')
-        
-        if database_url:
-            parsed = urlparse(database_url)
-            conn = psycopg2.connect(
-                host=parsed.hostname,
-                port=parsed.port or 5432,
-                database=parsed.path[1:],
-                user=parsed.username,
-                password=parsed.password,
-                sslmode='prefer'
-            )
-        else:
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=os.getenv('DB_PORT', '5432'),
-                database=os.getenv('DB_NAME', 'transcripts_db'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'password')
-            )
-        
+        conn = get_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
             SELECT 
                 COUNT(*) as total,
                 COUNT(audio_data) as with_audio,
-                pg_size_pretty(SUM(audio_size)) as total_size
+                pg_size_pretty(SUM(audio_size)) as total_size,
+                COUNT(*) FILTER (WHERE audio_codec IS NOT NULL AND audio_codec <> 'original') as compacted,
+                pg_size_pretty(SUM(audio_original_size)) as originals_size,
+                COUNT(audio_archive_key) as archived
             FROM transcripts;
         """)
         
         stats = cursor.fetchone()
         if stats:
-            total, with_audio, size = stats
+            total, with_audio, size, compacted, originals_size, archived = stats
             print(f"\nTranscripts: {total}")
             print(f"With audio: {with_audio}")
             print(f"Total size: {size or '0 bytes'}")
+            print(f"Compacted: {compacted}")
+            print(f"Kept originals: {originals_size or '0 bytes'}")
+            print(f"Archived to cold tier: {archived}")
         
         cursor.close()
         conn.close()
@@ -278,17 +120,47 @@ def show_stats():
     except Exception as e:
         print(f"Error: {e}")
 
+def compact_audio():
+    from database import init_database, close_database
+    from audio_storage import compaction_enabled, compact_stored_audio_backlog
+    
+    if not compaction_enabled():
+        print("AUDIO_STORAGE_CODEC is 'none' - nothing to do")
+        return
+    
+    init_database()
+    try:
+        compacted = compact_stored_audio_backlog()
+        print(f"Compacted {compacted} transcripts")
+    finally:
+        close_database()
+
+def archive_audio():
+    from database import init_database, close_database
+    from audio_retention import archive_cold_audio
+    
+    init_database()
+    try:
+        archived = archive_cold_audio()
+        print(f"Archived audio for {archived} transcripts")
+    finally:
+        close_database()
+
 if __name__ == "__main__":
     load_dotenv()
     
     if len(sys.argv) > 1:
         if sys.argv[1] == "--migrate":
-            migrate_existing_tables()
+            migrate()
         elif sys.argv[1] == "--stats":
             show_stats()
+        elif sys.argv[1] == "--compact-audio":
+            compact_audio()
+        elif sys.argv[1] == "--archive-audio":
+            archive_audio()
         else:
-            print("Usage: python setup_db.py [--migrate|--stats]")
+            print("Usage: python setup_db.py [--migrate|--stats|--compact-audio|--archive-audio]")
     else:
         create_database_if_not_exists()
-        create_tables()
+        migrate()
         print("Done")
\ No newline at end of file
@@ -14,15 +14,51 @@ import {
   BarChart3,
   Loader,
 } from 'lucide-react';
-import axios from 'axios';
 import './TranscriptResults.css';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// Structured analyses stream as JSON; show the summary text once it starts arriving
+const previewFromStream = (text) => {
+  if (!text.trimStart().startsWith('{')) return text;
+  const match = text.match(/"summary"\s*:\s*"((?:[^"\\]|\\.)*)/);
+  if (!match) return '';
+  try {
+    return JSON.parse(`"${match[1].replace(/\\$/, '')}"`);
+  } catch {
+    return match[1];
+  }
+};
+
+// Parse complete Server-Sent Events messages from a buffer, returning the unparsed remainder
+const parseSseMessages = (buffer, onMessage) => {
+  const messages = buffer.split('\n\n');
+  const rest = messages.pop();
+  messages.forEach((message) => {
+    let event = 'message';
+    let data = '';
+    message.split('\n').forEach((line) => {
+      if (line.startsWith('event: ')) event = line.slice(7);
+      else if (line.startsWith('data: ')) data += line.slice(6);
+    });
+    if (!data) return;
+    let payload;
+    try {
+      payload = JSON.parse(data);
+    } catch (err) {
+      // Skip a malformed frame instead of abandoning the whole stream
+      return;
+    }
+    onMessage(event, payload);
+  });
+  return rest;
+};
+
 function TranscriptResults({ data, onReset }) {
   const [aiInsights, setAiInsights] = useState(null);
   const [loadingInsights, setLoadingInsights] = useState(false);
   const [insightsError, setInsightsError] = useState('');
+  const [insightsPreview, setInsightsPreview] = useState('');
   const [playingIndex, setPlayingIndex] = useState(null);
   const [isPlaying, setIsPlaying] = useState(false);
   const audioRef = useRef(null);
@@ -38,23 +74,57 @@ function TranscriptResults({ data, onReset }) {
   const handleGenerateInsights = async () => {
     setLoadingInsights(true);
     setInsightsError('');
+    setInsightsPreview('');
 
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.post(`${API_URL}/api/analyze/${session_id}`, {}, {
+      const response = await fetch(`${API_URL}/api/analyze/${session_id}/stream`, {
+        method: 'POST',
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
-      if (response.data.status === 'success') {
-        setAiInsights(response.data.analysis);
-      } else {
-        setInsightsError(response.data.error || 'Failed to generate insights');
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        setInsightsError(body.error || 'Failed to generate insights');
+        return;
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let streamed = '';
+      let finished = false;
+
+      const onMessage = (event, payload) => {
+        if (event === 'delta') {
+          streamed += payload.text;
+          setInsightsPreview(previewFromStream(streamed));
+        } else if (event === 'status') {
+          if (payload.restart) streamed = '';
+          setInsightsPreview(payload.message);
+        } else if (event === 'result') {
+          finished = true;
+          setAiInsights(payload.analysis);
+        } else if (event === 'error') {
+          finished = true;
+          setInsightsError(payload.error || 'Failed to generate insights');
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer = parseSseMessages(buffer + decoder.decode(value, { stream: true }), onMessage);
+      }
+      if (!finished) {
+        setInsightsError('Failed to generate insights');
       }
     } catch (err) {
-      setInsightsError(err.response?.data?.error || 'Failed to generate insights');
+      setInsightsError('Failed to generate insights');
     } finally {
       setLoadingInsights(false);
+      setInsightsPreview('');
     }
   };
 
@@ -86,6 +156,12 @@ function TranscriptResults({ data, onReset }) {
       if (aiInsights.sentiment) {
         content += `\nSentiment: ${aiInsights.sentiment}\n`;
       }
+      if (aiInsights.decisions && aiInsights.decisions.length > 0) {
+        content += `\nDecisions:\n`;
+        aiInsights.decisions.forEach((decision, i) => {
+          content += `${i + 1}. ${decision}\n`;
+        });
+      }
       if (aiInsights.action_items) {
         content += `\nAction Items:\n`;
         aiInsights.action_items.forEach((item, i) => {
@@ -317,6 +393,10 @@ function TranscriptResults({ data, onReset }) {
 
         {insightsError && <div className="error-message">{insightsError}</div>}
 
+        {loadingInsights && insightsPreview && (
+          <div className="insights-preview">{insightsPreview}</div>
+        )}
+
         {aiInsights && (
           <motion.div
             className="insights-content"
@@ -348,6 +428,17 @@ function TranscriptResults({ data, onReset }) {
               </div>
             )}
 
+            {aiInsights.decisions && aiInsights.decisions.length > 0 && (
+              <div className="insight-block">
+                <h4>Decisions</h4>
+                <ul>
+                  {aiInsights.decisions.map((decision, i) => (
+                    <li key={i}>{decision}</li>
+                  ))}
+                </ul>
+              </div>
+            )}
+
             {aiInsights.action_items && aiInsights.action_items.length > 0 && (
               <div className="insight-block">
                 <h4>Action Items</h4>
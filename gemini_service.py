@@ -3,8 +3,17 @@ Gemini AI Service for transcript analysis
 """
 import google.generativeai as genai
 import os
+import json
 import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from google.api_core.exceptions import ResourceExhausted
+
+from provider_limits import provider_slot, report_throttled
+from prompt_builder import compact_transcript, chunk_utterances
+from tracing import span, traced, bind_context
+from analysis_cache import analysis_key, get_or_compute
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -14,40 +23,312 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
-def analyze_transcript(transcript_text, utterances=None):
+ANALYSIS_MODEL = 'gemini-2.0-flash-exp'
+
+# 'structured' asks Gemini for JSON matching ANALYSIS_SCHEMA; 'text' parses free-text output
+ANALYSIS_MODE = os.getenv('GEMINI_ANALYSIS_MODE', 'structured').lower()
+if ANALYSIS_MODE not in ('structured', 'text'):
+    raise ValueError("GEMINI_ANALYSIS_MODE must be structured or text")
+
+# Bump when the prompt or parsing changes so cached analyses are recomputed
+PROMPT_VERSIONS = {'text': 5, 'structured': 6}
+PROMPT_VERSION = PROMPT_VERSIONS[ANALYSIS_MODE]
+
+SENTIMENTS = ('Positive', 'Neutral', 'Negative', 'Mixed')
+ANALYSIS_LIST_FIELDS = ('key_points', 'decisions', 'action_items')
+
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'key_points': {'type': 'array', 'items': {'type': 'string'}},
+        'sentiment': {'type': 'string'},
+        'decisions': {'type': 'array', 'items': {'type': 'string'}},
+        'action_items': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['summary', 'key_points', 'sentiment', 'decisions', 'action_items']
+}
+
+class AnalysisFormatError(Exception):
+    """Gemini returned an analysis that does not match ANALYSIS_SCHEMA"""
+
+# Calls made for a structured analysis before malformed output is reported
+STRUCTURED_ATTEMPTS = 2
+
+# Transcripts estimated above this many tokens are analyzed in chunks and the
+# partial results reduced in a final call
+CHUNK_TOKEN_BUDGET = int(os.getenv('GEMINI_CHUNK_TOKENS', 6000))
+MAX_PARALLEL_CHUNKS = int(os.getenv('GEMINI_MAX_PARALLEL', 4))
+# Share of an over-budget transcript that compaction may drop as low-information
+# content before falling back to chunked analysis
+PROMPT_MAX_DROP = float(os.getenv('GEMINI_PROMPT_MAX_DROP', 0.3))
+
+chunk_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_CHUNKS, thread_name_prefix='gemini-chunk')
+
+@traced('gemini.prepare_transcript')
+def prepare_transcript(transcript_text, utterances=None):
+    """Compact the transcript for prompting, logging how much it shrank"""
+    compact = compact_transcript(transcript_text, utterances, CHUNK_TOKEN_BUDGET, PROMPT_MAX_DROP)
+    stats = compact.stats()
+    logger.info(
+        f"Prompt compaction: {stats['original_tokens']} -> {stats['tokens']} tokens "
+        f"(ratio {stats['ratio']}, {stats['dropped_sentences']} sentences dropped)"
+    )
+    return compact
+
+def needs_chunking(compact):
+    return compact.tokens > CHUNK_TOKEN_BUDGET
+
+@contextmanager
+def gemini_slot():
+    """Hold a shared Gemini call slot, backing every worker off if Gemini reports a quota error"""
+    with provider_slot('gemini'):
+        try:
+            yield
+        except ResourceExhausted:
+            report_throttled('gemini')
+            raise
+
+def generate_text(prompt):
+    """Run a single Gemini call and return its text"""
+    model = genai.GenerativeModel(ANALYSIS_MODEL)
+    with span('gemini.generate_content', model=ANALYSIS_MODEL, mode='text'), gemini_slot():
+        response = model.generate_content(prompt)
+    if not response or not response.text:
+        raise ValueError("Empty response from Gemini")
+    return response.text
+
+def build_chunk_prompt(chunk_text, index, total):
+    return f"""The following is part {index + 1} of {total} of a longer transcript.
+Analyze only this part and provide:
+1. A concise summary (2-3 sentences)
+2. Key points or main topics discussed
+3. Overall sentiment (positive, neutral, negative, or mixed)
+4. Decisions made (if any)
+5. Any action items or next steps mentioned (if applicable)
+
+Transcript part:
+{chunk_text}
+
+Provide your analysis in a clear, structured format."""
+
+def validate_analysis(data):
     """
-    Analyze transcript using Gemini 2.5 Flash
-    Returns: dict with summary, key_points, sentiment, and action_items
+    Check a structured analysis against ANALYSIS_SCHEMA and normalize it
+    Raises: AnalysisFormatError
+    """
+    if not isinstance(data, dict):
+        raise AnalysisFormatError("analysis is not an object")
+
+    summary = data.get('summary')
+    if not isinstance(summary, str) or not summary.strip():
+        raise AnalysisFormatError("summary is missing")
+
+    sentiment = data.get('sentiment')
+    sentiment = sentiment.strip().capitalize() if isinstance(sentiment, str) else None
+    if sentiment not in SENTIMENTS:
+        raise AnalysisFormatError(f"unexpected sentiment: {data.get('sentiment')!r}")
+
+    result = {'summary': summary.strip(), 'sentiment': sentiment}
+    for field in ANALYSIS_LIST_FIELDS:
+        items = data.get(field)
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise AnalysisFormatError(f"{field} is not a list of strings")
+        result[field] = [item.strip() for item in items if item.strip()]
+    return result
+
+def structured_model():
+    return genai.GenerativeModel(
+        ANALYSIS_MODEL,
+        generation_config=genai.GenerationConfig(
+            response_mime_type='application/json',
+            response_schema=ANALYSIS_SCHEMA
+        )
+    )
+
+def parse_structured(analysis_text):
+    """Decode and validate a structured analysis response"""
+    try:
+        data = json.loads(analysis_text)
+    except json.JSONDecodeError as e:
+        raise AnalysisFormatError(f"analysis is not valid JSON: {e}")
+    result = validate_analysis(data)
+    result['raw_analysis'] = analysis_text
+    return result
+
+def generate_structured(prompt, attempts=STRUCTURED_ATTEMPTS):
+    """Run a Gemini call constrained to ANALYSIS_SCHEMA and return the validated analysis"""
+    model = structured_model()
+    error = None
+    for attempt in range(attempts):
+        with span('gemini.generate_content', model=ANALYSIS_MODEL, mode='structured', attempt=attempt + 1), gemini_slot():
+            response = model.generate_content(prompt)
+        if not response or not response.text:
+            raise ValueError("Empty response from Gemini")
+        try:
+            return parse_structured(response.text)
+        except AnalysisFormatError as e:
+            error = e
+            logger.warning(f"Discarding malformed structured analysis: {e}")
+    raise AnalysisFormatError(f"Gemini returned malformed analysis: {error}")
+
+def generate_analysis(prompt):
+    """Run one analysis prompt in the configured mode, returning the analysis dict"""
+    if ANALYSIS_MODE == 'structured':
+        return generate_structured(prompt)
+    return parse_analysis(generate_text(prompt))
+
+def analyze_chunks(chunks):
+    """Analyze transcript chunks concurrently, returning their partial analyses in order"""
+    with span('gemini.analyze_chunks', chunks=len(chunks)):
+        futures = [
+            chunk_executor.submit(bind_context(generate_analysis), build_chunk_prompt(chunk, i, len(chunks)))
+            for i, chunk in enumerate(chunks)
+        ]
+        return [future.result() for future in futures]
+
+def format_partial_analyses(partials):
+    """Render partial analyses as numbered notes for a reduce prompt"""
+    sections = []
+    for i, partial in enumerate(partials):
+        lines = [f"Part {i + 1}:", f"Summary: {partial['summary']}", f"Sentiment: {partial['sentiment']}"]
+        lines += [f"- Key point: {point}" for point in partial['key_points']]
+        lines += [f"- Decision: {decision}" for decision in partial['decisions']]
+        lines += [f"- Action item: {item}" for item in partial['action_items']]
+        sections.append('\n'.join(lines))
+    return '\n\n'.join(sections)
+
+def build_reduce_prompt(partials, speaker_count):
+    prompt = f"""The following are analyses of consecutive parts of one transcript.
+Combine them into an analysis of the whole transcript and provide:
+1. A concise summary (2-3 sentences)
+2. 3-5 key points or main topics discussed
+3. Overall sentiment (positive, neutral, negative, or mixed)
+4. Decisions made (if any), without duplicates
+5. Any action items or next steps mentioned (if applicable), without duplicates
+
+Partial analyses:
+{format_partial_analyses(partials)}
+"""
+    if speaker_count:
+        prompt += f"\n\nNote: This conversation involves {speaker_count} different speakers."
+    prompt += "\n\nProvide your analysis in a clear, structured format."
+    return prompt
+
+def analyze_transcript_chunked(compact):
+    """
+    Map-reduce analysis for long transcripts: chunks are analyzed in parallel
+    and their partial results combined in one final call
+    """
+    chunks = chunk_utterances(compact.turns, CHUNK_TOKEN_BUDGET)
+    partials = analyze_chunks(chunks)
+    logger.info(f"Reducing {len(partials)} chunk analyses")
+    return generate_analysis(build_reduce_prompt(partials, compact.speaker_count))
+
+def stream_analysis(transcript_text, utterances=None):
+    """
+    Streaming variant of analyze_transcript.
+    Yields ('status', dict) and ('delta', {'text': ...}) events as Gemini produces
+    output, then a final ('result', analysis). For long transcripts the chunks are
+    analyzed first and only the reduce call is streamed.
     """
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API key not configured")
-    try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')        
-        prompt = f"""Analyze the following transcript and provide:
+
+    compact = prepare_transcript(transcript_text, utterances)
+    if needs_chunking(compact):
+        chunks = chunk_utterances(compact.turns, CHUNK_TOKEN_BUDGET)
+        yield 'status', {'message': f'Analyzing {len(chunks)} parts of a long transcript'}
+        partials = analyze_chunks(chunks)
+        prompt = build_reduce_prompt(partials, compact.speaker_count)
+    else:
+        prompt = build_analysis_prompt(compact)
+
+    if ANALYSIS_MODE != 'structured':
+        analysis_text = yield from stream_response(genai.GenerativeModel(ANALYSIS_MODEL), prompt)
+        yield 'result', parse_analysis(analysis_text)
+        logger.info(f"Successfully streamed transcript analysis from Gemini")
+        return
+
+    # Malformed structured output is retried like generate_structured does
+    model = structured_model()
+    error = None
+    for attempt in range(STRUCTURED_ATTEMPTS):
+        if attempt:
+            # Tells the client to discard the text streamed so far
+            yield 'status', {'message': 'Retrying analysis', 'restart': True}
+        analysis_text = yield from stream_response(model, prompt)
+        try:
+            result = parse_structured(analysis_text)
+        except AnalysisFormatError as e:
+            error = e
+            logger.warning(f"Discarding malformed structured analysis: {e}")
+            continue
+        yield 'result', result
+        logger.info(f"Successfully streamed transcript analysis from Gemini")
+        return
+    raise AnalysisFormatError(f"Gemini returned malformed analysis: {error}")
+
+def stream_response(model, prompt):
+    """
+    Stream one Gemini call, yielding ('delta', {'text': ...}) events.
+    Returns: the full response text
+    """
+    parts = []
+    with gemini_slot():
+        for chunk in model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # A chunk without text parts (e.g. only finish metadata)
+                continue
+            if text:
+                parts.append(text)
+                yield 'delta', {'text': text}
+
+    analysis_text = ''.join(parts)
+    if not analysis_text:
+        raise ValueError("Empty response from Gemini")
+    return analysis_text
+
+def build_analysis_prompt(compact):
+    """Build the prompt sent to Gemini by analyze_transcript from a CompactTranscript"""
+    prompt = f"""Analyze the following transcript and provide:
 1. A concise summary (2-3 sentences)
 2. 3-5 key points or main topics discussed
 3. Overall sentiment (positive, neutral, negative, or mixed)
-4. Any action items or next steps mentioned (if applicable)
+4. Decisions made (if any)
+5. Any action items or next steps mentioned (if applicable), with the responsible speaker if identifiable
 
 Transcript:
-{transcript_text}
+{compact.text}
 """
-        if utterances and len(utterances) > 0:
-            prompt += f"\n\nNote: This conversation involves {len(set([u.get('speaker', '') for u in utterances]))} different speakers."
-        prompt += "\n\nProvide your analysis in a clear, structured format."
-        response = model.generate_content(prompt)
-        
-        if not response or not response.text:
-            raise ValueError("Empty response from Gemini")
-        analysis_text = response.text        
-        result = {
-            'summary': extract_section(analysis_text, 'summary'),
-            'key_points': extract_list(analysis_text, 'key points', 'key point'),
-            'sentiment': extract_sentiment(analysis_text),
-            'action_items': extract_list(analysis_text, 'action items', 'action item', 'next steps'),
-            'raw_analysis': analysis_text
-        }
-        
+    if compact.speaker_count:
+        prompt += f"\n\nNote: This conversation involves {compact.speaker_count} different speakers; each line starts with its speaker label."
+    prompt += "\n\nProvide your analysis in a clear, structured format."
+    return prompt
+
+def parse_analysis(analysis_text):
+    """Split Gemini's free-text analysis into summary, key points, sentiment, decisions and action items"""
+    return {
+        'summary': extract_section(analysis_text, 'summary'),
+        'key_points': extract_list(analysis_text, 'key points', 'key point'),
+        'sentiment': extract_sentiment(analysis_text),
+        'decisions': extract_list(analysis_text, 'decisions', 'decision'),
+        'action_items': extract_list(analysis_text, 'action items', 'action item', 'next steps'),
+        'raw_analysis': analysis_text
+    }
+
+@traced('gemini.analyze_transcript')
+def analyze_transcript(transcript_text, utterances=None):
+    """
+    Analyze transcript using Gemini 2.5 Flash
+    Returns: dict with summary, key_points, sentiment, decisions and action_items
+    """
+    if not GEMINI_API_KEY:
+        raise ValueError("Gemini API key not configured")
+    try:
+        result = analyze_compact(prepare_transcript(transcript_text, utterances))
         logger.info(f"Successfully analyzed transcript with Gemini")
         return result
         
@@ -55,6 +336,12 @@ Transcript:
         logger.error(f"Gemini analysis error: {e}")
         raise
 
+def analyze_compact(compact):
+    """Analyze an already compacted transcript, in chunks if it is too long for one call"""
+    if needs_chunking(compact):
+        return analyze_transcript_chunked(compact)
+    return generate_analysis(build_analysis_prompt(compact))
+
 def extract_section(text, section_name):
     """Extract a specific section from the analysis"""
     try:
@@ -142,25 +429,60 @@ def extract_sentiment(text):
     except:
         return "Neutral"
 
-def generate_meeting_summary(transcript_text, utterances, duration_seconds):
+def format_meeting_summary(analysis, duration_seconds, speaker_count):
+    """Render a structured analysis as a plain-text meeting summary"""
+    def section(title, items):
+        lines = [f"{i + 1}. {item}" for i, item in enumerate(items)] or ["None recorded"]
+        return f"{title}\n" + '\n'.join(lines)
+
+    return '\n\n'.join([
+        f"Duration: {duration_seconds // 60} minutes\nParticipants: {speaker_count} speakers",
+        f"Executive Summary\n{analysis['summary']}",
+        section("Main Discussion Points", analysis['key_points']),
+        section("Decisions Made", analysis['decisions']),
+        section("Action Items", analysis['action_items']),
+        f"Overall Sentiment: {analysis['sentiment']}"
+    ])
+
+def generate_meeting_summary(transcript_text, utterances, duration_seconds, session_id=None):
     """
-    Generate a comprehensive meeting summary
+    Generate a comprehensive meeting summary.
+    With session_id, a structured analysis is shared with the analysis cache
+    instead of calling Gemini again.
     """
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API key not configured")
     
+    compact = prepare_transcript(transcript_text, utterances)
+    if ANALYSIS_MODE == 'structured':
+        # The structured analysis already covers every section of the summary
+        if session_id is not None:
+            key = analysis_key(session_id, transcript_text, utterances, ANALYSIS_MODEL, PROMPT_VERSION)
+            analysis, _ = get_or_compute(key, lambda: analyze_compact(compact))
+        else:
+            analysis = analyze_compact(compact)
+        return {
+            'summary': format_meeting_summary(analysis, duration_seconds, compact.speaker_count),
+            'analysis': analysis,
+            'generated_at': 'timestamp'
+        }
+    
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = genai.GenerativeModel(ANALYSIS_MODEL)
         
-        speakers = list(set([u.get('speaker', '') for u in utterances])) if utterances else []
+        if needs_chunking(compact):
+            # Summarize from per-part notes instead of the full transcript
+            partials = analyze_chunks(chunk_utterances(compact.turns, CHUNK_TOKEN_BUDGET))
+            source = f"Notes from consecutive parts of the meeting:\n{format_partial_analyses(partials)}"
+        else:
+            source = f"Transcript:\n{compact.text}"
         
         prompt = f"""Generate a professional meeting summary for the following transcript:
 
 Duration: {duration_seconds // 60} minutes
-Participants: {len(speakers)} speakers
+Participants: {compact.speaker_count} speakers
 
-Transcript:
-{transcript_text}
+{source}
 
 Please provide:
 1. Executive Summary (2-3 sentences)
@@ -171,7 +493,8 @@ Please provide:
 
 Format the summary professionally and concisely."""
         
-        response = model.generate_content(prompt)
+        with gemini_slot():
+            response = model.generate_content(prompt)
         
         return {
             'summary': response.text if response and response.text else "Summary not available",
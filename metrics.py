@@ -0,0 +1,416 @@
+"""
+Prometheus metrics aggregated across worker processes.
+Each process keeps its own counters, histograms and gauges and periodically
+writes a snapshot file to METRICS_DIR; /metrics merges every snapshot.
+Snapshots of exited processes are folded into one retained file and deleted.
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import threading
+from contextlib import contextmanager
+from flask import g, request
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS, logger
+from shared_state import pid_alive
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REGISTRY = {}
+# Functions run before each snapshot to refresh gauges and counters read from other modules
+COLLECTORS = []
+_lock = threading.Lock()
+_flusher_pid = None
+# Snapshot file name of this process; unique even when a pid is reused
+_snapshot_name = None
+_claimed_pid = None
+
+# Counters and histograms of exited processes, summed
+RETAINED_FILE = 'retained.json'
+LOCK_FILE = '.lock'
+# Snapshot names already folded into the retained file, so a crash mid-fold is not counted twice
+MAX_FOLDED_NAMES = 1000
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return json.dumps([str(labels[name]) for name in labelnames])
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.samples = {}
+        REGISTRY[name] = self
+
+    def snapshot(self):
+        return {
+            'type': self.kind,
+            'help': self.documentation,
+            'labels': self.labelnames,
+            'samples': dict(self.samples)
+        }
+
+
+class Counter(Metric):
+    """Monotonic count, summed across every process that ever reported it"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        _ensure_flusher()
+        with _lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a cumulative count kept elsewhere in this process"""
+        with _lock:
+            self.samples[_label_key(self.labelnames, labels)] = value
+
+
+class Gauge(Metric):
+    """Current value, summed across live processes"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        _ensure_flusher()
+        with _lock:
+            self.samples[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, summed across processes"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        _ensure_flusher()
+        with _lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                # Per-bucket counts, then the +Inf count, then the sum
+                sample = self.samples[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[i] += 1
+                    break
+            else:
+                sample[len(self.buckets)] += 1
+            sample[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        snap = super().snapshot()
+        snap['buckets'] = self.buckets
+        snap['samples'] = {key: list(sample) for key, sample in self.samples.items()}
+        return snap
+
+
+def register_collector(fn):
+    """Call fn before every snapshot of this process's metrics"""
+    COLLECTORS.append(fn)
+    return fn
+
+
+def _snapshot_pid(name):
+    """Pid encoded in a snapshot file name ("<pid>-<id>.json"), or None for other files"""
+    try:
+        return int(name.split('.')[0].split('-')[0])
+    except ValueError:
+        return None
+
+
+@contextmanager
+def _dir_lock():
+    """Serialize folding across processes sharing METRICS_DIR"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _fold(names):
+    """Add the counters and histograms of exited processes' snapshots to the retained file, then delete them"""
+    if not names:
+        return
+    with _dir_lock():
+        retained_path = os.path.join(METRICS_DIR, RETAINED_FILE)
+        try:
+            with open(retained_path) as f:
+                retained = json.load(f)
+        except FileNotFoundError:
+            retained = {'pid': None, 'folded': [], 'metrics': {}}
+
+        snapshots = [retained]
+        folded = []
+        for name in names:
+            path = os.path.join(METRICS_DIR, name)
+            if name in retained['folded']:
+                folded.append(path)
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError as e:
+                logger.warning(f"Discarding unreadable metrics snapshot {name}: {e}")
+                folded.append(path)
+                continue
+            # Marked dead so its gauges are dropped, even when its pid now belongs to a live process
+            snapshots.append(dict(snapshot, pid=None))
+            retained['folded'].append(name)
+            folded.append(path)
+
+        retained['metrics'] = _merge(snapshots)
+        retained['folded'] = retained['folded'][-MAX_FOLDED_NAMES:]
+        _write_json(retained_path, retained)
+        for path in folded:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _snapshot_names():
+    try:
+        return [
+            name for name in os.listdir(METRICS_DIR)
+            if name.endswith('.json') and name != RETAINED_FILE
+        ]
+    except FileNotFoundError:
+        return []
+
+
+def prune_snapshots():
+    """Fold the snapshots of processes that have exited"""
+    stale = []
+    for name in _snapshot_names():
+        pid = _snapshot_pid(name)
+        if name != _snapshot_name and pid is not None and not pid_alive(pid):
+            stale.append(name)
+    _fold(stale)
+
+
+def write_snapshot():
+    """Write this process's metrics to its snapshot file"""
+    global _claimed_pid
+    _ensure_flusher()
+    if _claimed_pid != os.getpid():
+        # Any other snapshot under this pid is from an exited process whose pid was reused
+        _fold([
+            name for name in _snapshot_names()
+            if _snapshot_pid(name) == os.getpid() and name != _snapshot_name
+        ])
+        _claimed_pid = os.getpid()
+    for collector in COLLECTORS:
+        try:
+            collector()
+        except Exception as e:
+            logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+
+    with _lock:
+        metrics = {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _write_json(os.path.join(METRICS_DIR, _snapshot_name), {'pid': os.getpid(), 'metrics': metrics})
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def _ensure_flusher():
+    """Start this process's snapshot thread on first use (again after a fork)"""
+    global _flusher_pid, _snapshot_name
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        if _flusher_pid is not None:
+            # Forked from a process that already recorded metrics; those are in its own snapshot
+            for metric in REGISTRY.values():
+                metric.samples.clear()
+        _flusher_pid = pid
+        _snapshot_name = f"{pid}-{uuid.uuid4().hex[:8]}.json"
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _read_snapshots():
+    snapshots = []
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable metrics snapshot {name}: {e}")
+    return snapshots
+
+
+def _merge(snapshots):
+    """
+    Sum samples across processes. Counters and histograms from exited workers
+    still count; gauges only come from live ones.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        pid = snapshot.get('pid')
+        alive = pid is not None and (pid == os.getpid() or pid_alive(pid))
+        for name, metric in snapshot['metrics'].items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, 'samples': {}})
+            for key, value in metric['samples'].items():
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, json.loads(key)))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """All workers' metrics in the Prometheus text exposition format"""
+    write_snapshot()
+    try:
+        prune_snapshots()
+    except OSError as e:
+        logger.warning(f"Could not prune metrics snapshots: {e}")
+    # Under the lock so a concurrent fold is never seen half done
+    with _dir_lock():
+        snapshots = _read_snapshots()
+    lines = []
+    for name, metric in sorted(_merge(snapshots).items()):
+        labelnames = metric['labels']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(metric['samples'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + [float('inf')], value[:-1]):
+                cumulative += count
+                labels = _format_labels(labelnames, key, ('le', _format_number(float(bound))))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_number(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def directory_bytes(path):
+    """Total size of the files directly inside path"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return total
+
+
+# Metrics recorded from more than one module
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route',
+    ('method', 'route', 'status')
+)
+UPLOAD_STAGE_SECONDS = Histogram(
+    'upload_stage_duration_seconds', 'Time spent in each stage of the upload pipeline', ('stage',)
+)
+POLL_ITERATIONS = Counter(
+    'assemblyai_poll_iterations_total', 'Transcript status requests made while waiting for AssemblyAI'
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result')
+)
+PROVIDER_WAIT_SECONDS = Histogram(
+    'provider_queue_wait_seconds', 'Time calls waited for an AssemblyAI or Gemini slot', ('provider', 'outcome')
+)
+
+
+def init_request_metrics(app):
+    """Time every Flask request by its route pattern"""
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=request.url_rule.rule if request.url_rule else 'unmatched',
+                status=response.status_code
+            )
+        return response
@@ -0,0 +1,210 @@
+"""
+Versioned schema migrations
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the Postgres advisory lock that serializes migration runs
+MIGRATION_LOCK_ID = 7405321
+
+# Ordered (version, description, sql) entries. Applied migrations are never
+# edited; schema changes are appended as a new version.
+MIGRATIONS = [
+    (1, 'Base schema', """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            full_name VARCHAR(255),
+            is_premium BOOLEAN DEFAULT FALSE,
+            premium_expiry TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS transcripts (
+            id SERIAL PRIMARY KEY,
+            session_id VARCHAR(255) UNIQUE NOT NULL,
+            transcript_id VARCHAR(255) NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            text TEXT,
+            confidence FLOAT,
+            audio_duration INTEGER,
+            speaker_labels BOOLEAN DEFAULT TRUE,
+            language_code VARCHAR(10) DEFAULT 'en_us',
+            audio_data BYTEA,
+            audio_mimetype VARCHAR(100),
+            audio_size INTEGER,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS utterances (
+            id SERIAL PRIMARY KEY,
+            transcript_session_id VARCHAR(255) REFERENCES transcripts(session_id) ON DELETE CASCADE,
+            speaker VARCHAR(50),
+            text TEXT,
+            confidence FLOAT,
+            start_time INTEGER,
+            end_time INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Databases created before audio storage and accounts existed
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_data BYTEA;
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_mimetype VARCHAR(100);
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_size INTEGER;
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
+
+        CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+        CREATE INDEX IF NOT EXISTS idx_transcripts_session_id ON transcripts(session_id);
+        CREATE INDEX IF NOT EXISTS idx_transcripts_user_id ON transcripts(user_id);
+        CREATE INDEX IF NOT EXISTS idx_transcripts_created_at ON transcripts(created_at);
+        CREATE INDEX IF NOT EXISTS idx_transcripts_filename ON transcripts(filename);
+        CREATE INDEX IF NOT EXISTS idx_transcripts_audio_size ON transcripts(audio_size);
+        CREATE INDEX IF NOT EXISTS idx_utterances_session_id ON utterances(transcript_session_id);
+
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.updated_at = CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+
+        DROP TRIGGER IF EXISTS update_transcripts_updated_at ON transcripts;
+        CREATE TRIGGER update_transcripts_updated_at
+            BEFORE UPDATE ON transcripts
+            FOR EACH ROW
+            EXECUTE PROCEDURE update_updated_at_column();
+    """),
+    (2, 'Full-text search columns', """
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS text_search tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED;
+        ALTER TABLE utterances ADD COLUMN IF NOT EXISTS text_search tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED;
+        CREATE INDEX IF NOT EXISTS idx_transcripts_text_search ON transcripts USING GIN(text_search);
+        CREATE INDEX IF NOT EXISTS idx_utterances_text_search ON utterances USING GIN(text_search);
+    """),
+    (3, 'Out-of-line uncompressed audio storage', """
+        -- Audio is already compressed; EXTERNAL storage makes substring() reads cheap
+        ALTER TABLE transcripts ALTER COLUMN audio_data SET STORAGE EXTERNAL;
+    """),
+    (4, 'Compact audio storage', """
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_codec VARCHAR(50);
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_original BYTEA;
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_original_mimetype VARCHAR(100);
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_original_size INTEGER;
+        ALTER TABLE transcripts ALTER COLUMN audio_original SET STORAGE EXTERNAL;
+    """),
+    (5, 'Cold-tier audio archive pointers', """
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_archive_key VARCHAR(512);
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_archived_at TIMESTAMP;
+    """),
+    (6, 'Packed per-transcript utterance storage', """
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS utterance_pack BYTEA;
+    """),
+    (7, 'Gemini analysis cache', """
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            id SERIAL PRIMARY KEY,
+            transcript_session_id VARCHAR(255) NOT NULL REFERENCES transcripts(session_id) ON DELETE CASCADE,
+            content_hash CHAR(64) NOT NULL,
+            model VARCHAR(100) NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            result JSONB,
+            claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            UNIQUE (transcript_session_id, content_hash, model, prompt_version)
+        );
+    """),
+    (8, 'Storage maintenance keeps updated_at', """
+        -- Re-encoding or archiving audio does not change what clients see, so it must not
+        -- invalidate ETags and caches keyed by updated_at. Such updates SET LOCAL the flag.
+        CREATE OR REPLACE FUNCTION update_updated_at_column()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF current_setting('app.storage_maintenance', true) = 'on' THEN
+                NEW.updated_at = OLD.updated_at;
+            ELSE
+                NEW.updated_at = CURRENT_TIMESTAMP;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql';
+    """),
+    (9, 'Audio version for validators', """
+        -- Compaction rewrites audio_size and audio_mimetype without touching updated_at;
+        -- ETags and Last-Modified use the later of the two timestamps
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS audio_updated_at TIMESTAMP;
+    """),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version, or 0 for an unversioned database"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        conn.commit()
+        return 0
+
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    version = cursor.fetchone()[0]
+    conn.commit()
+    return version
+
+
+def run_migrations(conn):
+    """
+    Apply all pending migrations.
+    A session-level advisory lock makes concurrent runs wait for each other,
+    and each migration commits together with its schema_migrations row, so an
+    interrupted run resumes from the first unapplied version.
+    Returns: list of versions applied by this call
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    conn.commit()
+
+    applied_now = []
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+
+        for version, description, sql in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {version} ({description}) failed")
+                raise
+            applied_now.append(version)
+            logger.info(f"Applied migration {version}: {description}")
+
+        return applied_now
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
@@ -0,0 +1,13 @@
+"""
+bcrypt operations run in the password process pool.
+Kept free of app imports so spawned workers start quickly.
+"""
+import bcrypt
+
+
+def hash_password_in_worker(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def verify_password_in_worker(password, hashed_password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
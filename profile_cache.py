@@ -0,0 +1,62 @@
+"""
+Short-lived cache of user profiles served by /api/auth/me
+"""
+from config import AUTH_PROFILE_CACHE_SIZE, AUTH_PROFILE_CACHE_TTL_SECONDS, logger
+from cache_utils import LRUCache
+from shared_state import register_schema, get_state_connection, state_transaction
+
+register_schema("""
+    CREATE TABLE IF NOT EXISTS user_profile_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    );
+""")
+
+# user_id -> (profile version when cached, profile)
+profile_cache = LRUCache(max_entries=AUTH_PROFILE_CACHE_SIZE, ttl=AUTH_PROFILE_CACHE_TTL_SECONDS)
+
+
+def get_profile_version(user_id):
+    """
+    Current profile version for user_id, bumped by every invalidation in any worker.
+    Read it before loading the profile so a concurrent change is never cached as current.
+    Returns None if the shared state is unavailable, which disables caching.
+    """
+    try:
+        row = get_state_connection().execute(
+            "SELECT version FROM user_profile_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        logger.warning(f"Could not read profile version for user {user_id}: {e}")
+        return None
+
+
+def get_cached_profile(user_id, version):
+    """Return the cached profile for user_id if it is still at version"""
+    if version is None:
+        return None
+    entry = profile_cache.get(user_id)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+
+def cache_profile(user_id, version, profile):
+    if version is not None:
+        profile_cache.set(user_id, (version, profile))
+
+
+def invalidate_user_profile(user_id):
+    """Drop user_id's cached profile in every worker"""
+    if user_id is None:
+        return
+    profile_cache.delete(user_id)
+    try:
+        with state_transaction() as conn:
+            conn.execute("""
+                INSERT INTO user_profile_versions (user_id, version) VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+            """, (user_id,))
+    except Exception as e:
+        logger.warning(f"Could not invalidate cached profile for user {user_id}: {e}")
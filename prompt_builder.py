@@ -0,0 +1,229 @@
+"""
+Compact transcript rendering for Gemini prompts
+"""
+import re
+
+# Filler words dropped wherever they appear as whole words
+FILLERS = r"(?:um+|uh+|erm+|er|ah+|hmm+|mm+|mhm)"
+FILLER_PATTERN = re.compile(rf"(?:,\s*)?(?<![\w'-]){FILLERS}(?![\w'-])[,.]?\s*", re.IGNORECASE)
+# Discourse markers dropped only when set off by commas on both sides, where they carry no meaning
+HEDGE_PATTERN = re.compile(r",\s*(?:you know|i mean|like),(?=\s)", re.IGNORECASE)
+# Fillers and comma-bounded markers opening a sentence ("Um, so, we ...")
+LEADING_HEDGE_PATTERN = re.compile(
+    rf"(^|[.!?]\s+)(?:{FILLERS}[,.]?\s+|(?:so|well|you know|i mean|like),\s*)+(\w)", re.IGNORECASE
+)
+# Words that are only ever doubled by a stutter ("I I think", "the, the"); repeats of other
+# words ("that that", "10 10", "yes yes", "so so") can carry meaning and are kept
+STUTTER_WORDS = r"(?:i|i'm|it's|a|an|the|to|and|but|we|you|he|she|they|my|of)"
+REPEAT_PATTERN = re.compile(rf"(?<![\w'-])({STUTTER_WORDS})(?:[\s,]+\1)+(?![\w'-])", re.IGNORECASE)
+# A cut-off start of the word that follows ("wh- what", "th- the")
+PARTIAL_PATTERN = re.compile(r"(?<![\w'-])([a-z]{1,3})-\s+(?=\1)", re.IGNORECASE)
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset("""
+    a about after all also am an and any are as at be because been but by can could did do does
+    doing don't for from get got had has have having he her here him his how i i'm if in into is
+    it it's its just know let's like me more my no not now of oh ok okay on one or our out really
+    right so some sure than that that's the their them then there they thing think this to too
+    um uh up us very was we we're well were what when where which who will with would yeah yes
+    you your you're
+""".split())
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English)"""
+    return len(text or '') // 4 + 1
+
+
+def strip_disfluencies(text):
+    """
+    Remove filler words, comma-bounded hedges and stuttered repeats from text.
+    A sentence that started with a removed filler or hedge keeps its capitalisation;
+    nothing else is capitalised.
+    """
+    text = LEADING_HEDGE_PATTERN.sub(_drop_leading_hedge, (text or '').strip())
+    text = FILLER_PATTERN.sub(' ', text)
+    text = HEDGE_PATTERN.sub('', text)
+    text = PARTIAL_PATTERN.sub('', text)
+    text = REPEAT_PATTERN.sub(r'\1', text)
+    text = re.sub(r"\s+([,.!?])", r"\1", text)
+    text = re.sub(r",(?:\s*,)+", ",", text)
+    return re.sub(r"\s{2,}", " ", text).strip(" ,")
+
+
+def _drop_leading_hedge(match):
+    """Drop sentence-opening fillers and hedges, carrying their capitalisation over to the next word"""
+    hedge_capitalised = match.group(0)[len(match.group(1)):][:1].isupper()
+    word = match.group(2)
+    return match.group(1) + (word.upper() if hedge_capitalised else word)
+
+
+def capitalize_turn(text):
+    return text[:1].upper() + text[1:]
+
+
+def format_utterance(utterance):
+    """Render one turn as a compact speaker-tagged line"""
+    speaker = utterance.get('speaker')
+    text = utterance.get('text', '')
+    return f"{speaker}: {text}" if speaker else text
+
+
+def merge_turns(utterances):
+    """Merge consecutive utterances by the same speaker into single turns"""
+    turns = []
+    for u in utterances:
+        text = (u.get('text') or '').strip()
+        if not text:
+            continue
+        speaker = u.get('speaker')
+        if turns and turns[-1]['speaker'] == speaker:
+            turns[-1]['text'] += ' ' + text
+        else:
+            turns.append({'speaker': speaker, 'text': text})
+    return turns
+
+
+def _sentence_scores(turns):
+    """
+    Split turns into sentences and score each by how many content words it
+    introduces that earlier sentences have not already used.
+    Returns: list of (turn index, sentence, score, tokens)
+    """
+    seen = set()
+    sentences = []
+    for i, turn in enumerate(turns):
+        for sentence in SENTENCE_SPLIT.split(turn['text']):
+            if not sentence:
+                continue
+            words = {w for w in WORD_PATTERN.findall(sentence.lower()) if w not in STOPWORDS and len(w) > 2}
+            novel = words - seen
+            seen |= words
+            sentences.append((i, sentence, len(novel), estimate_tokens(sentence) + 1))
+    return sentences
+
+
+def _drop_low_information(turns, excess_tokens, max_drop_tokens):
+    """
+    Drop the least informative sentences until excess_tokens have been removed
+    or dropping more would exceed max_drop_tokens.
+    Returns: (turns, sentences dropped)
+    """
+    sentences = _sentence_scores(turns)
+    order = sorted(range(len(sentences)), key=lambda k: (sentences[k][2], sentences[k][3]))
+    dropped = set()
+    removed = 0
+    for k in order:
+        if removed >= excess_tokens:
+            break
+        cost = sentences[k][3]
+        if removed + cost > max_drop_tokens:
+            continue
+        dropped.add(k)
+        removed += cost
+
+    kept = [[] for _ in turns]
+    for k, (i, sentence, _, _) in enumerate(sentences):
+        if k not in dropped:
+            kept[i].append(sentence)
+    remaining = [
+        {'speaker': turn['speaker'], 'text': ' '.join(kept[i])}
+        for i, turn in enumerate(turns) if kept[i]
+    ]
+    return merge_turns(remaining), len(dropped)
+
+
+class CompactTranscript:
+    """A transcript rendered for prompting, with its size before and after compaction"""
+
+    def __init__(self, turns, original_tokens, speaker_count, dropped_sentences=0):
+        self.turns = turns
+        self.text = '\n'.join(format_utterance(turn) for turn in turns)
+        self.original_tokens = original_tokens
+        self.tokens = estimate_tokens(self.text)
+        self.dropped_sentences = dropped_sentences
+        self.speaker_count = speaker_count
+
+    @property
+    def ratio(self):
+        """Compacted size as a fraction of the original"""
+        return self.tokens / self.original_tokens if self.original_tokens else 1.0
+
+    def stats(self):
+        return {
+            'original_tokens': self.original_tokens,
+            'tokens': self.tokens,
+            'ratio': round(self.ratio, 3),
+            'dropped_sentences': self.dropped_sentences
+        }
+
+
+def compact_transcript(transcript_text, utterances=None, token_budget=None, max_drop=0.3):
+    """
+    Render a transcript compactly: speaker-tagged turns with consecutive
+    same-speaker utterances merged and disfluencies stripped. If the result is
+    over token_budget, the least informative sentences (backchannels, repeats
+    of what was already said) are dropped, removing at most max_drop of the
+    content; anything still over budget is left for the caller to chunk.
+    """
+    original_tokens = estimate_tokens(transcript_text)
+    if utterances:
+        source = utterances
+    else:
+        source = [{'speaker': None, 'text': transcript_text or ''}]
+
+    cleaned = [{'speaker': u.get('speaker'), 'text': strip_disfluencies(u.get('text'))} for u in source]
+    turns = merge_turns(cleaned)
+    # Capitalise only where a merged turn starts, not where each utterance in it did
+    for turn in turns:
+        turn['text'] = capitalize_turn(turn['text'])
+    speaker_count = len({turn['speaker'] for turn in turns if turn['speaker']})
+    compact = CompactTranscript(turns, original_tokens, speaker_count)
+
+    if token_budget and compact.tokens > token_budget and max_drop > 0:
+        turns, dropped = _drop_low_information(
+            turns, compact.tokens - token_budget, int(compact.tokens * max_drop)
+        )
+        compact = CompactTranscript(turns, original_tokens, speaker_count, dropped)
+    return compact
+
+
+def chunk_utterances(utterances, token_budget):
+    """
+    Split utterances into consecutive chunks of formatted lines, each within token_budget.
+    Chunks break on utterance boundaries; a single utterance longer than the
+    budget is split on word boundaries.
+    Returns: list of chunk texts
+    """
+    chunks = []
+    lines = []
+    used = 0
+
+    def flush():
+        nonlocal lines, used
+        if lines:
+            chunks.append('\n'.join(lines))
+        lines, used = [], 0
+
+    for utterance in utterances:
+        line = format_utterance(utterance)
+        cost = estimate_tokens(line)
+        if cost > token_budget:
+            flush()
+            piece = []
+            for word in line.split():
+                if piece and estimate_tokens(' '.join(piece + [word])) > token_budget:
+                    chunks.append(' '.join(piece))
+                    piece = []
+                piece.append(word)
+            if piece:
+                chunks.append(' '.join(piece))
+            continue
+        if used + cost > token_budget:
+            flush()
+        lines.append(line)
+        used += cost
+
+    flush()
+    return chunks
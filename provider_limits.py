@@ -0,0 +1,256 @@
+"""
+Rate and concurrency limits for external API providers (AssemblyAI, Gemini),
+shared by all worker processes on this host
+"""
+import os
+import math
+import time
+import uuid
+import random
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from config import PROVIDER_LIMITS, PROVIDER_QUEUE_TIMEOUT_SECONDS, logger
+from metrics import PROVIDER_WAIT_SECONDS
+from shared_state import register_schema, pid_alive, get_state_connection, state_transaction
+
+# Longest single sleep between acquisition attempts, so freed slots are noticed promptly
+MAX_POLL_INTERVAL = 0.25
+# A lease outlives its call by this much before it is considered abandoned
+DEFAULT_LEASE_SECONDS = 330
+# Backoff applied to every worker when a provider answers 429 without Retry-After
+DEFAULT_THROTTLE_SECONDS = 5
+
+register_schema("""
+    CREATE TABLE IF NOT EXISTS provider_buckets (
+        provider TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS provider_leases (
+        lease_id TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        pid INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_provider_leases_provider ON provider_leases(provider);
+""")
+
+
+class ProviderBusyError(Exception):
+    """A call waited longer than its queue timeout for a provider slot"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        # Whole seconds a client should wait before retrying, for a Retry-After header
+        self.retry_after = retry_after
+
+
+# Per-process wait metrics, reported by get_limiter_stats()
+LIMITER_STATS = {
+    provider: {'acquired': 0, 'timeouts': 0, 'throttled': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0}
+    for provider in PROVIDER_LIMITS
+}
+LIMITER_STATS_LOCK = threading.Lock()
+
+
+def _record_wait(provider, waited_ms, acquired):
+    with LIMITER_STATS_LOCK:
+        stats = LIMITER_STATS[provider]
+        if acquired:
+            stats['acquired'] += 1
+        else:
+            stats['timeouts'] += 1
+        stats['wait_ms_total'] += waited_ms
+        stats['wait_ms_max'] = max(stats['wait_ms_max'], waited_ms)
+    PROVIDER_WAIT_SECONDS.observe(
+        waited_ms / 1000, provider=provider, outcome='acquired' if acquired else 'timeout'
+    )
+
+
+def _refilled_tokens(conn, provider, now):
+    limits = PROVIDER_LIMITS[provider]
+    row = conn.execute(
+        "SELECT tokens, updated_at FROM provider_buckets WHERE provider = ?", (provider,)
+    ).fetchone()
+    if row is None:
+        return limits['burst']
+    tokens, updated_at = row
+    return min(limits['burst'], tokens + max(0.0, now - updated_at) * limits['rate'])
+
+
+def _set_tokens(conn, provider, tokens, now):
+    conn.execute("""
+        INSERT INTO provider_buckets (provider, tokens, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(provider) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+    """, (provider, tokens, now))
+
+
+def try_acquire(provider, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Take one token and one in-flight slot for provider if both are available.
+    Returns: (lease_id, None) on success, or (None, seconds to wait before retrying)
+    """
+    limits = PROVIDER_LIMITS[provider]
+    now = time.time()
+    with state_transaction() as conn:
+        conn.execute("DELETE FROM provider_leases WHERE expires_at < ?", (now,))
+        in_flight = conn.execute(
+            "SELECT COUNT(*) FROM provider_leases WHERE provider = ?", (provider,)
+        ).fetchone()[0]
+
+        if in_flight >= limits['max_in_flight']:
+            # Reclaim slots held by workers that died mid-call
+            pids = [row[0] for row in conn.execute(
+                "SELECT DISTINCT pid FROM provider_leases WHERE provider = ?", (provider,)
+            )]
+            dead = [pid for pid in pids if not pid_alive(pid)]
+            if dead:
+                conn.executemany("DELETE FROM provider_leases WHERE pid = ?", [(pid,) for pid in dead])
+                in_flight = conn.execute(
+                    "SELECT COUNT(*) FROM provider_leases WHERE provider = ?", (provider,)
+                ).fetchone()[0]
+            if in_flight >= limits['max_in_flight']:
+                return None, MAX_POLL_INTERVAL
+
+        tokens = _refilled_tokens(conn, provider, now)
+        if tokens < 1:
+            _set_tokens(conn, provider, tokens, now)
+            return None, (1 - tokens) / limits['rate']
+
+        lease_id = uuid.uuid4().hex
+        _set_tokens(conn, provider, tokens - 1, now)
+        conn.execute(
+            "INSERT INTO provider_leases (lease_id, provider, pid, expires_at) VALUES (?, ?, ?, ?)",
+            (lease_id, provider, os.getpid(), now + lease_seconds)
+        )
+        return lease_id, None
+
+
+def release(lease_id):
+    """Free the in-flight slot held by lease_id"""
+    with state_transaction() as conn:
+        conn.execute("DELETE FROM provider_leases WHERE lease_id = ?", (lease_id,))
+
+
+def _next_sleep(wait, deadline):
+    remaining = deadline - time.monotonic()
+    # Jitter keeps queued callers in different workers from retrying in lockstep
+    return max(0.0, min(wait * random.uniform(1.0, 1.2), MAX_POLL_INTERVAL, remaining))
+
+
+def acquire(provider, timeout=PROVIDER_QUEUE_TIMEOUT_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Wait for a token and an in-flight slot for provider.
+    Returns: lease_id to pass to release()
+    Raises: ProviderBusyError if none frees up within timeout seconds
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        lease_id, wait = try_acquire(provider, lease_seconds)
+        waited_ms = (time.monotonic() - started) * 1000
+        if lease_id:
+            _record_wait(provider, waited_ms, acquired=True)
+            return lease_id
+        if time.monotonic() + min(wait, MAX_POLL_INTERVAL) > deadline:
+            _record_wait(provider, waited_ms, acquired=False)
+            raise ProviderBusyError(
+                f"Timed out after {waited_ms:.0f}ms waiting for {provider}", max(1, math.ceil(wait))
+            )
+        time.sleep(_next_sleep(wait, deadline))
+
+
+async def acquire_async(provider, timeout=PROVIDER_QUEUE_TIMEOUT_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """acquire() for the ASGI serving mode; waits without blocking the event loop"""
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        lease_id, wait = await asyncio.to_thread(try_acquire, provider, lease_seconds)
+        waited_ms = (time.monotonic() - started) * 1000
+        if lease_id:
+            _record_wait(provider, waited_ms, acquired=True)
+            return lease_id
+        if time.monotonic() + min(wait, MAX_POLL_INTERVAL) > deadline:
+            _record_wait(provider, waited_ms, acquired=False)
+            raise ProviderBusyError(
+                f"Timed out after {waited_ms:.0f}ms waiting for {provider}", max(1, math.ceil(wait))
+            )
+        await asyncio.sleep(_next_sleep(wait, deadline))
+
+
+@contextmanager
+def provider_slot(provider, timeout=PROVIDER_QUEUE_TIMEOUT_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Hold a rate-limited in-flight slot for provider for the duration of the block"""
+    lease_id = acquire(provider, timeout, lease_seconds)
+    try:
+        yield
+    finally:
+        release(lease_id)
+
+
+@asynccontextmanager
+async def provider_slot_async(provider, timeout=PROVIDER_QUEUE_TIMEOUT_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS):
+    lease_id = await acquire_async(provider, timeout, lease_seconds)
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(release, lease_id)
+
+
+def report_throttled(provider, retry_after=None):
+    """
+    Empty provider's bucket after a 429 so every worker backs off together
+    instead of each retrying immediately
+    """
+    try:
+        seconds = float(retry_after) if retry_after else DEFAULT_THROTTLE_SECONDS
+    except ValueError:
+        seconds = DEFAULT_THROTTLE_SECONDS
+    with state_transaction() as conn:
+        _set_tokens(conn, provider, -seconds * PROVIDER_LIMITS[provider]['rate'], time.time())
+    with LIMITER_STATS_LOCK:
+        LIMITER_STATS[provider]['throttled'] += 1
+    logger.warning(f"{provider} rate limited us; pausing new calls for {seconds:.0f}s")
+
+
+def has_headroom(provider, reserve):
+    """
+    True if provider has more than `reserve` free in-flight slots and tokens,
+    so optional work can run without delaying interactive calls
+    """
+    conn = get_state_connection()
+    now = time.time()
+    in_flight = conn.execute(
+        "SELECT COUNT(*) FROM provider_leases WHERE provider = ? AND expires_at >= ?", (provider, now)
+    ).fetchone()[0]
+    free_slots = PROVIDER_LIMITS[provider]['max_in_flight'] - in_flight
+    return free_slots > reserve and _refilled_tokens(conn, provider, now) > reserve
+
+
+def get_limiter_stats():
+    """Limiter state shared across workers plus this process's wait metrics"""
+    stats = {}
+    try:
+        conn = get_state_connection()
+        now = time.time()
+        for provider, limits in PROVIDER_LIMITS.items():
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM provider_leases WHERE provider = ? AND expires_at >= ?", (provider, now)
+            ).fetchone()[0]
+            stats[provider] = {
+                'in_flight': in_flight,
+                'max_in_flight': limits['max_in_flight'],
+                'tokens': round(_refilled_tokens(conn, provider, now), 2)
+            }
+    except Exception as e:
+        logger.error(f"Error reading limiter state: {e}")
+        stats = {provider: {} for provider in PROVIDER_LIMITS}
+
+    with LIMITER_STATS_LOCK:
+        for provider, process_stats in LIMITER_STATS.items():
+            stats[provider].update(process_stats)
+            calls = process_stats['acquired'] + process_stats['timeouts']
+            stats[provider]['wait_ms_avg'] = round(process_stats['wait_ms_total'] / calls, 2) if calls else 0.0
+    return stats
@@ -0,0 +1,209 @@
+"""
+Per-user sliding-window rate limits and admission control for heavy routes,
+shared by all worker processes on this host
+"""
+import os
+import math
+import time
+import uuid
+from functools import wraps
+from flask import request, jsonify, make_response
+
+from config import (
+    RATE_LIMIT_ENABLED, RATE_LIMITS, REQUEST_DEADLINE_SECONDS, ADMISSION_WORKER_SLOTS,
+    ADMISSION_EXPECTED_SECONDS, logger
+)
+from shared_state import register_schema, pid_alive, state_transaction
+
+# Weight of the latest duration in each route's running estimate
+DURATION_SMOOTHING = 0.2
+
+register_schema("""
+    CREATE TABLE IF NOT EXISTS rate_limit_hits (
+        user_id INTEGER NOT NULL,
+        scope TEXT NOT NULL,
+        at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rate_limit_hits_user ON rate_limit_hits(user_id, scope, at);
+    CREATE INDEX IF NOT EXISTS idx_rate_limit_hits_scope ON rate_limit_hits(scope, at);
+    CREATE TABLE IF NOT EXISTS admission_leases (
+        lease_id TEXT PRIMARY KEY,
+        scope TEXT NOT NULL,
+        pid INTEGER NOT NULL,
+        started_at REAL NOT NULL,
+        expected_seconds REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS admission_durations (
+        scope TEXT PRIMARY KEY,
+        expected_seconds REAL NOT NULL
+    );
+""")
+
+
+class Admission:
+    """Outcome of a rate limit and admission check for one request"""
+
+    def __init__(self, scope, limit=None, remaining=None, retry_after=None, reason=None, lease_id=None):
+        self.scope = scope
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.reason = reason
+        self.lease_id = lease_id
+        self.started = time.monotonic()
+
+    @property
+    def allowed(self):
+        return self.retry_after is None
+
+    def done(self):
+        """Release the admission slot and record how long the request took"""
+        if not self.lease_id:
+            return
+        lease_id, self.lease_id = self.lease_id, None
+        try:
+            finish_admission(lease_id, self.scope, time.monotonic() - self.started)
+        except Exception as e:
+            logger.warning(f"Could not release admission slot for {self.scope}: {e}")
+
+
+def _check_windows(conn, user_id, scopes, tier, now):
+    """
+    Count user_id's requests in each scope's sliding window.
+    Returns: (limit, remaining) for the first scope, or (limit, seconds until a slot frees) for a full window
+    """
+    first = None
+    for scope in scopes:
+        window = RATE_LIMITS[scope]['window_seconds']
+        limit = RATE_LIMITS[scope][tier]
+        conn.execute("DELETE FROM rate_limit_hits WHERE scope = ? AND at < ?", (scope, now - window))
+        used, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(at) FROM rate_limit_hits WHERE user_id = ? AND scope = ?", (user_id, scope)
+        ).fetchone()
+        if used >= limit:
+            return None, (limit, oldest + window - now if oldest else window)
+        if first is None:
+            first = (limit, limit - used - 1)
+    return first, None
+
+
+def _admission_wait(conn, scope, now):
+    """
+    Estimate how long a new request for scope would wait behind the heavy work in flight.
+    Returns: (seconds of backlog per worker slot, this request's expected duration)
+    """
+    conn.execute("DELETE FROM admission_leases WHERE started_at < ?", (now - 2 * REQUEST_DEADLINE_SECONDS,))
+    leases = conn.execute("SELECT pid, started_at, expected_seconds FROM admission_leases").fetchall()
+    dead = [pid for pid in {pid for pid, _, _ in leases} if not pid_alive(pid)]
+    if dead:
+        conn.executemany("DELETE FROM admission_leases WHERE pid = ?", [(pid,) for pid in dead])
+    backlog = sum(
+        max(0.0, expected - (now - started_at))
+        for pid, started_at, expected in leases if pid not in dead
+    )
+    row = conn.execute("SELECT expected_seconds FROM admission_durations WHERE scope = ?", (scope,)).fetchone()
+    expected = row[0] if row else ADMISSION_EXPECTED_SECONDS[scope]
+    return backlog / max(1, ADMISSION_WORKER_SLOTS), expected
+
+
+def check_request(user_id, is_premium, scope='api'):
+    """
+    Apply user_id's sliding-window limits for scope and (usually) 'api', then, for heavy
+    scopes, admit the request only if it can finish within the request deadline.
+    Counts the request when it is allowed. Fails open if the shared state is unavailable.
+    Returns: Admission; call done() on it when an allowed request finishes
+    """
+    if not RATE_LIMIT_ENABLED or user_id is None:
+        return Admission(scope)
+
+    tier = 'premium' if is_premium else 'free'
+    if scope == 'api' or not RATE_LIMITS[scope].get('counts_toward_api', True):
+        scopes = [scope]
+    else:
+        scopes = [scope, 'api']
+    now = time.time()
+    try:
+        with state_transaction() as conn:
+            allowed, refused = _check_windows(conn, user_id, scopes, tier, now)
+            if refused:
+                limit, retry_after = refused
+                return Admission(scope, limit, 0, retry_after, 'rate_limited')
+            limit, remaining = allowed
+
+            lease_id = None
+            if scope in ADMISSION_EXPECTED_SECONDS:
+                wait, expected = _admission_wait(conn, scope, now)
+                if wait + expected > REQUEST_DEADLINE_SECONDS:
+                    return Admission(scope, limit, remaining, wait + expected - REQUEST_DEADLINE_SECONDS, 'overloaded')
+                lease_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO admission_leases (lease_id, scope, pid, started_at, expected_seconds) VALUES (?, ?, ?, ?, ?)",
+                    (lease_id, scope, os.getpid(), now, expected)
+                )
+
+            conn.executemany(
+                "INSERT INTO rate_limit_hits (user_id, scope, at) VALUES (?, ?, ?)",
+                [(user_id, s, now) for s in scopes]
+            )
+            return Admission(scope, limit, remaining, lease_id=lease_id)
+    except Exception as e:
+        logger.warning(f"Rate limit check failed, allowing request: {e}")
+        return Admission(scope)
+
+
+def finish_admission(lease_id, scope, elapsed):
+    """Free an admission slot and fold elapsed into scope's expected duration"""
+    with state_transaction() as conn:
+        conn.execute("DELETE FROM admission_leases WHERE lease_id = ?", (lease_id,))
+        conn.execute("""
+            INSERT INTO admission_durations (scope, expected_seconds) VALUES (?, ?)
+            ON CONFLICT(scope) DO UPDATE SET
+                expected_seconds = expected_seconds * ? + excluded.expected_seconds * ?
+        """, (scope, elapsed, 1 - DURATION_SMOOTHING, DURATION_SMOOTHING))
+
+
+def rejection_body(admission):
+    """JSON body for a 429 response"""
+    if admission.reason == 'overloaded':
+        message = 'The server is too busy to finish this request in time. Please try again shortly.'
+    else:
+        message = 'Too many requests. Please slow down and try again later.'
+    return {'error': 'Too many requests', 'message': message, 'retry_after': retry_after_header(admission)}
+
+
+def retry_after_header(admission):
+    return max(1, math.ceil(admission.retry_after))
+
+
+def rate_limited(scope='api'):
+    """
+    Decorator enforcing per-user rate limits (and admission control for heavy scopes).
+    Place it below @token_required so the user is known.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            admission = check_request(request.user_id, request.is_premium, scope)
+            if not admission.allowed:
+                response = jsonify(rejection_body(admission))
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after_header(admission))
+                return response
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except BaseException:
+                admission.done()
+                raise
+
+            if response.is_streamed:
+                response.call_on_close(admission.done)
+            else:
+                admission.done()
+            if admission.limit is not None:
+                response.headers['X-RateLimit-Limit'] = str(admission.limit)
+                response.headers['X-RateLimit-Remaining'] = str(admission.remaining)
+            return response
+
+        return decorated
+    return decorator
@@ -0,0 +1,60 @@
+"""
+Small SQLite database for state shared by all worker processes on this host
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from config import SHARED_STATE_PATH
+
+# CREATE TABLE IF NOT EXISTS scripts registered by the modules that own the tables
+SCHEMAS = []
+
+_local = threading.local()
+
+
+def register_schema(sql):
+    """Register tables to create on first use of the shared state database"""
+    SCHEMAS.append(sql)
+
+
+def get_state_connection():
+    """Return this thread's connection to the shared state database"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(SHARED_STATE_PATH, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.schemas_applied = 0
+
+    while _local.schemas_applied < len(SCHEMAS):
+        conn.executescript(SCHEMAS[_local.schemas_applied])
+        _local.schemas_applied += 1
+    return conn
+
+
+@contextmanager
+def state_transaction():
+    """Run a block in a write transaction, serialized across processes"""
+    conn = get_state_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def pid_alive(pid):
+    """True if a process with this pid still exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+# config.py refuses to load without these; point shared state and metrics at a scratch directory
+_scratch = tempfile.mkdtemp(prefix='speaker_recogn_tests_')
+os.environ.setdefault('ASSEMBLYAI_API_KEY', 'test-key')
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/test')
+# Database tests run only against a disposable database named by TEST_DATABASE_URL
+if os.getenv('TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+    os.environ['DB_AUTO_MIGRATE'] = 'true'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+os.environ['SHARED_STATE_PATH'] = os.path.join(_scratch, 'state.sqlite3')
+os.environ['METRICS_DIR'] = os.path.join(_scratch, 'metrics')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,60 @@
+import time
+
+from cache_utils import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_bounded_by_weight():
+    cache = LRUCache(max_weight=10)
+    cache.set('a', b'x' * 6)
+    cache.set('b', b'x' * 6)
+    assert cache.get('a') is None
+    assert cache.stats()['weight'] == 6
+
+
+def test_values_heavier_than_the_cache_are_not_cached():
+    cache = LRUCache(max_weight=4)
+    cache.set('a', b'abc')
+    cache.set('b', b'too heavy')
+    assert cache.get('a') == b'abc'
+    assert cache.get('b') is None
+
+
+def test_replacing_a_key_updates_weight():
+    cache = LRUCache(max_weight=10)
+    cache.set('a', b'abcdef')
+    cache.set('a', b'ab')
+    assert cache.stats()['weight'] == 2
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=60)
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.stats()['entries'] == 1
+
+
+def test_delete_and_stats():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('missing', 'default')
+    cache.delete('a')
+    cache.delete('a')
+    assert cache.get('a', 'gone') == 'gone'
+    assert cache.stats() == {'entries': 0, 'weight': 0, 'hits': 1, 'misses': 2}
@@ -0,0 +1,82 @@
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from compression import choose_encoding, compress_body, compress_stream, is_compressible
+
+
+@pytest.fixture
+def no_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('gzip;q=0', None),
+    ('deflate', None),
+    ('*', 'gzip'),
+    ('*, gzip;q=0', None),
+    ('', None),
+    (None, None),
+    ('gzip;q=bad', None),
+])
+def test_choose_encoding(no_brotli, header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_prefers_brotli_when_available(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert choose_encoding('gzip, br') == 'br'
+    assert choose_encoding('gzip, br;q=0') == 'gzip'
+
+
+@pytest.mark.parametrize('mimetype, expected', [
+    ('application/json', True),
+    ('text/html', True),
+    ('application/x-ndjson', True),
+    ('text/event-stream', False),
+    ('audio/mpeg', False),
+    (None, False),
+])
+def test_is_compressible(mimetype, expected):
+    assert is_compressible(mimetype) is expected
+
+
+def test_compress_body_roundtrip(no_brotli):
+    data = b'{"text": "hello"}' * 200
+    body, encoding = compress_body(data, 'gzip', 'application/json')
+    assert encoding == 'gzip'
+    assert gzip.decompress(body) == data
+
+
+def test_small_or_binary_bodies_are_left_alone(no_brotli):
+    assert compress_body(b'{}', 'gzip', 'application/json') == (b'{}', None)
+    audio = b'\x00' * 4096
+    assert compress_body(audio, 'gzip', 'audio/mpeg') == (audio, None)
+
+
+def test_incompressible_bodies_are_sent_as_is(no_brotli, monkeypatch):
+    monkeypatch.setattr(compression, 'COMPRESSION_MIN_BYTES', 1)
+    data = b'x'
+    assert compress_body(data, 'gzip', 'application/json') == (data, None)
+
+
+def test_compress_stream_roundtrip_and_closes_source():
+    closed = []
+
+    def chunks():
+        try:
+            yield '{"line": 1}\n'
+            yield b'{"line": 2}\n' * 100
+        finally:
+            closed.append(True)
+
+    source = chunks()
+    out = list(compress_stream(source, 'gzip'))
+    assert gzip.decompress(b''.join(out)) == b'{"line": 1}\n' + b'{"line": 2}\n' * 100
+    # The first chunk is flushed on its own so the client sees it right away
+    assert zlib.decompressobj(31).decompress(out[0]) == b'{"line": 1}\n'
+    assert closed == [True]
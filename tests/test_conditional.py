@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+from conditional import check_not_modified, make_etag, matching_etag, not_modified_headers, validator_headers
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+def test_etag_depends_on_every_part():
+    assert make_etag('session', UPDATED_AT) == make_etag('session', UPDATED_AT)
+    assert make_etag('session', UPDATED_AT) != make_etag('session', UPDATED_AT, 'audio')
+    assert len(make_etag('session')) == 32
+
+
+def test_matching_etag():
+    etag = make_etag('session')
+    assert matching_etag(f'"{etag}"', etag) == etag
+    assert matching_etag(f'W/"{etag}"', etag) == etag
+    assert matching_etag(f'"other", "{etag}-gzip"', etag) == f'{etag}-gzip'
+    assert matching_etag(f'"{etag}-br"', etag) == f'{etag}-br'
+    assert matching_etag('*', etag) == etag
+    assert matching_etag('"other"', etag) is None
+    assert matching_etag(f'"{etag}-deflate"', etag) is None
+
+
+def test_if_none_match_takes_precedence():
+    etag = make_etag('session')
+    headers = {'If-None-Match': '"stale"', 'If-Modified-Since': 'Wed, 01 May 2030 00:00:00 GMT'}
+    assert check_not_modified(headers, etag, UPDATED_AT) is None
+
+
+def test_if_modified_since():
+    etag = make_etag('session')
+    assert check_not_modified({'If-Modified-Since': 'Wed, 01 May 2024 12:30:15 GMT'}, etag, UPDATED_AT) == etag
+    assert check_not_modified({'If-Modified-Since': 'Wed, 01 May 2024 12:30:14 GMT'}, etag, UPDATED_AT) is None
+    # Without a trustworthy date only tags can answer 304
+    assert check_not_modified({'If-Modified-Since': 'Wed, 01 May 2030 00:00:00 GMT'}, etag) is None
+    assert check_not_modified({}, etag, UPDATED_AT) is None
+
+
+def test_headers():
+    headers = validator_headers('abc', UPDATED_AT.replace(tzinfo=timezone.utc))
+    assert headers['ETag'] == '"abc"'
+    assert headers['Last-Modified'] == 'Wed, 01 May 2024 12:30:15 GMT'
+    assert headers['Cache-Control'] == 'private, no-cache'
+    assert not_modified_headers('abc-gzip')['ETag'] == '"abc-gzip"'
+    assert not_modified_headers('abc-gzip')['Vary'] == 'Accept-Encoding'
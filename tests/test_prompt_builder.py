@@ -0,0 +1,84 @@
+import pytest
+
+from prompt_builder import chunk_utterances, compact_transcript, estimate_tokens, merge_turns, strip_disfluencies
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Um, I I think the, the plan works.', 'I think the plan works.'),
+    ('The the cat', 'The cat'),
+    ('wh- what happened', 'what happened'),
+    ('you know, it is fine, you know, really', 'it is fine really'),
+    ('well uh hmm okay', 'well okay'),
+    ('Um, so, we should go.', 'We should go.'),
+    ('We left. Um, uh, so, they stayed.', 'We left. They stayed.'),
+])
+def test_strips_disfluencies(text, expected):
+    assert strip_disfluencies(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'I know that that is true',
+    'it costs 10 10 dollars',
+    'yes yes',
+    'I had had enough',
+    'the umbrella and the theme',
+    'We need fruit, like apples and pears.',
+    'It was, I mean it was fine.',
+    'It was so so.',
+])
+def test_keeps_meaningful_repeats_and_words(text):
+    assert strip_disfluencies(text) == text
+
+
+def test_leading_hedge_keeps_capitalisation():
+    assert strip_disfluencies('So, we should go. well, maybe not.') == 'We should go. maybe not.'
+    assert strip_disfluencies('so, we go') == 'we go'
+
+
+def test_does_not_capitalise():
+    assert strip_disfluencies('hello there') == 'hello there'
+
+
+def test_merge_turns():
+    turns = merge_turns([
+        {'speaker': 'A', 'text': 'one'},
+        {'speaker': 'A', 'text': ' two '},
+        {'speaker': 'B', 'text': ''},
+        {'speaker': 'A', 'text': 'three'},
+        {'speaker': 'B', 'text': 'four'},
+    ])
+    assert turns == [{'speaker': 'A', 'text': 'one two three'}, {'speaker': 'B', 'text': 'four'}]
+
+
+def test_compact_capitalises_only_turn_starts():
+    compact = compact_transcript('', [
+        {'speaker': 'A', 'text': 'hello'},
+        {'speaker': 'A', 'text': 'yes'},
+        {'speaker': 'B', 'text': 'uh, ok'},
+    ])
+    assert compact.turns == [{'speaker': 'A', 'text': 'Hello yes'}, {'speaker': 'B', 'text': 'Ok'}]
+    assert compact.text == 'A: Hello yes\nB: Ok'
+    assert compact.speaker_count == 2
+
+
+def test_compact_without_utterances():
+    compact = compact_transcript('um so this is it')
+    assert compact.text == 'So this is it'
+    assert compact.speaker_count == 0
+
+
+def test_compact_drops_low_information_sentences_within_budget():
+    utterances = [{'speaker': 'A', 'text': 'Yeah. Okay. Right. The quarterly budget review covers marketing expenses.'}]
+    full = compact_transcript('', utterances)
+    compact = compact_transcript('', utterances, token_budget=full.tokens - 3, max_drop=0.5)
+    assert compact.dropped_sentences > 0
+    assert 'quarterly budget review' in compact.text
+    assert compact.tokens < full.tokens
+
+
+def test_chunks_fit_the_budget():
+    utterances = [{'speaker': 'A', 'text': 'word ' * 40}, {'speaker': 'B', 'text': 'short'}]
+    chunks = chunk_utterances(utterances, 5)
+    assert all(estimate_tokens(chunk) <= 5 for chunk in chunks)
+    assert ' '.join(chunks).split().count('word') == 40
+    assert chunks[-1] == 'B: short'
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import provider_limits
+from config import PROVIDER_LIMITS
+from provider_limits import ProviderBusyError, acquire, release, report_throttled, try_acquire
+from shared_state import state_transaction
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    with state_transaction() as conn:
+        conn.execute("DELETE FROM provider_buckets")
+        conn.execute("DELETE FROM provider_leases")
+    monkeypatch.setitem(PROVIDER_LIMITS, 'gemini', {'rate': 2.0, 'burst': 3.0, 'max_in_flight': 10})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def test_burst_then_wait_for_refill(clock):
+    assert all(try_acquire('gemini')[0] for _ in range(3))
+    lease_id, wait = try_acquire('gemini')
+    assert lease_id is None
+    assert wait == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert try_acquire('gemini')[0]
+
+
+def test_refill_is_capped_at_burst(clock):
+    try_acquire('gemini')
+    clock[0] += 3600
+    assert sum(1 for _ in range(5) if try_acquire('gemini')[0]) == 3
+
+
+def test_in_flight_cap(clock, monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS['gemini'], 'max_in_flight', 1)
+    lease_id, _ = try_acquire('gemini')
+    assert try_acquire('gemini') == (None, provider_limits.MAX_POLL_INTERVAL)
+    release(lease_id)
+    assert try_acquire('gemini')[0]
+
+
+def test_leases_of_dead_workers_are_reclaimed(clock, monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS['gemini'], 'max_in_flight', 1)
+    assert try_acquire('gemini')[0]
+    monkeypatch.setattr(provider_limits, 'pid_alive', lambda pid: False)
+    assert try_acquire('gemini')[0]
+
+
+def test_expired_leases_are_dropped(clock, monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS['gemini'], 'max_in_flight', 1)
+    try_acquire('gemini', lease_seconds=10)
+    clock[0] += 11
+    assert try_acquire('gemini')[0]
+
+
+def test_acquire_times_out_with_retry_after(clock):
+    report_throttled('gemini', retry_after='4')
+    with pytest.raises(ProviderBusyError) as error:
+        acquire('gemini', timeout=0)
+    # An empty bucket after a 4s throttle needs 4.5s for the next token at 2/s
+    assert error.value.retry_after == 5
+
+
+def test_throttle_pauses_every_caller(clock):
+    report_throttled('gemini')
+    _, wait = try_acquire('gemini')
+    assert wait == pytest.approx(provider_limits.DEFAULT_THROTTLE_SECONDS + 0.5)
+
+
+def test_provider_slot_releases(clock):
+    with provider_limits.provider_slot('gemini'):
+        assert provider_limits.get_limiter_stats()['gemini']['in_flight'] == 1
+    assert provider_limits.get_limiter_stats()['gemini']['in_flight'] == 0
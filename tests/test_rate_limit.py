@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+import rate_limit
+from config import ADMISSION_EXPECTED_SECONDS, RATE_LIMITS
+from shared_state import state_transaction
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    with state_transaction() as conn:
+        for table in ('rate_limit_hits', 'admission_leases', 'admission_durations'):
+            conn.execute(f"DELETE FROM {table}")
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', True)
+    monkeypatch.setitem(RATE_LIMITS, 'api', {'window_seconds': 60, 'free': 2, 'premium': 4})
+    monkeypatch.setitem(RATE_LIMITS, 'upload', {'window_seconds': 3600, 'free': 1, 'premium': 2})
+    monkeypatch.setitem(RATE_LIMITS, 'playback', {
+        'window_seconds': 60, 'free': 5, 'premium': 10, 'counts_toward_api': False
+    })
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def test_window_limit(clock):
+    first = rate_limit.check_request(1, False)
+    second = rate_limit.check_request(1, False)
+    refused = rate_limit.check_request(1, False)
+    assert (first.allowed, first.limit, first.remaining) == (True, 2, 1)
+    assert (second.allowed, second.remaining) == (True, 0)
+    assert not refused.allowed
+    assert refused.reason == 'rate_limited'
+    assert refused.retry_after == 60
+    assert rate_limit.retry_after_header(refused) == 60
+
+
+def test_window_slides(clock):
+    rate_limit.check_request(1, False)
+    clock[0] += 30
+    rate_limit.check_request(1, False)
+    clock[0] += 31
+    # The first request has left the window, the second has not
+    assert rate_limit.check_request(1, False).allowed
+    refused = rate_limit.check_request(1, False)
+    assert not refused.allowed
+    assert refused.retry_after == pytest.approx(29)
+
+
+def test_refused_requests_are_not_counted(clock):
+    for _ in range(5):
+        rate_limit.check_request(1, False)
+    clock[0] += 61
+    assert rate_limit.check_request(1, False).allowed
+
+
+def test_premium_and_users_are_separate(clock):
+    for _ in range(2):
+        rate_limit.check_request(1, False)
+    assert not rate_limit.check_request(1, False).allowed
+    assert rate_limit.check_request(2, False).allowed
+    assert rate_limit.check_request(3, True).limit == 4
+
+
+def test_scoped_requests_also_count_toward_api(clock):
+    upload = rate_limit.check_request(1, False, 'upload')
+    assert upload.allowed
+    upload.done()
+    assert not rate_limit.check_request(1, False, 'upload').allowed
+    rate_limit.check_request(1, False)
+    assert not rate_limit.check_request(1, False).allowed
+
+
+def test_playback_has_its_own_budget(clock):
+    for _ in range(5):
+        assert rate_limit.check_request(1, False, 'playback').allowed
+    assert not rate_limit.check_request(1, False, 'playback').allowed
+    # Polling playback positions leaves the API budget untouched
+    assert rate_limit.check_request(1, False).remaining == 1
+
+
+def test_admission_refuses_work_that_cannot_finish(clock, monkeypatch):
+    monkeypatch.setitem(ADMISSION_EXPECTED_SECONDS, 'upload', rate_limit.REQUEST_DEADLINE_SECONDS + 10)
+    refused = rate_limit.check_request(1, False, 'upload')
+    assert refused.reason == 'overloaded'
+    assert refused.retry_after == pytest.approx(10)
+
+
+def test_admission_lease_is_released(clock):
+    admission = rate_limit.check_request(1, True, 'upload')
+    assert admission.lease_id
+    admission.done()
+    with state_transaction() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM admission_leases").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM admission_durations").fetchone()[0] == 1
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', False)
+    for _ in range(5):
+        assert rate_limit.check_request(1, False).allowed
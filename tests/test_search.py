@@ -0,0 +1,31 @@
+import pytest
+
+from database import SNIPPET_START, SNIPPET_STOP, decode_search_cursor, encode_search_cursor, render_snippet
+
+
+def test_cursor_roundtrip():
+    for rank, row_id in [(0.0607927, 42), (1e-20, 1), (0.5, 9_000_000_000)]:
+        assert decode_search_cursor(encode_search_cursor(rank, row_id)) == (rank, row_id)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_search_cursor(0.123456789, 123456)
+    assert all(c.isalnum() or c in '-_=' for c in cursor)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not base64!', 'Zm9v', encode_search_cursor('x', 1)[:-2] + '!!'])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_search_cursor(cursor)
+
+
+def test_snippet_marks_matches():
+    assert render_snippet(f"the {SNIPPET_START}budget{SNIPPET_STOP} review") == 'the <mark>budget</mark> review'
+
+
+def test_snippet_escapes_transcript_text():
+    snippet = f'<script>alert(1)</script> & "{SNIPPET_START}<b>{SNIPPET_STOP}"'
+    assert render_snippet(snippet) == (
+        '&lt;script&gt;alert(1)&lt;/script&gt; &amp; &quot;<mark>&lt;b&gt;</mark>&quot;'
+    )
+    assert render_snippet(None) == ''
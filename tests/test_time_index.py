@@ -0,0 +1,76 @@
+from time_index import TranscriptTimeIndex, build_time_index
+from utterance_codec import decode_packed, encode_utterances
+
+UTTERANCES = [
+    {'speaker': 'A', 'text': 'first', 'start_time': 0, 'end_time': 1000},
+    {'speaker': 'B', 'text': 'second', 'start_time': 1500, 'end_time': 3000},
+    # Overlaps the end of the second utterance (crosstalk)
+    {'speaker': 'A', 'text': 'third', 'start_time': 2500, 'end_time': 4000},
+]
+
+
+def index():
+    return TranscriptTimeIndex.from_utterances(UTTERANCES)
+
+
+def test_point_inside_utterance():
+    result = index().at(500)
+    assert result['utterance']['text'] == 'first'
+    assert result['utterance']['index'] == 0
+    assert result['word'] is None
+
+
+def test_point_in_gap():
+    assert index().at(1200)['utterance'] is None
+
+
+def test_end_is_exclusive():
+    assert index().at(1000)['utterance'] is None
+    assert index().at(1500)['utterance']['text'] == 'second'
+
+
+def test_point_in_overlap_prefers_latest_start():
+    assert index().at(2700)['utterance']['text'] == 'third'
+
+
+def test_point_inside_long_utterance_behind_shorter_ones():
+    long_index = TranscriptTimeIndex.from_utterances([
+        {'text': 'long', 'start_time': 0, 'end_time': 10000},
+        {'text': 'short', 'start_time': 1000, 'end_time': 2000},
+    ])
+    assert long_index.at(5000)['utterance']['text'] == 'long'
+
+
+def test_range_overlap():
+    result = index().range(900, 2600)
+    assert [u['text'] for u in result['utterances']] == ['first', 'second', 'third']
+    assert (result['start'], result['end']) == (900, 2600)
+
+
+def test_range_excludes_touching_intervals():
+    assert [u['text'] for u in index().range(1000, 1500)['utterances']] == []
+    assert [u['text'] for u in index().range(3000, 5000)['utterances']] == ['third']
+
+
+def test_range_snaps_to_words():
+    blob = encode_utterances([
+        {'speaker': 'A', 'text': 'Hello there', 'start': 0, 'end': 1200, 'words': [
+            {'text': 'Hello', 'start': 0, 'end': 500},
+            {'text': 'there', 'start': 600, 'end': 1200},
+        ]},
+    ])
+    packed_index = build_time_index({'utterance_pack': blob, 'utterances': None})
+    result = packed_index.range(700, 800)
+    assert [w['text'] for w in result['words']] == ['there']
+    assert result['words'][0]['utterance_index'] == 0
+    assert (result['start'], result['end']) == (600, 1200)
+    assert packed_index.at(550)['word'] is None
+    assert packed_index.at(100)['word']['text'] == 'Hello'
+
+
+def test_from_packed_matches_rows():
+    packed_index = TranscriptTimeIndex.from_packed(decode_packed(encode_utterances(UTTERANCES)))
+    for t in (0, 999, 1200, 2700, 3999):
+        packed = packed_index.at(t)['utterance']
+        rows = index().at(t)['utterance']
+        assert (packed and packed['text']) == (rows and rows['text'])
@@ -0,0 +1,67 @@
+import os
+import uuid
+
+import pytest
+
+from conditional import make_etag
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv('TEST_DATABASE_URL'), reason='needs TEST_DATABASE_URL (a disposable Postgres database)'
+)
+
+
+@pytest.fixture(scope='module')
+def database():
+    import database
+    database.init_database()
+    yield database
+    database.close_database()
+
+
+@pytest.fixture
+def transcript(database):
+    conn = database.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (email, password_hash) VALUES (%s, 'x') RETURNING id",
+            (f"{uuid.uuid4().hex}@example.com",)
+        )
+        user_id = cursor.fetchone()[0]
+        conn.commit()
+    finally:
+        database.return_db_connection(conn)
+
+    session_id = uuid.uuid4().hex
+    assert database.save_transcript_to_db(
+        session_id,
+        {'transcript_id': 't1', 'text': 'Hello there', 'utterances': [
+            {'speaker': 'A', 'text': 'Hello there', 'confidence': 0.9, 'start': 0, 'end': 1000}
+        ]},
+        'meeting.wav', b'RIFF' + bytes(4000), 'audio/wav', user_id
+    )
+    yield session_id, user_id
+    conn = database.get_db_connection()
+    try:
+        conn.cursor().execute("DELETE FROM users WHERE id = %s", (user_id,))
+        conn.commit()
+    finally:
+        database.return_db_connection(conn)
+
+
+def test_compaction_changes_etags_but_not_updated_at(database, transcript):
+    session_id, user_id = transcript
+    before = database.get_transcript_from_db(session_id, user_id=user_id)
+    version = database.get_transcript_version_from_db(session_id, user_id=user_id)
+    list_version = database.get_transcripts_list_version(user_id)
+
+    assert database.store_compact_audio(session_id, b'OggS' + bytes(100), 'audio/ogg', 'opus')
+
+    after = database.get_transcript_from_db(session_id, user_id=user_id)
+    new_version = database.get_transcript_version_from_db(session_id, user_id=user_id)
+    assert after['updated_at'] == before['updated_at']
+    assert (after['audio_size'], after['audio_mimetype']) == (104, 'audio/ogg')
+    assert new_version > version
+    assert make_etag('transcript', session_id, new_version) != make_etag('transcript', session_id, version)
+    assert database.get_transcripts_list_version(user_id) != list_version
+    assert database.get_transcript_timeline_from_db(session_id, user_id=user_id)['version'] == new_version
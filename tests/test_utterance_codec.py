@@ -0,0 +1,67 @@
+import pytest
+
+from utterance_codec import decode_packed, decode_utterances, encode_utterances, iter_utterances, normalize_utterance
+
+UTTERANCES = [
+    {
+        'speaker': 'A', 'text': 'Hello there', 'confidence': 0.91234, 'start': 0, 'end': 1200,
+        'words': [
+            {'text': 'Hello', 'start': 0, 'end': 500, 'confidence': 0.95},
+            {'text': 'there', 'start': 600, 'end': 1200, 'confidence': 0.875},
+        ],
+    },
+    {'speaker': 'B', 'text': 'Grüße — 你好', 'confidence': 0.5, 'start': 1300, 'end': 2500, 'words': []},
+    {'speaker': 'A', 'text': 'Bye', 'confidence': 1.0, 'start': 2600, 'end': 3000,
+     'words': [{'text': 'Bye', 'start': 2600, 'end': 3000, 'confidence': 0.99}]},
+]
+
+
+def test_roundtrip():
+    decoded = decode_utterances(encode_utterances(UTTERANCES))
+    assert decoded == [
+        {'speaker': 'A', 'text': 'Hello there', 'confidence': 0.9123, 'start_time': 0, 'end_time': 1200},
+        {'speaker': 'B', 'text': 'Grüße — 你好', 'confidence': 0.5, 'start_time': 1300, 'end_time': 2500},
+        {'speaker': 'A', 'text': 'Bye', 'confidence': 1.0, 'start_time': 2600, 'end_time': 3000},
+    ]
+
+
+def test_roundtrip_with_words():
+    decoded = decode_utterances(encode_utterances(UTTERANCES), include_words=True)
+    assert decoded[0]['words'] == [
+        {'text': 'Hello', 'start': 0, 'end': 500, 'confidence': 0.95},
+        {'text': 'there', 'start': 600, 'end': 1200, 'confidence': 0.875},
+    ]
+    assert decoded[1]['words'] == []
+    assert [w['text'] for w in decoded[2]['words']] == ['Bye']
+
+
+def test_speakers_are_deduplicated():
+    packed = decode_packed(encode_utterances(UTTERANCES))
+    assert packed.speakers == ['A', 'B']
+    assert list(packed.speaker_ids) == [0, 1, 0]
+
+
+def test_iter_matches_decode():
+    blob = encode_utterances(UTTERANCES)
+    assert list(iter_utterances(blob, include_words=True)) == decode_utterances(blob, include_words=True)
+
+
+def test_empty():
+    assert decode_utterances(encode_utterances([])) == []
+
+
+def test_missing_fields_are_normalized():
+    decoded = decode_utterances(encode_utterances([{'text': None, 'start_time': 5, 'end_time': 9}]))
+    assert decoded == [{'speaker': 'Unknown', 'text': '', 'confidence': 0.0, 'start_time': 5, 'end_time': 9}]
+
+
+def test_normalize_matches_decoded_form():
+    for utterance, decoded in zip(UTTERANCES, decode_utterances(encode_utterances(UTTERANCES))):
+        assert normalize_utterance(utterance) == (
+            decoded['speaker'], decoded['text'], decoded['confidence'], decoded['start_time'], decoded['end_time']
+        )
+
+
+def test_rejects_other_blobs():
+    with pytest.raises(ValueError):
+        decode_packed(b'XXXX' + bytes(12))
@@ -0,0 +1,154 @@
+"""
+Time index over a transcript's utterances and words for playback lookups
+"""
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from cache_utils import LRUCache
+from utterance_codec import decode_packed
+
+# Built indexes keyed by session_id, stored with the transcript version they were built from
+index_cache = LRUCache(max_entries=64)
+
+
+def _running_max(values):
+    return list(accumulate(values, max)) if values else []
+
+
+class TranscriptTimeIndex:
+    """
+    Sorted start/end arrays for utterances and words.
+    Lookups binary-search the start times and use a running maximum of the end
+    times to bound the scan for overlapping intervals, so a point or range query
+    costs O(log n + k) for k matches.
+    """
+
+    def __init__(self, starts, ends, get_utterance, word_starts=None, word_ends=None,
+                 word_owners=None, get_word=None):
+        order = sorted(range(len(starts)), key=lambda i: (starts[i], ends[i]))
+        self.order = order
+        self.starts = [starts[i] for i in order]
+        self.ends = [ends[i] for i in order]
+        self.max_ends = _running_max(self.ends)
+        self.get_utterance = get_utterance
+
+        word_starts = word_starts or []
+        word_order = sorted(range(len(word_starts)), key=lambda j: (word_starts[j], word_ends[j]))
+        self.word_order = word_order
+        self.word_starts = [word_starts[j] for j in word_order]
+        self.word_ends = [word_ends[j] for j in word_order]
+        self.word_max_ends = _running_max(self.word_ends)
+        self.word_owners = word_owners or []
+        self.get_word = get_word
+
+    @classmethod
+    def from_packed(cls, packed):
+        """Build an index from PackedUtterances, including word timings"""
+        owners = []
+        for i in range(len(packed)):
+            first, last = packed.word_range(i)
+            owners.extend([i] * (last - first))
+        return cls(
+            list(packed.starts), list(packed.ends), packed.utterance,
+            list(packed.word_starts), list(packed.word_stops), owners, packed.word
+        )
+
+    @classmethod
+    def from_utterances(cls, utterances):
+        """Build an utterance-level index from utterance rows (no word timings)"""
+        return cls(
+            [u.get('start_time') or 0 for u in utterances],
+            [u.get('end_time') or 0 for u in utterances],
+            lambda i: dict(utterances[i])
+        )
+
+    @property
+    def has_words(self):
+        return bool(self.word_starts)
+
+    def _utterance(self, position):
+        original = self.order[position]
+        utterance = self.get_utterance(original)
+        utterance['index'] = original
+        return utterance
+
+    def _word(self, position):
+        original = self.word_order[position]
+        word = self.get_word(original)
+        word['index'] = original
+        word['utterance_index'] = self.word_owners[original]
+        return word
+
+    @staticmethod
+    def _covering(starts, ends, max_ends, t):
+        """Position of the latest-starting interval containing t, or None"""
+        position = bisect_right(starts, t) - 1
+        while position >= 0 and max_ends[position] > t:
+            if ends[position] > t:
+                return position
+            position -= 1
+        return None
+
+    @staticmethod
+    def _overlapping(starts, ends, max_ends, t1, t2):
+        """Positions of intervals overlapping [t1, t2), in start order"""
+        first = bisect_right(max_ends, t1)
+        last = bisect_left(starts, t2)
+        return [p for p in range(first, last) if ends[p] > t1]
+
+    def at(self, t):
+        """Return the utterance and word being spoken at time t (ms); either may be None"""
+        position = self._covering(self.starts, self.ends, self.max_ends, t)
+        word_position = None
+        if self.has_words:
+            word_position = self._covering(self.word_starts, self.word_ends, self.word_max_ends, t)
+        return {
+            'time': t,
+            'utterance': self._utterance(position) if position is not None else None,
+            'word': self._word(word_position) if word_position is not None else None
+        }
+
+    def range(self, t1, t2):
+        """
+        Return utterances and words overlapping [t1, t2) (ms).
+        When word timings exist, the range is also snapped outward to whole-word
+        boundaries so a clip never cuts a word in half.
+        """
+        positions = self._overlapping(self.starts, self.ends, self.max_ends, t1, t2)
+        result = {
+            'start': t1,
+            'end': t2,
+            'utterances': [self._utterance(p) for p in positions],
+            'words': []
+        }
+        if self.has_words:
+            word_positions = self._overlapping(self.word_starts, self.word_ends, self.word_max_ends, t1, t2)
+            result['words'] = [self._word(p) for p in word_positions]
+            if word_positions:
+                result['start'] = min(t1, self.word_starts[word_positions[0]])
+                result['end'] = max(t2, max(self.word_ends[p] for p in word_positions))
+        return result
+
+
+def build_time_index(timeline):
+    """Build an index from get_transcript_timeline_from_db output"""
+    if timeline['utterance_pack'] is not None:
+        return TranscriptTimeIndex.from_packed(decode_packed(timeline['utterance_pack']))
+    return TranscriptTimeIndex.from_utterances(timeline['utterances'])
+
+
+def get_time_index(session_id, version, load_timeline):
+    """
+    Return the cached index for session_id if it was built from this version
+    of the transcript, otherwise load the timeline and rebuild it
+    """
+    cached = index_cache.get(session_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    timeline = load_timeline()
+    if timeline is None:
+        return None
+    index = build_time_index(timeline)
+    index_cache.set(session_id, (timeline['version'], index))
+    return index
@@ -0,0 +1,278 @@
+"""
+Request tracing: a correlation id on every log line and timed spans around
+audio processing, Gemini and database calls. Slow traces are logged as a JSON
+span tree; every trace can also be appended to a local JSON-lines file.
+"""
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from config import TRACE_ENABLED, TRACE_SLOW_MS, TRACE_FILE, logger
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Client-supplied ids are echoed in headers and logs, so only accept plain tokens
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+# Spans kept per trace; a long poll loop should not grow a trace without bound
+MAX_SPANS = 500
+LOG_FORMAT = '%(levelname)s:%(name)s:[%(request_id)s] %(message)s'
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+_sink_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation inside a trace"""
+
+    def __init__(self, name, parent_id, attrs):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.thread = threading.current_thread().name
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self, trace_started):
+        span = {
+            'name': self.name,
+            'id': self.id,
+            'start_ms': round((self.started - trace_started) * 1000, 2),
+            'duration_ms': round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            'thread': self.thread,
+        }
+        if self.attrs:
+            span['attrs'] = self.attrs
+        if self.error:
+            span['error'] = self.error
+        return span
+
+
+class Trace:
+    """The spans recorded while handling one request or background task"""
+
+    def __init__(self, request_id, name):
+        self.request_id = request_id
+        self.name = name
+        self.attrs = {}
+        self.spans = []
+        self.dropped = 0
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.error = None
+        # With tracing disabled the id is still kept for log lines, but no spans are recorded
+        self.recording = TRACE_ENABLED
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        # Spans can finish on worker threads (e.g. concurrent Gemini chunk calls)
+        with self.lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def tree(self):
+        """Spans nested under their parents, ordered by start time"""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s.started)
+        nodes = {span.id: dict(span.to_dict(self.started), children=[]) for span in spans}
+        roots = []
+        for span in spans:
+            parent = nodes.get(span.parent_id)
+            (parent['children'] if parent else roots).append(nodes[span.id])
+        return roots
+
+    def to_dict(self):
+        trace = {
+            'request_id': self.request_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 2) if self.duration_ms is not None else None,
+            'attrs': self.attrs,
+            'spans': self.tree(),
+        }
+        if self.error:
+            trace['error'] = self.error
+        if self.dropped:
+            trace['dropped_spans'] = self.dropped
+        return trace
+
+
+def new_request_id(supplied=None):
+    """Use the client's request id when it is well formed, otherwise generate one"""
+    if supplied and VALID_REQUEST_ID.match(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def start_trace(name, request_id=None):
+    """
+    Make a new trace current in this context.
+    Returns: (trace, token); pass the token to finish_trace
+    """
+    trace = Trace(new_request_id(request_id), name)
+    return trace, _current_trace.set(trace)
+
+
+def finish_trace(trace, token, error=None):
+    """Close trace, dump it if it was slow, export it, and restore the previous trace"""
+    try:
+        if trace.duration_ms is not None:
+            return
+        trace.duration_ms = (time.perf_counter() - trace.started) * 1000
+        if error is not None:
+            trace.error = f"{type(error).__name__}: {error}"
+        if not trace.recording:
+            return
+        if trace.duration_ms >= TRACE_SLOW_MS:
+            logger.warning(
+                f"Slow {trace.name} took {trace.duration_ms:.0f} ms: {json.dumps(trace.to_dict(), default=str)}"
+            )
+        if TRACE_FILE:
+            _export(trace)
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # Finished from a different context than it started in (e.g. after a streamed body)
+            _current_trace.set(None)
+
+
+def _export(trace):
+    try:
+        line = json.dumps(trace.to_dict(), default=str)
+        with _sink_lock, open(TRACE_FILE, 'a') as f:
+            f.write(line + '\n')
+    except Exception as e:
+        logger.warning(f"Could not export trace {trace.request_id}: {e}")
+
+
+@contextmanager
+def trace_context(name, request_id=None):
+    """Run the block as its own trace, e.g. a background task continuing a request"""
+    trace, token = start_trace(name, request_id)
+    try:
+        yield trace
+    except Exception as e:
+        finish_trace(trace, token, e)
+        raise
+    else:
+        finish_trace(trace, token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the block as a child of the current span. Does nothing outside a trace.
+    Do not hold a span open across a yield in a generator.
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.id if parent else None, attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def traced(name):
+    """Decorator recording each call of the function as a span"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def bind_context(fn):
+    """Wrap fn so it runs in a copy of the caller's context, keeping the current trace and span"""
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def bound(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return bound
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request id (or '-') to every log record"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id() or '-'
+        return True
+
+
+def install_log_context():
+    """Include the request id in every line written by the root logger's handlers"""
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+            handler.setFormatter(formatter)
+
+
+def init_tracing(app):
+    """Trace every Flask request and echo its id in the X-Request-ID header"""
+    from flask import g, request
+
+    install_log_context()
+
+    @app.before_request
+    def start_request_trace():
+        g.trace, g.trace_token = start_trace(
+            f"{request.method} {request.path}", request.headers.get(REQUEST_ID_HEADER)
+        )
+
+    @app.after_request
+    def tag_request_trace(response):
+        trace = g.get('trace')
+        if trace is not None:
+            response.headers[REQUEST_ID_HEADER] = trace.request_id
+            if request.url_rule:
+                trace.name = f"{request.method} {request.url_rule.rule}"
+            trace.attrs['status'] = response.status_code
+            user_id = getattr(request, 'user_id', None)
+            if user_id is not None:
+                trace.attrs['user_id'] = user_id
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error=None):
+        trace = g.pop('trace', None)
+        token = g.pop('trace_token', None)
+        if trace is not None:
+            finish_trace(trace, token, error)
@@ -5,42 +5,10 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
 from datetime import datetime
+from profile_cache import invalidate_user_profile
 
 logger = logging.getLogger(__name__)
 
-def create_user_tables(conn):
-    """Create user-related tables"""
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            full_name VARCHAR(255),
-            is_premium BOOLEAN DEFAULT FALSE,
-            premium_expiry TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-    """)
-    
-    cursor.execute("""
-        ALTER TABLE transcripts 
-        ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_transcripts_user_id ON transcripts(user_id);
-    """)
-    
-    conn.commit()
-    logger.info("User tables created successfully")
-
 def create_user(conn, email, password_hash, full_name=None):
     """Create a new user"""
     try:
@@ -98,6 +66,25 @@ def get_user_by_id(conn, user_id):
         logger.error(f"Error getting user by ID: {e}")
         return None
 
+def update_password_hash(conn, user_id, password_hash):
+    """Replace a user's password hash (e.g. after rehashing at a new cost)"""
+    try:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE users
+            SET password_hash = %s,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        """, (password_hash, user_id))
+        
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error updating password hash: {e}")
+        return False
+
 def upgrade_to_premium(conn, user_id):
     """Upgrade user to premium"""
     try:
@@ -111,6 +98,7 @@ def upgrade_to_premium(conn, user_id):
         """, (user_id,))
         
         conn.commit()
+        invalidate_user_profile(user_id)
         return True
     except Exception as e:
         conn.rollback()
@@ -0,0 +1,216 @@
+"""
+Packed columnar encoding of a transcript's utterances and word timings
+"""
+import sys
+import struct
+import zlib
+from array import array
+
+MAGIC = b'UTP1'
+CONFIDENCE_SCALE = 10000
+
+HEADER = struct.Struct('<4sIII')
+BLOB_LENGTH = struct.Struct('<I')
+
+
+class PackedUtterances:
+    """
+    Parallel arrays describing a transcript's utterances and words.
+    Utterance i spans words word_ends[i-1]:word_ends[i] and text
+    text_ends[i-1]:text_ends[i] of the UTF-8 text blob; words index their
+    text the same way.
+    """
+
+    def __init__(self, speakers, starts, ends, speaker_ids, confidences, text_ends, word_ends,
+                 text, word_starts, word_stops, word_confidences, word_text_ends, word_text):
+        self.speakers = speakers
+        self.starts = starts
+        self.ends = ends
+        self.speaker_ids = speaker_ids
+        self.confidences = confidences
+        self.text_ends = text_ends
+        self.word_ends = word_ends
+        self.text = text
+        self.word_starts = word_starts
+        self.word_stops = word_stops
+        self.word_confidences = word_confidences
+        self.word_text_ends = word_text_ends
+        self.word_text = word_text
+
+    def __len__(self):
+        return len(self.starts)
+
+    def utterance_text(self, i):
+        start = self.text_ends[i - 1] if i else 0
+        return self.text[start:self.text_ends[i]].decode('utf-8')
+
+    def word_range(self, i):
+        """Return the [first, last) word indexes of utterance i"""
+        return (self.word_ends[i - 1] if i else 0), self.word_ends[i]
+
+    def word_text_at(self, j):
+        start = self.word_text_ends[j - 1] if j else 0
+        return self.word_text[start:self.word_text_ends[j]].decode('utf-8')
+
+    def word(self, j):
+        return {
+            'text': self.word_text_at(j),
+            'start': self.word_starts[j],
+            'end': self.word_stops[j],
+            'confidence': self.word_confidences[j] / CONFIDENCE_SCALE
+        }
+
+    def utterance(self, i, include_words=False):
+        utterance = {
+            'speaker': self.speakers[self.speaker_ids[i]],
+            'text': self.utterance_text(i),
+            'confidence': self.confidences[i] / CONFIDENCE_SCALE,
+            'start_time': self.starts[i],
+            'end_time': self.ends[i]
+        }
+        if include_words:
+            first, last = self.word_range(i)
+            utterance['words'] = [self.word(j) for j in range(first, last)]
+        return utterance
+
+
+def _typed(typecode, values=()):
+    arr = array(typecode, values)
+    expected = {'I': 4, 'H': 2}[typecode]
+    if arr.itemsize != expected:
+        raise RuntimeError(f"array('{typecode}') is {arr.itemsize} bytes on this platform, expected {expected}")
+    return arr
+
+
+def _to_le_bytes(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_le_bytes(typecode, data, count, offset):
+    arr = _typed(typecode)
+    size = arr.itemsize * count
+    arr.frombytes(data[offset:offset + size])
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr, offset + size
+
+
+def _confidence(value):
+    return max(0, min(CONFIDENCE_SCALE, round((value or 0) * CONFIDENCE_SCALE)))
+
+
+def normalize_utterance(utterance):
+    """
+    (speaker, text, confidence, start, end) of an utterance the way both the packed
+    form and utterance rows store it, so the two storage modes read back identically
+    """
+    return (
+        str(utterance.get('speaker') or 'Unknown'),
+        utterance.get('text') or '',
+        _confidence(utterance.get('confidence')) / CONFIDENCE_SCALE,
+        int(utterance.get('start', utterance.get('start_time')) or 0),
+        int(utterance.get('end', utterance.get('end_time')) or 0)
+    )
+
+
+def encode_utterances(utterances):
+    """
+    Pack AssemblyAI-style utterances (speaker, text, confidence, start, end,
+    words) into a compressed columnar blob
+    """
+    speakers = []
+    speaker_index = {}
+    starts, ends, speaker_ids, confidences = _typed('I'), _typed('I'), _typed('H'), _typed('H')
+    text_ends, word_ends = _typed('I'), _typed('I')
+    word_starts, word_stops, word_confidences, word_text_ends = _typed('I'), _typed('I'), _typed('H'), _typed('I')
+    text = bytearray()
+    word_text = bytearray()
+
+    for utterance in utterances:
+        speaker, utterance_text, confidence, start, end = normalize_utterance(utterance)
+        if speaker not in speaker_index:
+            speaker_index[speaker] = len(speakers)
+            speakers.append(speaker)
+
+        starts.append(start)
+        ends.append(end)
+        speaker_ids.append(speaker_index[speaker])
+        confidences.append(_confidence(confidence))
+        text += utterance_text.encode('utf-8')
+        text_ends.append(len(text))
+
+        for word in utterance.get('words') or []:
+            word_starts.append(int(word.get('start') or 0))
+            word_stops.append(int(word.get('end') or 0))
+            word_confidences.append(_confidence(word.get('confidence')))
+            word_text += (word.get('text') or '').encode('utf-8')
+            word_text_ends.append(len(word_text))
+        word_ends.append(len(word_starts))
+
+    speaker_blob = '\x00'.join(speakers).encode('utf-8')
+    body = b''.join([
+        BLOB_LENGTH.pack(len(speaker_blob)), speaker_blob,
+        _to_le_bytes(starts), _to_le_bytes(ends), _to_le_bytes(speaker_ids),
+        _to_le_bytes(confidences), _to_le_bytes(text_ends), _to_le_bytes(word_ends),
+        _to_le_bytes(word_starts), _to_le_bytes(word_stops),
+        _to_le_bytes(word_confidences), _to_le_bytes(word_text_ends),
+        BLOB_LENGTH.pack(len(text)), bytes(text),
+        BLOB_LENGTH.pack(len(word_text)), bytes(word_text),
+    ])
+    header = HEADER.pack(MAGIC, len(starts), len(word_starts), len(speakers))
+    return header + zlib.compress(body, 6)
+
+
+def decode_packed(blob):
+    """Decode a blob from encode_utterances into PackedUtterances arrays"""
+    blob = bytes(blob)
+    magic, n_utterances, n_words, n_speakers = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a packed utterance blob")
+    body = zlib.decompress(blob[HEADER.size:])
+
+    offset = 0
+    (speaker_length,) = BLOB_LENGTH.unpack_from(body, offset)
+    offset += BLOB_LENGTH.size
+    speakers = body[offset:offset + speaker_length].decode('utf-8').split('\x00') if n_speakers else []
+    offset += speaker_length
+
+    starts, offset = _from_le_bytes('I', body, n_utterances, offset)
+    ends, offset = _from_le_bytes('I', body, n_utterances, offset)
+    speaker_ids, offset = _from_le_bytes('H', body, n_utterances, offset)
+    confidences, offset = _from_le_bytes('H', body, n_utterances, offset)
+    text_ends, offset = _from_le_bytes('I', body, n_utterances, offset)
+    word_ends, offset = _from_le_bytes('I', body, n_utterances, offset)
+    word_starts, offset = _from_le_bytes('I', body, n_words, offset)
+    word_stops, offset = _from_le_bytes('I', body, n_words, offset)
+    word_confidences, offset = _from_le_bytes('H', body, n_words, offset)
+    word_text_ends, offset = _from_le_bytes('I', body, n_words, offset)
+
+    (text_length,) = BLOB_LENGTH.unpack_from(body, offset)
+    offset += BLOB_LENGTH.size
+    text = body[offset:offset + text_length]
+    offset += text_length
+    (word_text_length,) = BLOB_LENGTH.unpack_from(body, offset)
+    offset += BLOB_LENGTH.size
+    word_text = body[offset:offset + word_text_length]
+
+    return PackedUtterances(
+        speakers, starts, ends, speaker_ids, confidences, text_ends, word_ends,
+        text, word_starts, word_stops, word_confidences, word_text_ends, word_text
+    )
+
+
+def decode_utterances(blob, include_words=False):
+    """Decode a packed blob into utterance dicts shaped like utterances table rows"""
+    packed = decode_packed(blob)
+    return [packed.utterance(i, include_words) for i in range(len(packed))]
+
+
+def iter_utterances(blob, include_words=False):
+    """Decode a packed blob lazily, building one utterance dict at a time"""
+    packed = decode_packed(blob)
+    for i in range(len(packed)):
+        yield packed.utterance(i, include_words)